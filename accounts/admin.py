@@ -1,6 +1,9 @@
+from datetime import timedelta
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
-from .models import User, FarmerProfile, BuyerProfile, KYCDocument, AuditLog
+from django.utils import timezone
+from .models import User, FarmerProfile, BuyerProfile, KYCDocument, AuditLog, AuditLogRollup
 
 
 @admin.register(User)
@@ -28,4 +31,21 @@ class KYCDocumentAdmin(admin.ModelAdmin):
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
+    """Raw rows inside the retention window only; older ranges live in AuditLogRollup."""
     list_display = ('timestamp', 'user', 'action')
+    list_select_related = ('user',)
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp',)
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        cutoff = timezone.now() - timedelta(days=settings.AUDIT_RETENTION_DAYS)
+        return super().get_queryset(request).filter(timestamp__gte=cutoff)
+
+
+@admin.register(AuditLogRollup)
+class AuditLogRollupAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'route', 'count', 'error_count', 'p50_duration', 'p95_duration')
+    list_filter = ('route',)
+    date_hierarchy = 'hour'
+    ordering = ('-hour',)
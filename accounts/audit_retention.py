@@ -0,0 +1,277 @@
+"""Monthly partitioning, hourly rollups and retention for AuditLog.
+
+On PostgreSQL ``accounts_auditlog`` is range-partitioned by month on
+``timestamp`` so expired months are dropped with a single DROP TABLE. Other
+backends keep a plain table and fall back to an indexed range DELETE.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+
+from .models import AuditLog, AuditLogRollup
+
+TABLE = 'accounts_auditlog'
+PARTITION_PREFIX = f'{TABLE}_p'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(value: datetime) -> datetime:
+    value = value.astimezone(dt_timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime) -> datetime:
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}'
+
+
+def is_partitioned(conn=connection) -> bool:
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def ensure_partitions(start: datetime, end: datetime, conn=connection) -> List[str]:
+    """Create monthly partitions covering [start, end) plus the default partition."""
+    created = []
+    month = month_start(start)
+    with conn.cursor() as cursor:
+        while month < end:
+            upper = next_month(month)
+            name = partition_name(month)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+            created.append(name)
+            month = upper
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+    return created
+
+
+def list_partitions(conn=connection) -> List[Tuple[str, datetime]]:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        if not name.startswith(PARTITION_PREFIX):
+            continue
+        year, month = name[len(PARTITION_PREFIX):].split('_')
+        partitions.append((name, datetime(int(year), int(month), 1, tzinfo=dt_timezone.utc)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def convert_to_partitioned(conn) -> None:
+    """Rebuild accounts_auditlog as a monthly range-partitioned table (PostgreSQL only).
+
+    Django creates ``id`` as an IDENTITY column whose sequence belongs to the
+    column and would be dropped with the legacy table; identity is removed
+    from the legacy table first so the partitioned table gets a fresh
+    sequence of its own, set past the highest copied id.
+    """
+    legacy = f'{TABLE}_legacy'
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT LIKE %s",
+            [TABLE, '%_pkey'],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f'SELECT MIN("timestamp"), MAX(id) FROM "{TABLE}"')
+        oldest, max_id = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        # drops an identity sequence; a serial sequence from an older schema is reused below
+        cursor.execute(f'ALTER TABLE "{legacy}" ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{TABLE}_id_seq"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" ('
+            f"id bigint NOT NULL DEFAULT nextval('{TABLE}_id_seq'), "
+            'action varchar(255) NOT NULL, '
+            '"timestamp" timestamp with time zone NOT NULL, '
+            'metadata jsonb NOT NULL, '
+            'user_id bigint NULL REFERENCES accounts_user (id) DEFERRABLE INITIALLY DEFERRED, '
+            'PRIMARY KEY (id, "timestamp")'
+            ') PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'ALTER SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}".id')
+
+    now = datetime.now(dt_timezone.utc)
+    ensure_partitions(oldest or now, next_month(next_month(month_start(now))), conn)
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO "{TABLE}" (id, action, "timestamp", metadata, user_id) '
+            f'SELECT id, action, "timestamp", metadata, user_id FROM "{legacy}"'
+        )
+        cursor.execute(f'DROP TABLE "{legacy}"')
+        # index definitions were read before the rename, so they already target TABLE
+        for index_def in index_defs:
+            cursor.execute(index_def)
+        if max_id:
+            cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s)", [max_id])
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def route_key(action: str, metadata: Dict) -> str:
+    route = (metadata or {}).get('route')
+    if not route:
+        return action
+    method = action.split(' ', 1)[0]
+    return f'{method} {route}'
+
+
+def _aggregate(hour: datetime, groups: Dict[str, Dict]) -> Iterable[AuditLogRollup]:
+    for route, group in groups.items():
+        durations = sorted(group['durations'])
+        yield AuditLogRollup(
+            hour=hour,
+            route=route[:255],
+            count=group['count'],
+            error_count=group['errors'],
+            p50_duration=percentile(durations, 50),
+            p95_duration=percentile(durations, 95),
+        )
+
+
+def _merge(stored: AuditLogRollup, rollup: AuditLogRollup) -> None:
+    """Fold ``stored`` into ``rollup``: counts add up, percentiles are approximated by the
+    count-weighted median and the larger p95, since the raw durations are gone."""
+    total = stored.count + rollup.count
+    if stored.p50_duration is not None and rollup.p50_duration is not None and total:
+        rollup.p50_duration = (stored.p50_duration * stored.count + rollup.p50_duration * rollup.count) / total
+    elif rollup.p50_duration is None:
+        rollup.p50_duration = stored.p50_duration
+    rollup.p95_duration = max((value for value in (stored.p95_duration, rollup.p95_duration) if value is not None),
+                              default=None)
+    rollup.count = total
+    rollup.error_count += stored.error_count
+
+
+def _store(rollups: List[AuditLogRollup]) -> None:
+    """Add ``rollups`` to the stored ones for the same (hour, route).
+
+    Rows are purged as they are rolled up, so a later run only sees rows
+    that arrived after its hour was first rolled up (late writes or a run
+    with a shorter retention) and must not replace the earlier counts.
+    """
+    if not rollups:
+        return
+    with transaction.atomic():
+        stored = {
+            (row.hour, row.route): row
+            for row in AuditLogRollup.objects.select_for_update().filter(
+                hour__in={rollup.hour for rollup in rollups}, route__in={rollup.route for rollup in rollups})
+        }
+        for rollup in rollups:
+            if (rollup.hour, rollup.route) in stored:
+                _merge(stored[(rollup.hour, rollup.route)], rollup)
+        _write(rollups)
+
+
+def _write(rollups: List[AuditLogRollup]) -> None:
+    if connection.features.supports_update_conflicts_with_target:
+        AuditLogRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['hour', 'route'],
+            update_fields=['count', 'error_count', 'p50_duration', 'p95_duration'],
+        )
+    else:
+        for rollup in rollups:
+            AuditLogRollup.objects.update_or_create(
+                hour=rollup.hour, route=rollup.route,
+                defaults={
+                    'count': rollup.count, 'error_count': rollup.error_count,
+                    'p50_duration': rollup.p50_duration, 'p95_duration': rollup.p95_duration,
+                },
+            )
+
+
+def rollup_before(cutoff: datetime, chunk_size: int = 5000) -> int:
+    """Aggregate AuditLog rows older than ``cutoff`` into hourly per-route rollups.
+
+    Rows are streamed in timestamp order so only one hour is held in memory.
+    Errors are responses with a 5xx status code. Counts are added to existing
+    rollups, so purge the rows in the same transaction (as ``manage.py
+    audit_retention`` does) to count each row once. Returns the rollup rows
+    written.
+    """
+    rows = (AuditLog.objects.filter(timestamp__lt=cutoff)
+            .order_by('timestamp')
+            .values_list('timestamp', 'action', 'metadata')
+            .iterator(chunk_size=chunk_size))
+    written = 0
+    pending: List[AuditLogRollup] = []
+    current_hour = None
+    groups: Dict[str, Dict] = {}
+    for ts, action, metadata in rows:
+        hour = ts.replace(minute=0, second=0, microsecond=0)
+        if hour != current_hour:
+            if current_hour is not None:
+                pending.extend(_aggregate(current_hour, groups))
+            current_hour, groups = hour, {}
+            if len(pending) >= 500:
+                _store(pending)
+                written += len(pending)
+                pending = []
+        metadata = metadata or {}
+        group = groups.setdefault(route_key(action, metadata), {'count': 0, 'errors': 0, 'durations': []})
+        group['count'] += 1
+        if int(metadata.get('status_code') or 0) >= 500:
+            group['errors'] += 1
+        if metadata.get('duration') is not None:
+            group['durations'].append(float(metadata['duration']))
+    if current_hour is not None:
+        pending.extend(_aggregate(current_hour, groups))
+    _store(pending)
+    return written + len(pending)
+
+
+def purge_before(cutoff: datetime) -> Dict[str, int]:
+    """Remove raw rows older than ``cutoff``.
+
+    Partitioned tables drop every monthly partition that ends on or before
+    the cutoff; anything left (the default partition or non-PostgreSQL
+    backends) is removed with an indexed range DELETE.
+    """
+    dropped = 0
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            for name, month in list_partitions():
+                if next_month(month) <= cutoff:
+                    cursor.execute(f'DROP TABLE "{name}"')
+                    dropped += 1
+    with transaction.atomic():
+        deleted, _ = AuditLog.objects.filter(timestamp__lt=cutoff).delete()
+    return {'partitions_dropped': dropped, 'rows_deleted': deleted}
+
+
+def retention_cutoff(days: int, now: Optional[datetime] = None) -> datetime:
+    """Cutoff for a retention window; aligned to the hour so every rolled up hour is
+    complete, and to a month boundary when partitioned so whole partitions can be
+    dropped without re-rolling partial months."""
+    cutoff = (now or datetime.now(dt_timezone.utc)) - timedelta(days=days)
+    if is_partitioned():
+        return month_start(cutoff)
+    return cutoff.replace(minute=0, second=0, microsecond=0)
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.audit_retention import (
+    ensure_partitions, is_partitioned, month_start, next_month, purge_before, retention_cutoff, rollup_before,
+)
+
+
+class Command(BaseCommand):
+    help = 'Roll up expired AuditLog rows into hourly per-route aggregates and drop them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.AUDIT_RETENTION_DAYS,
+                            help='Keep raw audit rows for this many days')
+        parser.add_argument('--months-ahead', type=int, default=2,
+                            help='Pre-create this many future monthly partitions (PostgreSQL)')
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['days'])
+        self.stdout.write(f'Retention cutoff: {cutoff.isoformat()}')
+
+        # rollups are additive, so rows must leave with the transaction that counted them
+        with transaction.atomic():
+            rolled = rollup_before(cutoff)
+            result = purge_before(cutoff)
+        self.stdout.write(f'Wrote {rolled} hourly rollup rows')
+        self.stdout.write(
+            f"Dropped {result['partitions_dropped']} partitions, deleted {result['rows_deleted']} rows"
+        )
+
+        if is_partitioned():
+            end = month_start(datetime.now(dt_timezone.utc))
+            for _ in range(options['months_ahead'] + 1):
+                end = next_month(end)
+            created = ensure_partitions(datetime.now(dt_timezone.utc), end)
+            self.stdout.write(f'Ensured partitions: {", ".join(created)}')
+        self.stdout.write(self.style.SUCCESS('Audit retention finished'))
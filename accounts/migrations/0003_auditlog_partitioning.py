@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+def partition_auditlog(apps, schema_editor):
+    # Monthly range partitions on timestamp; other backends keep a plain table.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from accounts.audit_retention import convert_to_partitioned
+
+    convert_to_partitioned(schema_editor.connection)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_options_alter_user_managers_user_groups_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('route', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('p50_duration', models.FloatField(blank=True, null=True)),
+                ('p95_duration', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='accounts_au_timesta_276167_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='auditlogrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'route'), name='auditlogrollup_hour_route_uniq'),
+        ),
+        migrations.RunPython(partition_auditlog, migrations.RunPython.noop),
+    ]
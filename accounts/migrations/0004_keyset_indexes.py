@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_auditlog_partitioning'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='auditlog',
+            name='accounts_au_timesta_276167_idx',
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp', 'id'], name='auditlog_timestamp_id_idx'),
+        ),
+    ]
@@ -23,12 +23,30 @@ class AuditLog(models.Model):
     metadata = models.JSONField(default=dict, blank=True)
 
     class Meta:
-        indexes = [GinIndex(fields=['metadata'])]
+        # On PostgreSQL the table is range-partitioned by month on timestamp
+        # (migration 0003, see accounts/audit_retention.py).
+        indexes = [GinIndex(fields=['metadata']), models.Index(fields=['timestamp', 'id'], name='auditlog_timestamp_id_idx')]
 
     def __str__(self) -> str:  # pragma: no cover - trivial
         return f"{self.timestamp.isoformat()} {self.action}"
 
 
+class AuditLogRollup(models.Model):
+    """Hourly per-route aggregate of AuditLog rows older than the retention window."""
+    hour = models.DateTimeField()
+    route = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    p50_duration = models.FloatField(null=True, blank=True)
+    p95_duration = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['hour', 'route'], name='auditlogrollup_hour_route_uniq')]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.hour.isoformat()} {self.route} ({self.count})"
+
+
 class FarmerProfile(models.Model):
     user = models.OneToOneField('User', on_delete=models.CASCADE, related_name='farmer_profile')
     kyc_status = models.CharField(max_length=20, default='pending')
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import KYCDocument, FarmerProfile, BuyerProfile
+from .models import KYCDocument, FarmerProfile, BuyerProfile, AuditLog
 
 User = get_user_model()
 
@@ -72,4 +72,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         elif role == 'buyer':
             BuyerProfile.objects.create(user=user, kyc_status='pending')
 
-        return user
\ No newline at end of file
+        return user
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditLog
+        fields = ['id', 'user', 'action', 'timestamp', 'metadata']
+        read_only_fields = fields
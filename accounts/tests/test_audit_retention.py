@@ -0,0 +1,68 @@
+import pytest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection
+from django.utils import timezone
+from accounts.models import AuditLog, AuditLogRollup
+from accounts.audit_retention import (
+    convert_to_partitioned, is_partitioned, percentile, purge_before, retention_cutoff, rollup_before,
+)
+
+
+@pytest.mark.django_db
+def test_rollup_and_purge_old_audit_rows():
+    old = (timezone.now() - timedelta(days=120)).replace(minute=5, second=0, microsecond=0)
+    rows = [
+        AuditLog(action='GET /api/v1/marketplace/listings/', metadata={'status_code': 200, 'duration': d, 'route': 'listing-list'})
+        for d in (0.01, 0.02, 0.03, 0.04)
+    ]
+    rows.append(AuditLog(action='GET /api/v1/marketplace/listings/', metadata={'status_code': 500, 'duration': 1.0, 'route': 'listing-list'}))
+    rows.append(AuditLog(action='GET /recent/', metadata={'status_code': 200, 'duration': 0.01}))
+    AuditLog.objects.bulk_create(rows)
+    # timestamp is auto_now_add, so backdate after insert
+    AuditLog.objects.update(timestamp=old)
+    AuditLog.objects.create(action='GET /fresh/', metadata={'status_code': 200, 'duration': 0.01})
+
+    cutoff = timezone.now() - timedelta(days=90)
+    assert rollup_before(cutoff) == 2
+    rollup = AuditLogRollup.objects.get(route='GET listing-list')
+    assert rollup.count == 5
+    assert rollup.error_count == 1
+    assert rollup.p50_duration == 0.03
+    assert rollup.p95_duration == 1.0
+    assert AuditLogRollup.objects.filter(route='GET /recent/').exists()
+
+    assert purge_before(cutoff)['rows_deleted'] == 6
+    assert list(AuditLog.objects.values_list('action', flat=True)) == ['GET /fresh/']
+
+    # a late row for an hour already rolled up adds to it instead of replacing it
+    late = AuditLog.objects.create(action='GET /api/v1/marketplace/listings/',
+                                   metadata={'status_code': 502, 'duration': 2.0, 'route': 'listing-list'})
+    AuditLog.objects.filter(pk=late.pk).update(timestamp=old + timedelta(minutes=30))
+    assert rollup_before(cutoff) == 1
+    rollup = AuditLogRollup.objects.get(route='GET listing-list')
+    assert (rollup.count, rollup.error_count, rollup.p95_duration) == (6, 2, 2.0)
+    assert rollup.p50_duration == pytest.approx((0.03 * 5 + 2.0) / 6)
+
+
+def test_cutoff_is_aligned_to_the_hour():
+    now = datetime(2026, 3, 10, 14, 37, 12, tzinfo=dt_timezone.utc)
+    assert retention_cutoff(1, now) == datetime(2026, 3, 9, 14, tzinfo=dt_timezone.utc)
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 95) == 4.0
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='table partitioning is PostgreSQL only')
+def test_convert_to_partitioned_keeps_ids_and_a_working_sequence():
+    kept = AuditLog.objects.create(action='GET /before/', metadata={})
+    convert_to_partitioned(connection)
+    assert is_partitioned()
+    assert AuditLog.objects.get(pk=kept.pk).action == 'GET /before/'
+    assert AuditLog.objects.create(action='GET /after/', metadata={}).pk > kept.pk
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence('accounts_auditlog', 'id')")
+        assert cursor.fetchone()[0] == 'public.accounts_auditlog_id_seq'
@@ -9,4 +9,7 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('me/', views.MeView.as_view(), name='api-me'),
     path('kyc/upload/', views.KYCUploadView.as_view(), name='api-kyc-upload'),
+    path('kyc/<int:pk>/download/', views.KYCDocumentDownloadView.as_view(), name='api-kyc-download'),
+    path('kyc/<int:pk>/link/', views.KYCDocumentLinkView.as_view(), name='api-kyc-link'),
+    path('audit-logs/', views.AuditLogViewSet.as_view({'get': 'list'}), name='audit-log-list'),
 ]
@@ -5,9 +5,10 @@ from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .serializers import RegisterSerializer, UserSerializer, KYCDocumentSerializer
-from .models import KYCDocument, FarmerProfile, BuyerProfile
+from .serializers import RegisterSerializer, UserSerializer, KYCDocumentSerializer, AuditLogSerializer
+from .models import KYCDocument, FarmerProfile, BuyerProfile, AuditLog
 from rest_framework.parsers import MultiPartParser, FormParser
+from core.downloads import download_settings, serve_file, signed_url
 import logging
 
 logger = logging.getLogger(__name__)
@@ -91,4 +92,46 @@ class KYCUploadView(APIView):
         )
 
         serializer = KYCDocumentSerializer(kyc_doc)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+def _kyc_document_for(request, pk):
+    queryset = KYCDocument.objects.all()
+    if not request.user.is_staff:
+        queryset = queryset.filter(user=request.user)
+    return queryset.filter(pk=pk).first()
+
+
+class KYCDocumentDownloadView(APIView):
+    """Download a KYC document (its owner or staff only)."""
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
+
+    def get(self, request, pk, *args, **kwargs):
+        kyc_doc = _kyc_document_for(request, pk)
+        if kyc_doc is None:
+            return Response({"error": "Document not found."}, status=status.HTTP_404_NOT_FOUND)
+        return serve_file(request, kyc_doc.document.name)
+
+
+class KYCDocumentLinkView(APIView):
+    """Expiring download URL for a KYC document; the link itself needs no lookup."""
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 2
+
+    def get(self, request, pk, *args, **kwargs):
+        kyc_doc = _kyc_document_for(request, pk)
+        if kyc_doc is None:
+            return Response({"error": "Document not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'url': signed_url(request, kyc_doc.document.name),
+                         'expires_in': download_settings()['URL_MAX_AGE']})
+
+
+# ✅ 4. /api/v1/accounts/audit-logs/
+class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """Admin-only audit trail, newest first, paged by (timestamp, id) cursor."""
+    queryset = AuditLog.objects.all()
+    serializer_class = AuditLogSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_mode = 'keyset'
+    keyset_fields = ('timestamp', 'id')
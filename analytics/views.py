@@ -2,27 +2,28 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Count, Avg, Q, F
 from django.utils import timezone
 from datetime import timedelta
-from contracts.models import Contract, EscrowTransaction, Shipment
+from contracts.models import Contract, EscrowBalance, Shipment
+from core.querybudget import query_budget
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def farmer_revenue(request):
-    """GET /api/v1/analytics/farmer-revenue/ - farmer revenue from completed contracts."""
+    """GET /api/v1/analytics/farmer-revenue/ - farmer revenue and outstanding escrow from the running balance."""
     if request.user.role != 'farmer':
         return Response({'detail': 'Only farmers can view revenue'}, status=status.HTTP_403_FORBIDDEN)
     
-    total = EscrowTransaction.objects.filter(
-        contract__listing__farmer=request.user,
-        status='released'
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
+    balance = EscrowBalance.objects.filter(party=request.user).values('revenue', 'outstanding').first() or {}
     
-    return Response({'farmer_id': request.user.id, 'total_revenue': total})
+    return Response({'farmer_id': request.user.id, 'total_revenue': balance.get('revenue', 0),
+                     'outstanding_escrow': balance.get('outstanding', 0)})
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def active_contracts(request):
@@ -36,6 +37,7 @@ def active_contracts(request):
     return Response({'user_id': user.id, 'active_contracts': count})
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def avg_delivery_time(request):
@@ -45,7 +47,7 @@ def avg_delivery_time(request):
         contract__listing__farmer=user,
         delivered=True
     ).annotate(
-        days_to_delivery=models.F('delivery_date') - models.F('contract__start_date')
+        days_to_delivery=F('delivery_date') - F('contract__start_date')
     )
     
     avg_days = shipments.aggregate(Avg('days_to_delivery'))['days_to_delivery__avg']
@@ -53,6 +55,7 @@ def avg_delivery_time(request):
     return Response({'avg_days_to_delivery': avg_days})
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def proposals_acceptance_rate(request):
@@ -61,8 +64,11 @@ def proposals_acceptance_rate(request):
     total = request.query_params.get('user', user.id)
     
     from contracts.models import PriceProposal
-    accepted = PriceProposal.objects.filter(proposer=user, accepted=True).count()
-    total_proposals = PriceProposal.objects.filter(proposer=user).count()
+    counts = PriceProposal.objects.filter(proposer=user).aggregate(
+        total=Count('id'), accepted=Count('id', filter=Q(accepted=True))
+    )
+    accepted = counts['accepted']
+    total_proposals = counts['total']
     
     rate = (accepted / total_proposals * 100) if total_proposals > 0 else 0
     
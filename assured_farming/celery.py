@@ -11,3 +11,5 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Autodiscover tasks in all installed apps' tasks.py modules
 app.autodiscover_tasks()
+# payments.tasks_pdf is not a tasks.py module, so name it explicitly
+app.autodiscover_tasks(['payments'], related_name='tasks_pdf')
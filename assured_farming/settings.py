@@ -1,5 +1,6 @@
 # assured_farming/settings.py
 import os
+import tempfile
 from pathlib import Path
 import environ
 import dj_database_url
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third-party
     'rest_framework',
@@ -94,6 +96,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.RequestAuditMiddleware',
+    'core.querybudget.QueryBudgetMiddleware',
 ]
 
 # -------------------------------------------------------------------
@@ -183,6 +186,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 
+# -------------------------------------------------------------------
+# CACHE
+# -------------------------------------------------------------------
+# Local-memory cache by default (and in tests); point CACHE_BACKEND at
+# django.core.cache.backends.redis.RedisCache with CACHE_LOCATION=REDIS_URL
+# so invalidation is shared across workers in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default=''),
+    }
+}
+
+LISTING_FEED_CACHE_TIMEOUT = env.int('LISTING_FEED_CACHE_TIMEOUT', default=300)
+
+# Seconds between checks of the shared crop catalog version (marketplace/registry.py)
+CROP_REGISTRY_CHECK_INTERVAL = env.float('CROP_REGISTRY_CHECK_INTERVAL', default=1.0)
+
+# Local place-name gazetteer used to geocode Listing.location (marketplace/geo.py)
+LISTING_GAZETTEER_PATH = env('LISTING_GAZETTEER_PATH', default=str(BASE_DIR / 'marketplace' / 'data' / 'gazetteer.csv'))
+
 # -------------------------------------------------------------------
 # REDIS / CELERY
 # -------------------------------------------------------------------
@@ -197,6 +222,148 @@ CELERY_RESULT_SERIALIZER = 'json'
 # Run tasks eagerly in local development unless explicitly disabled
 CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default=True)
 
+CELERY_BEAT_SCHEDULE = {
+    # reconcile the incrementally maintained listing facet counts
+    'rebuild-listing-facets': {
+        'task': 'marketplace.tasks.rebuild_listing_facets_task',
+        'schedule': env.float('LISTING_FACETS_REBUILD_SECONDS', default=3600.0),
+    },
+    # hand committed outbox messages to Celery (notifications/outbox.py)
+    'relay-outbox': {
+        'task': 'notifications.tasks.relay_outbox_task',
+        'schedule': env.float('OUTBOX_RELAY_SECONDS', default=2.0),
+    },
+    # cancel draft/proposed contracts older than CONTRACT_OFFER_EXPIRY_DAYS
+    'expire-contract-offers': {
+        'task': 'contracts.tasks.expire_contract_offers_task',
+        'schedule': env.float('CONTRACT_EXPIRY_SWEEP_SECONDS', default=3600.0),
+    },
+    # release held escrows ESCROW_AUTO_RELEASE_DAYS after delivery (contracts/escrow.py)
+    'auto-release-escrows': {
+        'task': 'contracts.tasks.auto_release_escrows_task',
+        'schedule': env.float('ESCROW_RELEASE_SWEEP_SECONDS', default=900.0),
+    },
+    # apply queued gateway webhooks missed by the per-receipt kick (payments/webhooks.py)
+    'process-webhooks': {
+        'task': 'payments.tasks.process_webhook_events_task',
+        'schedule': env.float('WEBHOOK_QUEUE_SECONDS', default=5.0),
+    },
+}
+
+# Contract PDFs render on a dedicated queue so slow renders never delay other
+# tasks: `celery -A assured_farming worker -Q pdf --concurrency=<cores>` with
+# PDF_WARM_ON_START=1 keeps the engine and fonts loaded in every process.
+CELERY_TASK_ROUTES = {
+    'payments.tasks_pdf.*': {'queue': 'pdf'},
+}
+
+PDF_RENDERING = {
+    'BATCH_SIZE': env.int('PDF_BATCH_SIZE', default=50),
+    'WARM_ON_START': env.bool('PDF_WARM_ON_START', default=False),
+}
+
+# Contract PDFs and KYC documents are served by core/downloads.py after a
+# permission check. BACKEND 'nginx' hands off with X-Accel-Redirect to
+# INTERNAL_PREFIX (an `internal` location aliasing MEDIA_ROOT), 'apache' with
+# X-Sendfile, and 'django' streams a FileResponse (os.sendfile under gunicorn).
+# URL_MAX_AGE bounds signed download links, in seconds.
+PROTECTED_MEDIA = {
+    'BACKEND': env('PROTECTED_MEDIA_BACKEND', default='django'),
+    'INTERNAL_PREFIX': env('PROTECTED_MEDIA_INTERNAL_PREFIX', default='/protected-media/'),
+    'URL_MAX_AGE': env.int('PROTECTED_MEDIA_URL_MAX_AGE', default=300),
+}
+
+# Unanswered contract offers are expired (contracts/transitions.py) after this many days.
+CONTRACT_OFFER_EXPIRY_DAYS = env.int('CONTRACT_OFFER_EXPIRY_DAYS', default=14)
+
+# Held escrow is released automatically this many days after delivery unless a
+# dispute is open (contracts/escrow.py sweep_releasable).
+ESCROW_AUTO_RELEASE_DAYS = env.int('ESCROW_AUTO_RELEASE_DAYS', default=7)
+
+# Transactional outbox relay; dedicated relays run `manage.py run_outbox_relay`.
+OUTBOX = {
+    'BATCH_SIZE': env.int('OUTBOX_BATCH_SIZE', default=100),
+    'MAX_ATTEMPTS': env.int('OUTBOX_MAX_ATTEMPTS', default=10),
+}
+
+# Gateway webhooks are recorded on receipt and applied asynchronously;
+# dedicated processors run `manage.py process_webhooks --loop`. Events for an
+# escrow that does not exist yet are retried up to MAX_ATTEMPTS times.
+# PROCESS_ON_COMMIT schedules processing after each receipt.
+WEBHOOK_QUEUE = {
+    'BATCH_SIZE': env.int('WEBHOOK_QUEUE_BATCH_SIZE', default=500),
+    'MAX_ATTEMPTS': env.int('WEBHOOK_QUEUE_MAX_ATTEMPTS', default=8),
+    'PROCESS_ON_COMMIT': env.bool('WEBHOOK_QUEUE_PROCESS_ON_COMMIT', default=True),
+}
+
+# -------------------------------------------------------------------
+# PAYMENT GATEWAY
+# -------------------------------------------------------------------
+# Settings for the local stand-in gateway (payments/mock_gateway.py).
+# LATENCY_MS and FAILURE_RATE simulate a slow, flaky provider; AUTO_WEBHOOK
+# sends the `held` webhook once a charge is created.
+
+PAYMENT_GATEWAY = {
+    'LATENCY_MS': env.int('PAYMENT_GATEWAY_LATENCY_MS', default=0),
+    'FAILURE_RATE': env.float('PAYMENT_GATEWAY_FAILURE_RATE', default=0.0),
+    'AUTO_WEBHOOK': env.bool('PAYMENT_GATEWAY_AUTO_WEBHOOK', default=True),
+    # talk to a gateway over HTTP instead, e.g. `manage.py run_gateway_simulator`
+    # with WEBHOOK_URL pointing back at /api/v1/payments/mock/webhook/
+    'URL': env('PAYMENT_GATEWAY_URL', default=''),
+    'WEBHOOK_URL': env('PAYMENT_GATEWAY_WEBHOOK_URL', default=''),
+    'TIMEOUT': env.float('PAYMENT_GATEWAY_TIMEOUT', default=10.0),
+}
+
+# -------------------------------------------------------------------
+# AUDIT LOG BUFFERING
+# -------------------------------------------------------------------
+# When enabled, RequestAuditMiddleware queues rows in-process and writes them
+# with bulk_create (see core/audit.py). OVERFLOW is 'drop' or 'block'.
+
+AUDIT_BUFFER = {
+    'ENABLED': env.bool('AUDIT_BUFFER_ENABLED', default=False),
+    'MAX_SIZE': env.int('AUDIT_BUFFER_MAX_SIZE', default=10000),
+    'BATCH_SIZE': env.int('AUDIT_BUFFER_BATCH_SIZE', default=200),
+    'FLUSH_INTERVAL': env.float('AUDIT_BUFFER_FLUSH_INTERVAL', default=5.0),
+    'OVERFLOW': env('AUDIT_BUFFER_OVERFLOW', default='drop'),
+    'BLOCK_TIMEOUT': env.float('AUDIT_BUFFER_BLOCK_TIMEOUT', default=0.05),
+    'USE_CELERY': env.bool('AUDIT_BUFFER_USE_CELERY', default=False),
+}
+
+# Raw AuditLog rows older than this are rolled up into hourly AuditLogRollup
+# rows and purged by `manage.py audit_retention`.
+AUDIT_RETENTION_DAYS = env.int('AUDIT_RETENTION_DAYS', default=90)
+
+# -------------------------------------------------------------------
+# REQUEST METRICS
+# -------------------------------------------------------------------
+# Per-route latency histograms served at /metrics. Workers write snapshots
+# into DIR, which must be shared by all gunicorn workers on the host and is
+# cleared by start.sh before gunicorn boots. Set TOKEN for the scraper;
+# without it /metrics is only served in DEBUG or to staff users.
+
+METRICS = {
+    'ENABLED': env.bool('METRICS_ENABLED', default=True),
+    'DIR': env('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'assured_farming_metrics')),
+    'SYNC_INTERVAL': env.float('METRICS_SYNC_INTERVAL', default=1.0),
+    'TOKEN': env('METRICS_TOKEN', default=''),
+}
+
+# -------------------------------------------------------------------
+# QUERY BUDGETS
+# -------------------------------------------------------------------
+# Opt-in per-request query counting (core/querybudget.py). Views declare
+# `query_budget`; DEFAULT applies to views without one. RAISE turns
+# violations into QueryBudgetExceeded instead of a logged warning, but only
+# with DEBUG: in production an over-budget request is logged, never failed.
+
+QUERY_BUDGET = {
+    'ENABLED': env.bool('QUERY_BUDGET_ENABLED', default=False),
+    'RAISE': env.bool('QUERY_BUDGET_RAISE', default=False),
+    'DEFAULT': None,
+    'N_PLUS_ONE_THRESHOLD': env.int('QUERY_BUDGET_N_PLUS_ONE_THRESHOLD', default=5),
+}
+
 # -------------------------------------------------------------------
 # REST FRAMEWORK / DRF SPECTACULAR
 # -------------------------------------------------------------------
@@ -206,7 +373,7 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.HybridPagination',
     'PAGE_SIZE': 20,
 }
 
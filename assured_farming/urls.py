@@ -2,11 +2,14 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from core.admin_dashboard import admin_dashboard
+from core.downloads import signed_download_view
+from core.metrics import metrics_view
 from django.views.generic import RedirectView  # 👈 add this import
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('admin/dashboard/', admin_dashboard, name='admin-dashboard'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/v1/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/v1/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/v1/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
@@ -15,6 +18,7 @@ urlpatterns = [
     path('api/v1/contracts/', include('contracts.urls')),
     path('api/v1/payments/', include('payments.urls')),
     path('api/v1/analytics/', include('analytics.urls')),
+    path('api/v1/downloads/<str:token>/', signed_download_view, name='signed-download'),
 
     # 👇 Redirect root ("/") to Swagger UI
     path('', RedirectView.as_view(url='/api/v1/schema/swagger-ui/', permanent=False)),
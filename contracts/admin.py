@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Contract, PriceProposal, EscrowTransaction, Shipment, Dispute
+from .models import Contract, PriceProposal, EscrowTransaction, EscrowLedgerEntry, EscrowBalance, Shipment, Dispute
 
 
 @admin.register(Contract)
@@ -16,6 +16,29 @@ class PriceProposalAdmin(admin.ModelAdmin):
 @admin.register(EscrowTransaction)
 class EscrowAdmin(admin.ModelAdmin):
     list_display = ('id', 'contract', 'amount', 'status', 'payment_reference')
+    # status changes go through contracts.ledger.record_changes, never a form
+    readonly_fields = ('status', 'amount')
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(EscrowLedgerEntry)
+class EscrowLedgerEntryAdmin(ReadOnlyAdmin):
+    list_display = ('id', 'escrow', 'from_status', 'to_status', 'amount', 'created_at')
+
+
+@admin.register(EscrowBalance)
+class EscrowBalanceAdmin(ReadOnlyAdmin):
+    list_display = ('party', 'revenue', 'outstanding', 'in_escrow', 'paid', 'refunded', 'updated_at')
 
 
 @admin.register(Shipment)
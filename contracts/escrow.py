@@ -0,0 +1,99 @@
+"""Escrow releases shared by delivery confirmation, tracking ingestion and the sweeper.
+
+Releases are batched: the held escrows of every contract in the batch are
+locked with one ``SELECT ... FOR UPDATE`` (in id order, so concurrent
+batches cannot deadlock) and released with one UPDATE.
+
+Held escrows that those paths left behind (a dispute since resolved, a
+delivery recorded without a release) are released by ``sweep_releasable``
+once ``ESCROW_AUTO_RELEASE_DAYS`` have passed since delivery, from beat or
+``manage.py release_escrows``.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from notifications.outbox import enqueue_many
+
+from .ledger import record_changes
+from .models import Dispute, EscrowTransaction, Shipment
+
+logger = logging.getLogger(__name__)
+
+OPEN_DISPUTE_STATUSES = ('open', 'under_review')
+
+
+def open_disputes() -> QuerySet:
+    return Dispute.objects.filter(status__in=OPEN_DISPUTE_STATUSES)
+
+
+def release_escrows(contract_ids: Iterable[int]) -> List[int]:
+    """Release held escrow for the given contracts unless a dispute is open.
+
+    Must run inside a transaction; returns the ids of the contracts whose
+    escrow was released.
+    """
+    contract_ids = list(contract_ids)
+    if not contract_ids:
+        return []
+    escrows = list(
+        EscrowTransaction.objects.select_for_update()
+        .filter(contract_id__in=contract_ids, status='held')
+        .exclude(contract_id__in=open_disputes().values('contract_id'))
+        .order_by('pk').values_list('pk', 'contract_id')
+    )
+    if escrows:
+        EscrowTransaction.objects.filter(pk__in=[pk for pk, _ in escrows]).update(status='released')
+        record_changes((pk, 'held', 'released') for pk, _ in escrows)
+    return [contract_id for _, contract_id in escrows]
+
+
+def releasable_escrows(hold_days: Optional[int] = None, today: Optional[date] = None) -> QuerySet:
+    """Held escrows delivered at least ``hold_days`` ago with no open dispute.
+
+    Driven by the partial indexes on delivered shipments and held escrows.
+    """
+    days = hold_days if hold_days is not None else getattr(settings, 'ESCROW_AUTO_RELEASE_DAYS', 7)
+    cutoff = (today or timezone.localdate()) - timedelta(days=days)
+    delivered = Shipment.objects.filter(delivered=True, delivery_date__lte=cutoff).values('contract_id')
+    return (
+        EscrowTransaction.objects.filter(status='held', contract_id__in=delivered)
+        .exclude(contract_id__in=open_disputes().values('contract_id'))
+    )
+
+
+def sweep_releasable(hold_days: Optional[int] = None, chunk_size: int = 500,
+                     max_chunks: Optional[int] = None) -> Dict[str, int]:
+    """Release ``releasable_escrows`` in chunks; returns released, chunks and still-eligible counts.
+
+    Each chunk is claimed with ``FOR UPDATE SKIP LOCKED``, so several
+    sweepers share the work, then released with one UPDATE and announced
+    with one outbox insert in the same transaction.
+    """
+    queryset = releasable_escrows(hold_days).order_by('pk')
+    released = chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        with transaction.atomic():
+            claimed = list(
+                queryset.select_for_update(skip_locked=True, of=('self',))
+                .values_list('pk', 'contract_id')[:chunk_size]
+            )
+            if not claimed:
+                break
+            EscrowTransaction.objects.filter(pk__in=[pk for pk, _ in claimed], status='held') \
+                .update(status='released')
+            record_changes((pk, 'held', 'released') for pk, _ in claimed)
+            enqueue_many('payments.tasks.send_email_task', [
+                ('escrow_released', {'contract_id': contract_id, 'automatic': True}) for _, contract_id in claimed
+            ], topic='email.escrow_released')
+        released += len(claimed)
+        chunks += 1
+    remaining = releasable_escrows(hold_days).count() if max_chunks is not None else 0
+    if released:
+        logger.info('Auto-released %s escrows in %s chunks (%s still eligible)', released, chunks, remaining)
+    return {'released': released, 'chunks': chunks, 'remaining': remaining}
@@ -0,0 +1,190 @@
+"""Append-only escrow ledger and per-party running balances.
+
+Every path that changes an escrow's status calls ``record_changes`` in the
+same transaction. It appends one ``EscrowLedgerEntry`` per change and adds
+the change's effect to the ``EscrowBalance`` rows of the contract's buyer
+and farmer. Revenue and outstanding escrow are then single-row reads, however
+long a party's history is.
+
+An escrow's amount counts towards the positions of its status: ``held`` is
+the farmer's ``outstanding`` and the buyer's ``in_escrow``, ``released`` is
+the farmer's ``revenue`` and the buyer's ``paid``, and ``refunded`` is the
+buyer's ``refunded``. A change moves the amount from one status's positions
+to the other's; an escrow voided before the buyer was charged is booked at
+zero. Balances are updated with one additive
+``INSERT ... ON CONFLICT (party_id) DO UPDATE`` per batch, in party order so
+concurrent batches take row locks in the same order.
+
+``manage.py rebuild_escrow_balances`` recomputes balances from the ledger,
+reports escrows whose status the ledger does not reflect, and can repair
+both.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import EscrowBalance, EscrowLedgerEntry, EscrowTransaction
+
+BALANCE_FIELDS = ('outstanding', 'revenue', 'in_escrow', 'paid', 'refunded')
+POSITIONS = {
+    'held': (('farmer', 'outstanding'), ('buyer', 'in_escrow')),
+    'released': (('farmer', 'revenue'), ('buyer', 'paid')),
+    'refunded': (('buyer', 'refunded'),),
+}
+
+
+def balance_deltas(from_status: str, to_status: str, amount: Decimal) -> Dict[Tuple[str, str], Decimal]:
+    """``{(role, field): delta}`` for one escrow moving between statuses."""
+    deltas = defaultdict(Decimal)
+    for role, name in POSITIONS.get(from_status, ()):
+        deltas[(role, name)] -= amount
+    for role, name in POSITIONS.get(to_status, ()):
+        deltas[(role, name)] += amount
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def _party_totals(entries: Iterable[Tuple[str, str, Decimal, int, int]]) -> Dict[int, Dict[str, Decimal]]:
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    for from_status, to_status, amount, buyer_id, farmer_id in entries:
+        parties = {'buyer': buyer_id, 'farmer': farmer_id}
+        for (role, name), delta in balance_deltas(from_status, to_status, amount).items():
+            totals[parties[role]][name] += delta
+    return totals
+
+
+def _supports_upsert() -> bool:
+    return connection.vendor in ('postgresql', 'sqlite')
+
+
+def _add_to_balances(totals: Dict[int, Dict[str, Decimal]]) -> None:
+    rows = sorted(totals.items())
+    if not rows:
+        return
+    now = timezone.now()
+    if not _supports_upsert():
+        for party_id, deltas in rows:
+            EscrowBalance.objects.get_or_create(party_id=party_id)
+            EscrowBalance.objects.filter(party_id=party_id).update(
+                updated_at=now, **{name: F(name) + delta for name, delta in deltas.items()}
+            )
+        return
+
+    opts = EscrowBalance._meta
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    columns = [opts.get_field(name).column for name in BALANCE_FIELDS]
+    decimal_field = opts.get_field('revenue')
+    params = []
+    for party_id, deltas in rows:
+        params += [party_id, *(decimal_field.get_db_prep_save(deltas.get(name, Decimal('0')), connection)
+                               for name in BALANCE_FIELDS),
+                   opts.get_field('updated_at').get_db_prep_save(now, connection)]
+    placeholders = f'({", ".join(["%s"] * (len(BALANCE_FIELDS) + 2))})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({quote("party_id")}, {", ".join(quote(c) for c in columns)}, '
+            f'{quote("updated_at")}) VALUES {", ".join([placeholders] * len(rows))} '
+            f'ON CONFLICT ({quote("party_id")}) DO UPDATE SET '
+            + ', '.join(f'{quote(c)} = {table}.{quote(c)} + EXCLUDED.{quote(c)}' for c in columns)
+            + f', {quote("updated_at")} = EXCLUDED.{quote("updated_at")}',
+            params,
+        )
+
+
+def record_changes(changes: Iterable[Tuple[int, str, str]], unfunded: bool = False) -> List[EscrowLedgerEntry]:
+    """Append ``(escrow_id, from_status, to_status)`` changes and update the parties' balances.
+
+    Must run in the transaction that changed the statuses: one query for
+    the escrows' amounts and parties, one insert and one balance upsert.
+    ``unfunded`` books the changes at zero, for escrows voided before the
+    gateway charged the buyer.
+    """
+    changes = [change for change in changes if change[1] != change[2]]
+    if not changes:
+        return []
+    escrows = {
+        pk: (amount, buyer_id, farmer_id)
+        for pk, amount, buyer_id, farmer_id in EscrowTransaction.objects.filter(
+            pk__in={pk for pk, _, _ in changes}
+        ).values_list('pk', 'amount', 'contract__buyer_id', 'contract__listing__farmer_id')
+    }
+    now = timezone.now()
+    entries = EscrowLedgerEntry.objects.bulk_create([
+        EscrowLedgerEntry(escrow_id=pk, from_status=from_status, to_status=to_status, amount=Decimal('0') if unfunded else escrows[pk][0],
+                          buyer_id=escrows[pk][1], farmer_id=escrows[pk][2], created_at=now)
+        for pk, from_status, to_status in changes
+    ], batch_size=500)
+    _add_to_balances(_party_totals(
+        (entry.from_status, entry.to_status, entry.amount, entry.buyer_id, entry.farmer_id) for entry in entries
+    ))
+    return entries
+
+
+def ledger_totals() -> Dict[int, Dict[str, Decimal]]:
+    """Balances recomputed from the whole ledger, by party."""
+    return _party_totals(
+        EscrowLedgerEntry.objects.order_by().values_list('from_status', 'to_status', 'amount', 'buyer_id',
+                                                         'farmer_id').iterator(chunk_size=5000)
+    )
+
+
+def balance_mismatches() -> Dict[int, Dict[str, Tuple[Decimal, Decimal]]]:
+    """``{party: {field: (stored, from ledger)}}`` wherever the two disagree."""
+    expected = ledger_totals()
+    stored = {row['party_id']: row for row in EscrowBalance.objects.values('party_id', *BALANCE_FIELDS)}
+    mismatches = {}
+    for party_id in set(expected) | set(stored):
+        row = stored.get(party_id, {})
+        diff = {
+            name: (row.get(name, Decimal('0')), expected.get(party_id, {}).get(name, Decimal('0')))
+            for name in BALANCE_FIELDS
+        }
+        diff = {name: values for name, values in diff.items() if values[0] != values[1]}
+        if diff:
+            mismatches[party_id] = diff
+    return mismatches
+
+
+def rewrite_balances() -> int:
+    """Replace every balance row with the ledger's totals; returns the number of parties."""
+    expected = ledger_totals()
+    now = timezone.now()
+    with transaction.atomic():
+        EscrowBalance.objects.all().delete()
+        EscrowBalance.objects.bulk_create([
+            EscrowBalance(party_id=party_id, updated_at=now,
+                          **{name: totals.get(name, Decimal('0')) for name in BALANCE_FIELDS})
+            for party_id, totals in sorted(expected.items())
+        ], batch_size=1000)
+    return len(expected)
+
+
+def unrecorded_escrows():
+    """Escrows whose status differs from the last status the ledger recorded (``pending`` if none)."""
+    last = EscrowLedgerEntry.objects.filter(escrow=OuterRef('pk')).order_by('-id').values('to_status')[:1]
+    return EscrowTransaction.objects.annotate(
+        ledger_status=Coalesce(Subquery(last), Value('pending'))
+    ).exclude(status=F('ledger_status'))
+
+
+def backfill(chunk_size: int = 1000) -> int:
+    """Append correcting entries for ``unrecorded_escrows``; returns how many were appended."""
+    appended = 0
+    while True:
+        with transaction.atomic():
+            rows = list(unrecorded_escrows().select_for_update(of=('self',)).order_by('pk')
+                        .values_list('pk', 'ledger_status', 'status', 'charge_id')[:chunk_size])
+            changes = {True: [], False: []}
+            for pk, ledger_status, status, charge_id in rows:
+                unfunded = (ledger_status, status, charge_id) == ('pending', 'refunded', '')
+                changes[unfunded].append((pk, ledger_status, status))
+            record_changes(changes[False])
+            record_changes(changes[True], unfunded=True)
+        appended += len(rows)
+        if len(rows) < chunk_size:
+            return appended
@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from contracts.models import Contract, PriceProposal
+from marketplace.models import Crop, Listing
+
+URL = '/api/v1/contracts/contracts/'
+MODES = [
+    ('full (expand=listing,proposals)', {'expand': 'listing,proposals'}),
+    ('compact (proposals_summary)', {}),
+    ('sparse (fields=id,status,total_value)', {'fields': 'id,status,total_value'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark contract list latency (default 1k contracts x 20 proposals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=1000)
+        parser.add_argument('--proposals', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=100, help='Page size requested')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        farmer, _ = User.objects.get_or_create(username='bench_contract_farmer', defaults={'role': 'farmer'})
+        buyer, _ = User.objects.get_or_create(username='bench_contract_buyer', defaults={'role': 'buyer'})
+        crop, _ = Crop.objects.get_or_create(name='Bench crop')
+        listing = Listing.objects.create(farmer=farmer, crop=crop, quantity_available=10 ** 6,
+                                         harvest_date=timezone.now().date(), price_floor=20)
+        contracts = Contract.objects.bulk_create(
+            [Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25,
+                      status='proposed') for _ in range(options['contracts'])],
+            batch_size=500,
+        )
+        PriceProposal.objects.bulk_create(
+            [PriceProposal(contract=contract, proposer=buyer if i % 2 else farmer, price_per_unit=20 + i)
+             for contract in contracts for i in range(options['proposals'])],
+            batch_size=2000,
+        )
+
+        client = APIClient()
+        client.force_authenticate(buyer)
+        try:
+            for label, params in MODES:
+                params = {**params, 'limit': options['limit']}
+                client.get(URL, params)  # warm caches and the crop registry
+                timings, size = [], 0
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        t0 = time.perf_counter()
+                        response = client.get(URL, params)
+                        timings.append(time.perf_counter() - t0)
+                    size = len(response.content)
+                self.stdout.write(
+                    f'{label:40s} p50 {statistics.median(timings) * 1000:7.1f} ms  '
+                    f'max {max(timings) * 1000:7.1f} ms  {len(queries)} queries  {size / 1024:.0f} KiB'
+                )
+        finally:
+            if not options['keep']:
+                listing.delete()
@@ -0,0 +1,41 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from contracts.tracking import TrackingIngestor
+from marketplace.importer import FORMAT_NDJSON, iter_lines, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Apply shipment tracking events from an NDJSON file ("-" for stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--errors-file', help='Write every event error here as NDJSON')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        errors_file = open(options['errors_file'], 'w') if options['errors_file'] else None
+
+        def on_error(row_number, errors):
+            if errors_file:
+                errors_file.write(json.dumps({'row': row_number, 'errors': errors}) + '\n')
+
+        ingestor = TrackingIngestor(batch_size=options['batch_size'], max_errors=20, on_error=on_error)
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8-sig')
+        try:
+            report = ingestor.run(iter_rows(iter_lines(source), FORMAT_NDJSON))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if errors_file:
+                errors_file.close()
+
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Applied {report.applied} events: {report.delivered} delivered, '
+            f'{report.released} escrows released, {report.failed} failed'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contracts.ledger import backfill, balance_mismatches, rewrite_balances, unrecorded_escrows
+
+
+class Command(BaseCommand):
+    help = 'Verify escrow running balances against the ledger, and optionally repair them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help='Append ledger entries for escrows whose status the ledger does not reflect')
+        parser.add_argument('--fix', action='store_true', help='Rewrite every balance from the ledger')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            appended = backfill(options['chunk_size'])
+            self.stdout.write(f'Appended {appended} ledger entries')
+        if options['fix']:
+            parties = rewrite_balances()
+            self.stdout.write(f'Rewrote balances for {parties} parties')
+
+        unrecorded = unrecorded_escrows().count()
+        mismatches = balance_mismatches()
+        for party_id, fields in sorted(mismatches.items()):
+            detail = ', '.join(f'{name} {stored} != {expected}' for name, (stored, expected) in fields.items())
+            self.stdout.write(f'party {party_id}: {detail}')
+        if unrecorded or mismatches:
+            raise CommandError(f'{len(mismatches)} balances disagree with the ledger; '
+                               f'{unrecorded} escrows are missing from it')
+        self.stdout.write(self.style.SUCCESS('Escrow balances match the ledger'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from contracts.escrow import releasable_escrows, sweep_releasable
+
+
+class Command(BaseCommand):
+    help = 'Release held escrows whose post-delivery hold has elapsed and that have no open dispute'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hold-days', type=int, default=None,
+                            help='Days after delivery (default ESCROW_AUTO_RELEASE_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--max-chunks', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the eligible escrows')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = releasable_escrows(options['hold_days']).count()
+            self.stdout.write(f'{count} escrows eligible for release')
+            return
+        result = sweep_releasable(options['hold_days'], chunk_size=options['chunk_size'],
+                                  max_chunks=options['max_chunks'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Released {result['released']} escrows in {result['chunks']} chunks"
+            + (f"; {result['remaining']} still eligible" if result['remaining'] else '')
+        ))
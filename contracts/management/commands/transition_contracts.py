@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contracts.models import Contract
+from contracts.transitions import TRANSITIONS, bulk_transition, expire_stale_offers
+
+
+class Command(BaseCommand):
+    help = 'Apply a contract transition in bulk, or expire stale offers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('transition', choices=sorted(TRANSITIONS))
+        parser.add_argument('--ids', default='', help='Comma-separated contract ids')
+        parser.add_argument('--status', default='', help='Only contracts currently in this status')
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='With "expire": offer age (default CONTRACT_OFFER_EXPIRY_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        name = options['transition']
+        if name == 'expire' and not (options['ids'] or options['status']):
+            result = expire_stale_offers(options['older_than_days'])
+        else:
+            queryset = Contract.objects.all()
+            if options['ids']:
+                try:
+                    queryset = queryset.filter(pk__in=[int(pk) for pk in options['ids'].split(',') if pk.strip()])
+                except ValueError:
+                    raise CommandError('--ids must be comma-separated integers')
+            elif not options['status']:
+                raise CommandError('Select contracts with --ids or --status')
+            if options['status']:
+                queryset = queryset.filter(status=options['status'])
+            result = bulk_transition(name, queryset, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"{result['moved']} contracts moved to {result['target']} ({name})"))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0002_alter_contract_agreed_quantity_and_more'),
+        ('marketplace', '0007_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['created_at', 'id'], name='contract_created_id_idx'),
+        ),
+    ]
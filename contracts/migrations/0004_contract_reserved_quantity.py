@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:49
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contract',
+            name='reserved_quantity',
+            field=models.DecimalField(decimal_places=3, default=Decimal('0'), editable=False, max_digits=12),
+        ),
+    ]
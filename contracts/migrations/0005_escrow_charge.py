@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0004_contract_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='charge_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='charge_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
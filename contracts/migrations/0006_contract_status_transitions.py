@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def pending_to_proposed(apps, schema_editor):
+    # ContractSerializer.create used to write 'pending', which is not a status choice
+    Contract = apps.get_model('contracts', 'Contract')
+    Contract.objects.filter(status='pending').update(status='proposed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0005_escrow_charge'),
+        ('marketplace', '0009_listing_facets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['status', 'created_at'], name='contract_status_created_idx'),
+        ),
+        migrations.RunPython(pending_to_proposed, migrations.RunPython.noop),
+    ]
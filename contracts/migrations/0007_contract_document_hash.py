@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0006_contract_status_transitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contract',
+            name='document_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0007_contract_document_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shipment',
+            name='tracking_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0008_shipment_tracking_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(condition=models.Q(('status', 'held')), fields=['contract'], name='escrow_held_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(condition=models.Q(('delivered', True)), fields=['delivery_date'], name='shipment_delivered_date_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_ledger(apps, schema_editor):
+    # one pending -> status entry per existing funded escrow, and the balances they add up to
+    from contracts.ledger import BALANCE_FIELDS, balance_deltas
+
+    EscrowTransaction = apps.get_model('contracts', 'EscrowTransaction')
+    EscrowLedgerEntry = apps.get_model('contracts', 'EscrowLedgerEntry')
+    EscrowBalance = apps.get_model('contracts', 'EscrowBalance')
+    now = django.utils.timezone.now()
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    entries = []
+    rows = (EscrowTransaction.objects.exclude(status='pending').order_by('pk')
+            .values_list('pk', 'status', 'amount', 'charge_id', 'contract__buyer_id', 'contract__listing__farmer_id'))
+    for pk, status, amount, charge_id, buyer_id, farmer_id in rows.iterator(chunk_size=2000):
+        if status == 'refunded' and not charge_id:
+            amount = Decimal('0')  # voided before the buyer was charged
+        entries.append(EscrowLedgerEntry(escrow_id=pk, from_status='pending', to_status=status, amount=amount,
+                                         buyer_id=buyer_id, farmer_id=farmer_id, created_at=now))
+        parties = {'buyer': buyer_id, 'farmer': farmer_id}
+        for (role, name), delta in balance_deltas('pending', status, amount).items():
+            totals[parties[role]][name] += delta
+        if len(entries) >= 2000:
+            EscrowLedgerEntry.objects.bulk_create(entries)
+            entries = []
+    EscrowLedgerEntry.objects.bulk_create(entries)
+    EscrowBalance.objects.bulk_create([
+        EscrowBalance(party_id=party_id, updated_at=now,
+                      **{name: party_totals.get(name, Decimal('0')) for name in BALANCE_FIELDS})
+        for party_id, party_totals in sorted(totals.items())
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_keyset_indexes'),
+        ('contracts', '0009_escrow_release_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscrowBalance',
+            fields=[
+                ('party', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='escrow_balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('in_escrow', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('paid', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('refunded', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=16)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EscrowLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(max_length=16)),
+                ('to_status', models.CharField(max_length=16)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('escrow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='contracts.escrowtransaction')),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['escrow', 'id'], name='escrow_ledger_escrow_idx')],
+            },
+        ),
+        migrations.RunPython(seed_ledger, migrations.RunPython.noop),
+    ]
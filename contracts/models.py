@@ -3,6 +3,7 @@ from django.conf import settings
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+import uuid
 
 
 class Contract(models.Model):
@@ -25,10 +26,21 @@ class Contract(models.Model):
     end_date = models.DateField(null=True, blank=True)
     status = models.CharField(max_length=32, choices=STATUS_CHOICES, default='draft')
     contract_document = models.FileField(upload_to='contracts/', null=True, blank=True)
+    # hash of the inputs contract_document was rendered from (payments/pdf.py)
+    document_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     signed_at = models.DateTimeField(null=True, blank=True)
+    # quantity taken off the listing for this contract; zeroed when released
+    reserved_quantity = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal('0'), editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='contract_created_id_idx'),
+            # conditional bulk transitions and the offer-expiry sweep filter on status
+            models.Index(fields=['status', 'created_at'], name='contract_status_created_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"Contract({self.pk}) {self.listing} - {self.buyer.username} [{self.status}]"
 
@@ -56,21 +68,89 @@ class EscrowTransaction(models.Model):
     contract = models.OneToOneField(Contract, on_delete=models.CASCADE, related_name='escrow')
     amount = models.DecimalField(max_digits=14, decimal_places=2)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+    # generated before the gateway is called and sent as its idempotency key
     payment_reference = models.CharField(max_length=255, unique=True)
+    charge_id = models.CharField(max_length=255, blank=True)
+    charge_error = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # the auto-release sweep (contracts/escrow.py) starts from held escrows
+            models.Index(fields=['contract'], name='escrow_held_idx', condition=models.Q(status='held')),
+        ]
+
+    @staticmethod
+    def new_payment_reference() -> str:
+        return f"esc_{uuid.uuid4().hex}"
+
     def __str__(self) -> str:
         return f"Escrow({self.pk}) {self.amount} [{self.status}]"
 
 
+class EscrowLedgerEntry(models.Model):
+    """One escrow status change, appended in the transaction that made it (contracts/ledger.py).
+
+    Entries are never updated; corrections are new entries. The parties are
+    copied from the contract so balances can be rebuilt from this table
+    alone.
+    """
+    escrow = models.ForeignKey(EscrowTransaction, on_delete=models.CASCADE, related_name='ledger_entries')
+    from_status = models.CharField(max_length=16)
+    to_status = models.CharField(max_length=16)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    farmer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['escrow', 'id'], name='escrow_ledger_escrow_idx')]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Escrow ledger entries are append-only')
+        super().save(*args, **kwargs)
+
+    def __str__(self) -> str:
+        return f"Ledger({self.pk}) escrow {self.escrow_id} {self.from_status} -> {self.to_status} {self.amount}"
+
+
+class EscrowBalance(models.Model):
+    """Running escrow totals for one user, maintained from the ledger.
+
+    As farmer: ``outstanding`` is held escrow awaiting release and
+    ``revenue`` what was released to them. As buyer: ``in_escrow`` is held
+    money they funded, ``paid`` what was released from it and ``refunded``
+    what was refunded to them after being charged.
+    """
+    party = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                 related_name='escrow_balance')
+    outstanding = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    in_escrow = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    paid = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    refunded = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0'))
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"EscrowBalance({self.party_id}) revenue {self.revenue} outstanding {self.outstanding}"
+
+
 class Shipment(models.Model):
     contract = models.OneToOneField(Contract, on_delete=models.CASCADE, related_name='shipment')
     pickup_date = models.DateField(null=True, blank=True)
     delivery_date = models.DateField(null=True, blank=True)
-    tracking_id = models.CharField(max_length=255, blank=True)
+    tracking_id = models.CharField(max_length=255, blank=True, db_index=True)
     delivered = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # the auto-release sweep finds deliveries older than the hold period
+            models.Index(fields=['delivery_date'], name='shipment_delivered_date_idx',
+                         condition=models.Q(delivered=True)),
+        ]
+
     def __str__(self) -> str:
         return f"Shipment({self.pk}) for Contract {self.contract_id}"
 
@@ -0,0 +1,105 @@
+"""Listing quantity reservations for contracts.
+
+A reservation is a single conditional UPDATE
+(``quantity_available = quantity_available - qty WHERE quantity_available >= qty``),
+so concurrent buyers never oversubscribe a listing and nobody holds a row
+lock beyond that one statement. The reserved amount is recorded on
+``Contract.reserved_quantity`` and handed back exactly once when the contract
+is cancelled or deleted (see ``contracts.signals`` and ``contracts.transitions``).
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.db import OperationalError, transaction
+from django.db.models import F, Sum
+
+from marketplace.cache import invalidate_listing_feed
+from marketplace.models import Listing
+
+from .models import Contract
+
+RESERVE_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.01
+
+
+class InsufficientQuantity(Exception):
+    """The listing no longer has enough quantity for the requested reservation."""
+
+
+def _with_retry(operation, attempts: int = RESERVE_ATTEMPTS):
+    """Run ``operation`` in a savepoint, retrying transient lock errors with jittered backoff.
+
+    The conditional UPDATE itself is race-free; retries only cover lock
+    timeouts/deadlocks (PostgreSQL) and "database is locked" (SQLite).
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return operation()
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random()))
+
+
+def reserve_quantity(listing_id: int, quantity: Decimal) -> None:
+    """Take ``quantity`` off the listing or raise InsufficientQuantity."""
+    def operation():
+        return Listing.objects.filter(pk=listing_id, quantity_available__gte=quantity).update(
+            quantity_available=F('quantity_available') - quantity
+        )
+
+    if not _with_retry(operation):
+        raise InsufficientQuantity(listing_id)
+    invalidate_listing_feed()
+
+
+def release_reservation(contract_id: int) -> Decimal:
+    """Return the contract's reserved quantity to its listing; a no-op if already released."""
+    def operation():
+        row = Contract.objects.filter(pk=contract_id, reserved_quantity__gt=0).values_list(
+            'listing_id', 'reserved_quantity').first()
+        if row is None:
+            return Decimal('0')
+        listing_id, quantity = row
+        # the conditional clear makes a concurrent second release a no-op
+        if not Contract.objects.filter(pk=contract_id, reserved_quantity=quantity).update(reserved_quantity=0):
+            return Decimal('0')
+        Listing.objects.filter(pk=listing_id).update(quantity_available=F('quantity_available') + quantity)
+        return quantity
+
+    released = _with_retry(operation)
+    if released:
+        invalidate_listing_feed()
+    return released
+
+
+def release_reservations(contract_ids) -> Decimal:
+    """Bulk ``release_reservation``: one UPDATE for the contracts and one per listing.
+
+    Callers hold the contract rows (``bulk_transition`` claims them with
+    ``select_for_update``), so the amounts summed here are the ones cleared.
+    """
+    def operation():
+        reserved = Contract.objects.filter(pk__in=contract_ids, reserved_quantity__gt=0)
+        per_listing = dict(reserved.order_by().values('listing_id').annotate(quantity=Sum('reserved_quantity'))
+                           .values_list('listing_id', 'quantity'))
+        if not per_listing:
+            return Decimal('0')
+        reserved.update(reserved_quantity=0)
+        for listing_id, quantity in per_listing.items():
+            Listing.objects.filter(pk=listing_id).update(quantity_available=F('quantity_available') + quantity)
+        return sum(per_listing.values(), Decimal('0'))
+
+    released = _with_retry(operation)
+    if released:
+        invalidate_listing_feed()
+    return released
+
+
+def return_quantity(listing_id: int, quantity: Decimal) -> None:
+    """Hand ``quantity`` back to a listing whose contract row is already gone."""
+    if quantity:
+        Listing.objects.filter(pk=listing_id).update(quantity_available=F('quantity_available') + quantity)
+        invalidate_listing_feed()
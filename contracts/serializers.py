@@ -1,8 +1,11 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import Contract, PriceProposal, EscrowTransaction, Shipment, Dispute
 from marketplace.serializers import ListingSerializer
 from marketplace.models import Listing
 from django.contrib.auth import get_user_model
+from .reservations import InsufficientQuantity, reserve_quantity
+from core.fieldsets import SparseFieldsetMixin
 
 User = get_user_model()
 
@@ -17,16 +20,43 @@ class PriceProposalSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'proposer', 'accepted', 'contract')
 
 
-class ContractSerializer(serializers.ModelSerializer):
+class ProposalsSummarySerializer(serializers.Serializer):
+    """Proposal count and the latest proposal, in place of the full proposals array."""
+    count = serializers.IntegerField()
+    latest = PriceProposalSerializer(allow_null=True)
+
+    def get_attribute(self, instance):
+        # list querysets annotate proposal_count and prefetch latest_proposals
+        count = getattr(instance, 'proposal_count', None)
+        latest = getattr(instance, 'latest_proposals', None)
+        if count is None or latest is None:
+            proposals = sorted(instance.proposals.all(), key=lambda p: p.pk, reverse=True)
+            count, latest = len(proposals), proposals[:1]
+        return {'count': count, 'latest': latest[0] if latest else None}
+
+
+class ContractSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Full contract; list views render it compact (see ``core.fieldsets``).
+
+    Compact mode renders ``listing`` as its id and replaces ``proposals`` with
+    ``proposals_summary`` unless ``?expand=listing,proposals`` asks for them.
+    """
     listing = ListingSerializer(read_only=True)
     listing_id = serializers.PrimaryKeyRelatedField(queryset=Listing.objects.all(), source='listing', write_only=True)
     proposals = PriceProposalSerializer(many=True, read_only=True)
+    proposals_summary = ProposalsSummarySerializer(read_only=True)
+
+    expandable_fields = {
+        'listing': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'proposals': None,
+    }
+    summary_fields = {'proposals_summary': 'proposals'}
 
     class Meta:
         model = Contract
         fields = (
             'id', 'listing', 'listing_id', 'buyer', 'agreed_quantity', 'price_per_unit',
-            'total_value', 'start_date', 'end_date', 'status', 'signed_at', 'proposals'
+            'total_value', 'start_date', 'end_date', 'status', 'signed_at', 'proposals', 'proposals_summary'
         )
         read_only_fields = ('id', 'buyer', 'status', 'signed_at', 'proposals')
 
@@ -53,16 +83,6 @@ class ContractSerializer(serializers.ModelSerializer):
         if ppu <= 0:
             raise serializers.ValidationError({'price_per_unit': 'Must be greater than 0'})
 
-        # Validate against listing availability if available
-        available = getattr(listing, 'quantity_available', None)
-        if available is None:
-            available = getattr(listing, 'quantity', None)
-        try:
-            if available is not None and Decimal(str(available)) < qty:
-                raise serializers.ValidationError({'agreed_quantity': 'Exceeds available quantity'})
-        except (InvalidOperation, TypeError):
-            pass
-
         validated_data['buyer'] = user
         validated_data['agreed_quantity'] = qty
         validated_data['price_per_unit'] = ppu
@@ -70,9 +90,16 @@ class ContractSerializer(serializers.ModelSerializer):
         validated_data['total_value'] = qty * ppu
         # Default status when creating a new offer/contract
         if not validated_data.get('status'):
-            validated_data['status'] = 'pending'
+            validated_data['status'] = 'proposed'
 
-        return super().create(validated_data)
+        # reserve atomically against the current row, not the listing we loaded
+        with transaction.atomic():
+            try:
+                reserve_quantity(listing.pk, qty)
+            except InsufficientQuantity:
+                raise serializers.ValidationError({'agreed_quantity': 'Exceeds available quantity'})
+            validated_data['reserved_quantity'] = qty
+            return super().create(validated_data)
 
 
 class EscrowTransactionSerializer(serializers.ModelSerializer):
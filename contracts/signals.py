@@ -0,0 +1,18 @@
+"""Signal handlers returning reserved listing quantity."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Contract
+from .reservations import release_reservation, return_quantity
+
+
+@receiver(post_save, sender=Contract)
+def release_on_cancel(sender, instance, **kwargs):
+    if instance.status == 'cancelled' and instance.reserved_quantity:
+        release_reservation(instance.pk)
+        instance.reserved_quantity = 0
+
+
+@receiver(post_delete, sender=Contract)
+def release_on_delete(sender, instance, **kwargs):
+    return_quantity(instance.listing_id, instance.reserved_quantity)
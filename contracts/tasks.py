@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .escrow import sweep_releasable
+from .transitions import expire_stale_offers
+
+
+@shared_task
+def expire_contract_offers_task():
+    """Periodic expiry sweep of unanswered offers (see CELERY_BEAT_SCHEDULE)."""
+    return expire_stale_offers()
+
+
+@shared_task
+def auto_release_escrows_task():
+    """Periodic release of held escrows past their post-delivery hold (see CELERY_BEAT_SCHEDULE)."""
+    return sweep_releasable()
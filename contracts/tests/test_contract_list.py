@@ -0,0 +1,58 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contracts.models import Contract, PriceProposal
+from core.querybudget import assert_max_queries
+from marketplace.models import Crop, Listing
+from marketplace.registry import crop_registry
+
+URL = '/api/v1/contracts/contracts/'
+
+
+@pytest.fixture
+def client_with_contracts(db):
+    User = get_user_model()
+    farmer = User.objects.create_user('cl_farmer', role='farmer')
+    buyer = User.objects.create_user('cl_buyer', role='buyer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Jowar'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    for i in range(5):
+        contract = Contract.objects.create(listing=listing, buyer=buyer, agreed_quantity=1,
+                                           price_per_unit=25, total_value=25)
+        for j in range(4):
+            PriceProposal.objects.create(contract=contract, proposer=farmer if j % 2 else buyer,
+                                         price_per_unit=20 + j)
+    crop_registry.all()
+    client = APIClient()
+    client.force_authenticate(buyer)
+    return client, listing
+
+
+def test_compact_list_summarises_proposals(client_with_contracts):
+    client, listing = client_with_contracts
+    with assert_max_queries(4):  # count, page, proposals prefetch, audit log insert
+        r = client.get(URL)
+    row = r.data['results'][0]
+    assert row['listing'] == listing.id
+    assert 'proposals' not in row
+    assert row['proposals_summary']['count'] == 4
+    assert row['proposals_summary']['latest']['price_per_unit'] == '23.00'
+    assert row['proposals_summary']['latest']['proposer'] == 'cl_farmer'
+
+
+def test_sparse_fields_and_expand(client_with_contracts):
+    client, listing = client_with_contracts
+    r = client.get(URL, {'fields': 'id,status'})
+    assert set(r.data['results'][0]) == {'id', 'status'}
+
+    with assert_max_queries(4):
+        r = client.get(URL, {'expand': 'listing,proposals'})
+    row = r.data['results'][0]
+    assert row['listing']['id'] == listing.id
+    assert len(row['proposals']) == 4
+    assert 'proposals_summary' not in row
+
+    detail = client.get(f"{URL}{row['id']}/", {'fields': 'id,proposals_summary'}).data
+    assert set(detail) == {'id', 'proposals_summary'}
+    assert detail['proposals_summary']['count'] == 4
@@ -0,0 +1,154 @@
+"""The escrow ledger: entries and running balances kept by every status change, and their rebuild."""
+import importlib
+from decimal import Decimal
+
+import pytest
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contracts.escrow import release_escrows
+from contracts.ledger import balance_deltas, balance_mismatches, record_changes
+from contracts.models import Contract, EscrowBalance, EscrowLedgerEntry, EscrowTransaction
+from marketplace.models import Crop, Listing
+from payments import webhooks
+
+User = get_user_model()
+
+
+@pytest.fixture
+def parties(db):
+    farmer = User.objects.create_user('ledger_farmer', role='farmer')
+    buyer = User.objects.create_user('ledger_buyer', role='buyer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Moong'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    return farmer, buyer, listing
+
+
+def make_escrows(listing, buyer, amounts, status='pending', contract_status='active'):
+    contracts = Contract.objects.bulk_create([
+        Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=amount, total_value=amount,
+                 status=contract_status)
+        for amount in amounts
+    ])
+    return EscrowTransaction.objects.bulk_create([
+        EscrowTransaction(contract=contract, amount=amount, status=status, payment_reference=f'ledger_{contract.pk}')
+        for contract, amount in zip(contracts, amounts)
+    ])
+
+
+def balance(user):
+    return EscrowBalance.objects.filter(party=user).values('outstanding', 'revenue', 'in_escrow', 'paid',
+                                                          'refunded').first()
+
+
+def test_deltas_move_the_amount_between_positions():
+    assert balance_deltas('held', 'released', Decimal('5')) == {
+        ('farmer', 'outstanding'): Decimal('-5'), ('buyer', 'in_escrow'): Decimal('-5'),
+        ('farmer', 'revenue'): Decimal('5'), ('buyer', 'paid'): Decimal('5'),
+    }
+    assert balance_deltas('pending', 'refunded', Decimal('5')) == {('buyer', 'refunded'): Decimal('5')}
+    assert balance_deltas('pending', 'refunded', Decimal('0')) == {}
+
+
+def test_webhooks_and_releases_keep_balances(parties):
+    farmer, buyer, listing = parties
+    escrows = make_escrows(listing, buyer, [100, 40, 7])
+    for escrow in escrows:
+        assert webhooks.apply_webhook_event(f'evt_{escrow.pk}', escrow.payment_reference, 'held', {}) \
+            == webhooks.PROCESSED
+    assert balance(farmer)['outstanding'] == Decimal('147')
+    assert balance(buyer)['in_escrow'] == Decimal('147')
+
+    release_escrows([escrows[0].contract_id, escrows[1].contract_id])
+    assert webhooks.accept_events([{'event_id': 'refund_7', 'payment_reference': escrows[2].payment_reference,
+                                    'status': 'refunded'}]) == [webhooks.ACCEPTED]
+    assert webhooks.process_pending()['processed'] == 1
+
+    assert balance(farmer) == {'outstanding': 0, 'revenue': Decimal('140'), 'in_escrow': 0, 'paid': 0,
+                               'refunded': 0}
+    assert balance(buyer) == {'outstanding': 0, 'revenue': 0, 'in_escrow': 0, 'paid': Decimal('140'),
+                              'refunded': Decimal('7')}
+    assert EscrowLedgerEntry.objects.filter(escrow=escrows[0]).count() == 2
+    assert balance_mismatches() == {}
+
+
+def test_entries_are_append_only(parties):
+    farmer, buyer, listing = parties
+    escrow, = make_escrows(listing, buyer, [10], status='held')
+    entry, = record_changes([(escrow.pk, 'pending', 'held')])
+    with pytest.raises(ValueError):
+        entry.save()
+
+
+def test_cancel_voids_pending_escrow_without_moving_money(parties):
+    farmer, buyer, listing = parties
+    escrow, = make_escrows(listing, buyer, [30], contract_status='accepted')
+    client = APIClient()
+    client.force_authenticate(buyer)
+    assert client.post(f'/api/v1/contracts/contracts/{escrow.contract_id}/cancel/').status_code == 200
+    assert EscrowLedgerEntry.objects.get().to_status == 'refunded'
+    assert not EscrowBalance.objects.exists()
+
+
+def test_revenue_is_a_single_row_read(parties, django_assert_max_num_queries):
+    farmer, buyer, listing = parties
+    make_escrows(listing, buyer, [25] * 30, status='held')
+    record_changes((escrow.pk, 'pending', 'held') for escrow in EscrowTransaction.objects.all())
+    release_escrows(EscrowTransaction.objects.values_list('contract_id', flat=True)[:20])
+    client = APIClient()
+    client.force_authenticate(farmer)
+    with django_assert_max_num_queries(2):  # the balance row and the audit log insert
+        r = client.get('/api/v1/analytics/farmer-revenue/')
+    assert r.data['total_revenue'] == Decimal('500') and r.data['outstanding_escrow'] == Decimal('250')
+
+    client.force_authenticate(User.objects.create_user('new_farmer', role='farmer'))
+    assert client.get('/api/v1/analytics/farmer-revenue/').data['total_revenue'] == 0
+
+
+def test_rebuild_command_verifies_backfills_and_fixes(parties, capsys):
+    farmer, buyer, listing = parties
+    make_escrows(listing, buyer, [10, 20], status='released')  # written before the ledger existed
+    make_escrows(listing, buyer, [5], status='held')
+    with pytest.raises(CommandError, match='3 escrows are missing'):
+        call_command('rebuild_escrow_balances')
+
+    call_command('rebuild_escrow_balances', '--backfill')
+    assert 'Appended 3 ledger entries' in capsys.readouterr().out
+    assert balance(farmer)['revenue'] == Decimal('30') and balance(farmer)['outstanding'] == Decimal('5')
+
+    EscrowBalance.objects.filter(party=farmer).update(revenue=999)
+    with pytest.raises(CommandError, match='1 balances disagree'):
+        call_command('rebuild_escrow_balances')
+    call_command('rebuild_escrow_balances', '--fix')
+    assert 'Escrow balances match the ledger' in capsys.readouterr().out
+    assert balance(farmer)['revenue'] == Decimal('30')
+
+
+def test_admin_cannot_change_statuses_or_balances(admin_user, rf):
+    request = rf.get('/admin/')
+    request.user = admin_user
+    assert {'status', 'amount'} <= set(admin.site._registry[EscrowTransaction].get_readonly_fields(request))
+    for model in (EscrowBalance, EscrowLedgerEntry):
+        model_admin = admin.site._registry[model]
+        assert not model_admin.has_add_permission(request)
+        assert not model_admin.has_change_permission(request)
+        assert not model_admin.has_delete_permission(request)
+
+
+def test_migration_seeds_existing_escrows(parties):
+    farmer, buyer, listing = parties
+    make_escrows(listing, buyer, [10, 20], status='released')
+    make_escrows(listing, buyer, [5], status='held')
+    make_escrows(listing, buyer, [8], status='refunded')  # voided, never charged
+    make_escrows(listing, buyer, [3])
+    migration = importlib.import_module('contracts.migrations.0010_escrow_ledger')
+    migration.seed_ledger(apps, None)
+
+    assert EscrowLedgerEntry.objects.count() == 4
+    assert balance(farmer)['revenue'] == Decimal('30') and balance(farmer)['outstanding'] == Decimal('5')
+    assert balance(buyer)['refunded'] == 0
+    assert balance_mismatches() == {}
+    call_command('rebuild_escrow_balances')
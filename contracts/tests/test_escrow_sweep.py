@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from contracts.escrow import releasable_escrows, sweep_releasable
+from contracts.models import Contract, Dispute, EscrowTransaction, Shipment
+from contracts.tasks import auto_release_escrows_task
+from core.querybudget import assert_max_queries
+from marketplace.models import Crop, Listing
+from notifications.models import OutboxMessage
+
+User = get_user_model()
+
+
+@pytest.fixture
+def escrows(db):
+    """Held escrows for 12 contracts delivered 0..11 days ago, plus one never delivered."""
+    farmer = User.objects.create_user('sweep_farmer', role='farmer')
+    buyer = User.objects.create_user('sweep_buyer', role='buyer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Toor'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    contracts = Contract.objects.bulk_create([
+        Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25, status='active')
+        for _ in range(13)
+    ])
+    today = timezone.localdate()
+    Shipment.objects.bulk_create(
+        [Shipment(contract=contract, delivered=True, delivery_date=today - timedelta(days=i))
+         for i, contract in enumerate(contracts[:12])] + [Shipment(contract=contracts[12])]
+    )
+    return EscrowTransaction.objects.bulk_create([
+        EscrowTransaction(contract=contract, amount=25, status='held', payment_reference=f'sweep_{i}')
+        for i, contract in enumerate(contracts)
+    ])
+
+
+def test_only_elapsed_undisputed_deliveries_are_eligible(escrows):
+    disputed = escrows[10].contract
+    Dispute.objects.create(contract=disputed, raised_by=disputed.buyer, description='short weight')
+    Dispute.objects.create(contract=escrows[11].contract, raised_by=disputed.buyer, description='late',
+                           status='resolved')
+    EscrowTransaction.objects.filter(pk=escrows[9].pk).update(status='refunded')
+    eligible = set(releasable_escrows(hold_days=7).values_list('pk', flat=True))
+    assert eligible == {escrows[i].pk for i in (7, 8, 11)}
+
+
+def test_sweep_releases_in_chunks_and_reports(escrows):
+    # per chunk: claim, UPDATE, three ledger writes, outbox INSERT and the savepoint pair; plus the final
+    # empty claim
+    with assert_max_queries(8 * 3 + 3, n_plus_one_threshold=None):
+        result = sweep_releasable(hold_days=3, chunk_size=3)
+    assert result == {'released': 9, 'chunks': 3, 'remaining': 0}
+    released = set(EscrowTransaction.objects.filter(status='released').values_list('pk', flat=True))
+    assert released == {escrow.pk for escrow in escrows[3:12]}
+    messages = OutboxMessage.objects.filter(topic='email.escrow_released')
+    assert sorted(message.args[1]['contract_id'] for message in messages) == sorted(
+        escrow.contract_id for escrow in escrows[3:12])
+
+    assert sweep_releasable(hold_days=3) == {'released': 0, 'chunks': 0, 'remaining': 0}
+
+
+def test_bounded_sweep_reports_the_rest(escrows, settings):
+    settings.ESCROW_AUTO_RELEASE_DAYS = 0
+    assert sweep_releasable(chunk_size=5, max_chunks=1) == {'released': 5, 'chunks': 1, 'remaining': 7}
+    assert auto_release_escrows_task()['released'] == 7
+
+
+def test_command(escrows, capsys):
+    call_command('release_escrows', '--hold-days', '10', '--dry-run')
+    assert '2 escrows eligible' in capsys.readouterr().out
+    call_command('release_escrows', '--hold-days', '10')
+    assert 'Released 2 escrows in 1 chunks' in capsys.readouterr().out
@@ -0,0 +1,69 @@
+import threading
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contracts.models import Contract
+from contracts.reservations import InsufficientQuantity, release_reservation, reserve_quantity
+from marketplace.models import Crop, Listing
+
+
+def make_listing(quantity):
+    farmer = get_user_model().objects.create_user(f'res_farmer_{quantity}', role='farmer')
+    crop = Crop.objects.create(name='Chana')
+    return Listing.objects.create(farmer=farmer, crop=crop, quantity_available=quantity,
+                                  harvest_date=timezone.now().date(), price_floor=20)
+
+
+@pytest.mark.django_db
+def test_create_reserves_and_cancel_releases_once():
+    listing = make_listing(50)
+    buyer = get_user_model().objects.create_user('res_buyer', role='buyer')
+    client = APIClient()
+    client.force_authenticate(buyer)
+    payload = {'listing_id': listing.id, 'agreed_quantity': '30', 'price_per_unit': '10', 'total_value': '300',
+               'start_date': timezone.now().date().isoformat()}
+
+    r = client.post('/api/v1/contracts/contracts/', payload, format='json')
+    assert r.status_code == 201
+    listing.refresh_from_db()
+    assert listing.quantity_available == Decimal('20')
+    assert client.post('/api/v1/contracts/contracts/', payload, format='json').status_code == 400
+
+    cancel_url = f"/api/v1/contracts/contracts/{r.data['id']}/cancel/"
+    assert client.post(cancel_url).status_code == 200
+    assert client.post(cancel_url).status_code == 400
+    assert release_reservation(r.data['id']) == 0
+    listing.refresh_from_db()
+    assert listing.quantity_available == Decimal('50')
+    assert Contract.objects.get(pk=r.data['id']).reserved_quantity == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_reservations_never_oversubscribe():
+    listing = make_listing(100)
+    threads, successes, failures = 24, [], []
+    barrier = threading.Barrier(threads)
+
+    def buyer():
+        try:
+            barrier.wait()
+            reserve_quantity(listing.pk, Decimal('7'))
+            successes.append(1)
+        except InsufficientQuantity:
+            failures.append(1)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=buyer) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    listing.refresh_from_db()
+    assert len(successes) == 14 and len(failures) == threads - 14
+    assert listing.quantity_available == Decimal('2')
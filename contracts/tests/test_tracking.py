@@ -0,0 +1,108 @@
+import json
+from datetime import date
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from contracts.models import Contract, Dispute, EscrowTransaction, Shipment
+from contracts.tracking import TrackingIngestor, mark_delivered
+from core.querybudget import assert_max_queries
+from marketplace.models import Crop, Listing
+from notifications.models import OutboxMessage
+
+User = get_user_model()
+URL = '/api/v1/contracts/shipments/tracking/'
+
+
+@pytest.fixture
+def shipments(db):
+    farmer = User.objects.create_user('trk_farmer', role='farmer')
+    buyer = User.objects.create_user('trk_buyer', role='buyer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Ragi'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    contracts = Contract.objects.bulk_create([
+        Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25, status='active')
+        for _ in range(20)
+    ])
+    EscrowTransaction.objects.bulk_create([
+        EscrowTransaction(contract=contract, amount=25, status='held', payment_reference=f'trk_{i}')
+        for i, contract in enumerate(contracts)
+    ])
+    return Shipment.objects.bulk_create([
+        Shipment(contract=contract, tracking_id=f'TRK{i:04d}') for i, contract in enumerate(contracts)
+    ])
+
+
+def ndjson(events):
+    return '\n'.join(json.dumps(event) for event in events) + '\n'
+
+
+def test_stream_is_applied_in_batches_with_coalesced_notifications(shipments):
+    Dispute.objects.create(contract=shipments[0].contract, raised_by=shipments[0].contract.buyer, description='late')
+    events = []
+    for shipment in shipments:
+        events += [
+            {'tracking_id': shipment.tracking_id, 'status': 'picked_up', 'timestamp': '2026-03-01T08:00:00Z'},
+            {'tracking_id': shipment.tracking_id, 'status': 'in_transit', 'timestamp': '2026-03-02T08:00:00Z'},
+            {'tracking_id': shipment.tracking_id, 'status': 'delivered', 'timestamp': '2026-03-04'},
+            # partners resend the final event
+            {'tracking_id': shipment.tracking_id, 'status': 'delivered', 'timestamp': '2026-03-05'},
+        ]
+    rows = [json.loads(line) for line in ndjson(events).splitlines()]
+    rows += [{'tracking_id': 'NOPE', 'status': 'delivered'}, {'tracking_id': 'TRK0001', 'status': 'lost'}]
+
+    # per chunk: shipments SELECT, bulk UPDATE, escrow SELECT FOR UPDATE + UPDATE, three ledger writes,
+    # outbox INSERT
+    with assert_max_queries(8 * 2 + 4, n_plus_one_threshold=None):
+        report = TrackingIngestor(batch_size=50).run(rows)
+
+    assert report.applied == 80 and report.failed == 2
+    assert report.delivered == 20 and report.released == 19
+    first = Shipment.objects.get(pk=shipments[0].pk)
+    assert first.delivered and first.pickup_date == date(2026, 3, 1) and first.delivery_date == date(2026, 3, 4)
+    assert EscrowTransaction.objects.get(contract=shipments[0].contract).status == 'held'  # disputed
+    assert EscrowTransaction.objects.filter(status='released').count() == 19
+    messages = OutboxMessage.objects.filter(topic='email.shipment_delivered')
+    assert messages.count() == 20
+    assert len({message.args[1]['contract_id'] for message in messages}) == 20
+
+
+def test_tracking_endpoint(shipments):
+    client = APIClient()
+    client.force_authenticate(shipments[0].contract.buyer)
+    body = ndjson([{'tracking_id': 'TRK0003', 'status': 'delivered'}]) + 'not json\n'
+    assert client.post(URL, body, content_type='application/x-ndjson').status_code == 403
+
+    client.force_authenticate(User.objects.create_user('trk_ops', is_staff=True))
+    r = client.post(URL, body, content_type='application/x-ndjson')
+    assert r.status_code == 200
+    assert r.data['delivered'] == 1 and r.data['escrows_released'] == 1
+    assert r.data['errors'][0]['row'] == 2
+    assert Shipment.objects.get(tracking_id='TRK0003').delivered
+    assert client.post(f'{URL}?batch_size=lots', body, content_type='application/x-ndjson').status_code == 400
+
+
+def test_confirm_delivery_releases_once(shipments, settings):
+    settings.QUERY_BUDGET = {'ENABLED': True, 'RAISE': True, 'DEFAULT': None, 'N_PLUS_ONE_THRESHOLD': 3}
+    settings.DEBUG = True  # RAISE only applies with DEBUG
+    shipment = shipments[5]
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(shipment.contract.buyer)}')
+    url = f'/api/v1/contracts/shipments/{shipment.pk}/confirm_delivery/'
+    assert client.post(url, {'delivery_date': 'soon'}, format='json').status_code == 400
+    r = client.post(url, {'delivery_date': '2026-03-04'}, format='json')
+    assert r.data['detail'] == 'Delivery confirmed and escrow released'
+    assert client.post(url).data['detail'] == 'Delivery already confirmed'
+    assert EscrowTransaction.objects.get(contract=shipment.contract).status == 'released'
+    assert OutboxMessage.objects.filter(topic='email.shipment_delivered').count() == 1
+
+
+def test_stale_reads_deliver_and_notify_once(shipments):
+    # both callers read the shipment before either delivered it
+    stale = [Shipment.objects.get(pk=shipments[2].pk) for _ in range(2)]
+    assert mark_delivered([stale[0]])['delivered'] == [shipments[2].contract_id]
+    assert mark_delivered([stale[1]]) == {'delivered': [], 'released': []}
+    TrackingIngestor().run([{'tracking_id': shipments[2].tracking_id, 'status': 'delivered'}])
+    assert OutboxMessage.objects.filter(topic='email.shipment_delivered').count() == 1
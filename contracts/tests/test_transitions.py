@@ -0,0 +1,135 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contracts.models import Contract, EscrowTransaction
+from contracts.transitions import TransitionNotAllowed, apply_transition, bulk_transition, expire_stale_offers
+from marketplace.models import Crop, Listing
+from notifications.models import OutboxMessage
+
+
+@pytest.fixture
+def listing():
+    farmer = get_user_model().objects.create_user('sm_farmer', role='farmer')
+    crop = Crop.objects.create(name='Moong')
+    return Listing.objects.create(farmer=farmer, crop=crop, quantity_available=100,
+                                  harvest_date=timezone.now().date(), price_floor=20)
+
+
+@pytest.fixture
+def buyer():
+    return get_user_model().objects.create_user('sm_buyer', role='buyer')
+
+
+def make_contracts(listing, buyer, count, status='proposed', reserved='2'):
+    return Contract.objects.bulk_create([
+        Contract(listing=listing, buyer=buyer, agreed_quantity=2, price_per_unit=10, total_value=20,
+                 status=status, reserved_quantity=Decimal(reserved))
+        for _ in range(count)
+    ])
+
+
+@pytest.mark.django_db
+def test_api_create_uses_a_valid_status(listing, buyer):
+    client = APIClient()
+    client.force_authenticate(buyer)
+    r = client.post('/api/v1/contracts/contracts/', {
+        'listing_id': listing.id, 'agreed_quantity': '5', 'price_per_unit': '10', 'total_value': '50',
+        'start_date': timezone.now().date().isoformat(),
+    }, format='json')
+    assert r.status_code == 201
+    assert r.data['status'] == 'proposed'
+    assert r.data['status'] in dict(Contract.STATUS_CHOICES)
+
+
+@pytest.mark.django_db
+def test_sign_requires_accepted(listing, buyer):
+    contract = make_contracts(listing, buyer, 1)[0]
+    client = APIClient()
+    client.force_authenticate(buyer)
+    url = f'/api/v1/contracts/contracts/{contract.pk}/sign/'
+    assert client.post(url).status_code == 400
+    contract.refresh_from_db()
+    assert contract.status == 'proposed' and contract.signed_at is None
+
+    Contract.objects.filter(pk=contract.pk).update(status='accepted')
+    assert client.post(url).status_code == 200
+    contract.refresh_from_db()
+    assert contract.status == 'active' and contract.signed_at is not None
+    topics = set(OutboxMessage.objects.values_list('topic', flat=True))
+    assert {'email.contract_signed', 'contract_pdf'} <= topics
+
+
+@pytest.mark.django_db
+def test_guard_blocks_cancel_with_held_funds(listing, buyer):
+    contract = make_contracts(listing, buyer, 1, status='accepted')[0]
+    EscrowTransaction.objects.create(contract=contract, amount=20, status='held', payment_reference='ref-held')
+    with pytest.raises(TransitionNotAllowed):
+        apply_transition(contract, 'cancel')
+    contract.refresh_from_db()
+    assert contract.status == 'accepted'
+
+
+@pytest.mark.django_db
+def test_bulk_cancel_releases_reservations_and_voids_escrows(listing, buyer):
+    contracts = make_contracts(listing, buyer, 30)
+    make_contracts(listing, buyer, 5, status='completed')
+    EscrowTransaction.objects.create(contract=contracts[0], amount=20, status='pending', payment_reference='ref-p')
+
+    result = bulk_transition('cancel', Contract.objects.all(), chunk_size=8)
+
+    assert result['moved'] == 30
+    assert Contract.objects.filter(status='cancelled').count() == 30
+    assert Contract.objects.filter(status='completed').count() == 5
+    listing.refresh_from_db()
+    assert listing.quantity_available == Decimal('160')  # 100 + 30 contracts x 2
+    assert not Contract.objects.filter(status='cancelled', reserved_quantity__gt=0).exists()
+    assert EscrowTransaction.objects.get().status == 'refunded'
+    assert OutboxMessage.objects.filter(topic='email.contract_cancelled').count() == 30
+    # a second pass finds nothing to move and returns nothing twice
+    assert bulk_transition('cancel', Contract.objects.all())['moved'] == 0
+    listing.refresh_from_db()
+    assert listing.quantity_available == Decimal('160')
+
+
+@pytest.mark.django_db
+def test_hookless_bulk_transition_is_one_update(listing, buyer):
+    make_contracts(listing, buyer, 50, status='active')
+    with CaptureQueriesContext(connection) as ctx:
+        result = bulk_transition('dispute', Contract.objects.all())
+    assert result['moved'] == 50
+    updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+    assert len(updates) == 1 and 'IN' in updates[0]
+
+
+@pytest.mark.django_db
+def test_expire_stale_offers(listing, buyer):
+    stale = make_contracts(listing, buyer, 3)
+    fresh = make_contracts(listing, buyer, 2)
+    Contract.objects.filter(pk__in=[c.pk for c in stale]).update(created_at=timezone.now() - timedelta(days=30))
+    assert expire_stale_offers(14)['moved'] == 3
+    assert set(Contract.objects.filter(status='cancelled').values_list('pk', flat=True)) == {c.pk for c in stale}
+    assert Contract.objects.filter(pk__in=[c.pk for c in fresh], status='proposed').count() == 2
+
+
+@pytest.mark.django_db
+def test_bulk_transition_endpoint_is_admin_only(listing, buyer):
+    contracts = make_contracts(listing, buyer, 4)
+    client = APIClient()
+    client.force_authenticate(buyer)
+    url = '/api/v1/contracts/contracts/bulk_transition/'
+    payload = {'transition': 'cancel', 'ids': [c.pk for c in contracts[:3]]}
+    assert client.post(url, payload, format='json').status_code == 403
+
+    admin = get_user_model().objects.create_user('sm_admin', is_staff=True)
+    client.force_authenticate(admin)
+    assert client.post(url, {'transition': 'teleport', 'ids': []}, format='json').status_code == 400
+    r = client.post(url, payload, format='json')
+    assert r.status_code == 200
+    assert r.data['moved'] == 3
+    assert Contract.objects.filter(status='proposed').count() == 1
@@ -0,0 +1,158 @@
+"""Bulk ingestion of shipment tracking events from logistics partners.
+
+Each NDJSON line is one event:
+``{"tracking_id": "...", "status": "picked_up|in_transit|delivered", "timestamp": "..."}``
+(``timestamp`` defaults to now). Events are applied in chunks. A chunk locks
+its shipments with one ``SELECT ... FOR UPDATE`` and writes them back with
+one ``bulk_update``.
+It then releases the escrow of every newly delivered contract in a single
+locked batch (``contracts.escrow``). Finally it queues one
+``shipment_delivered`` notification per contract, however many events
+mentioned it, in the same transaction (``notifications.outbox``).
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from marketplace.importer import ImportReport
+from notifications.outbox import enqueue_many
+
+from .escrow import release_escrows
+from .models import Shipment
+
+EVENT_STATUSES = ('picked_up', 'in_transit', 'delivered')
+
+
+@dataclass
+class TrackingReport(ImportReport):
+    applied: int = 0
+    delivered: int = 0
+    released: int = 0
+
+    def as_dict(self) -> Dict:
+        report = super().as_dict()
+        del report['created']
+        return {'applied': self.applied, 'delivered': self.delivered, 'escrows_released': self.released, **report}
+
+
+def parse_event(row: Dict) -> Tuple[str, str, date]:
+    """``(tracking_id, status, event date)`` or a ValueError carrying an errors dict."""
+    if '__error__' in row:
+        raise ValueError({'line': [row['__error__']]})
+    errors = {}
+    tracking_id = str(row.get('tracking_id') or '').strip()
+    if not tracking_id:
+        errors['tracking_id'] = ['This field is required.']
+    status = row.get('status')
+    if status not in EVENT_STATUSES:
+        errors['status'] = [f'Must be one of {", ".join(EVENT_STATUSES)}.']
+    when = timezone.localdate()
+    if row.get('timestamp'):
+        raw = str(row['timestamp'])
+        parsed = parse_datetime(raw)
+        if parsed is not None:
+            when = timezone.localdate(parsed) if timezone.is_aware(parsed) else parsed.date()
+        elif parse_date(raw) is not None:
+            when = parse_date(raw)
+        else:
+            errors['timestamp'] = ['Expected an ISO 8601 date or datetime.']
+    if errors:
+        raise ValueError(errors)
+    return tracking_id, status, when
+
+
+def mark_delivered(shipments: List[Shipment], delivery_date: Optional[date] = None) -> Dict[str, List[int]]:
+    """Deliver shipments, release their escrow and notify each contract once.
+
+    Runs in one transaction. The shipments are re-read under a row lock, so
+    of two concurrent calls (or a call racing tracking ingestion) only the
+    first delivers and notifies; shipments already delivered are left as
+    they are.
+    """
+    with transaction.atomic():
+        newly = list(Shipment.objects.select_for_update()
+                     .filter(pk__in=[shipment.pk for shipment in shipments], delivered=False).order_by('pk'))
+        for shipment in newly:
+            shipment.delivered = True
+            shipment.delivery_date = delivery_date or shipment.delivery_date or timezone.localdate()
+        Shipment.objects.bulk_update(newly, ['delivered', 'delivery_date'])
+        return _after_delivery([shipment.contract_id for shipment in newly])
+
+
+def _after_delivery(contract_ids: List[int]) -> Dict[str, List[int]]:
+    released = set(release_escrows(contract_ids))
+    enqueue_many('payments.tasks.send_email_task', [
+        ('shipment_delivered', {'contract_id': contract_id, 'escrow_released': contract_id in released})
+        for contract_id in contract_ids
+    ], topic='email.shipment_delivered')
+    return {'delivered': contract_ids, 'released': sorted(released)}
+
+
+class TrackingIngestor:
+    """Apply tracking events to shipments in chunks."""
+
+    def __init__(self, batch_size: int = 1000, max_errors: Optional[int] = 1000, on_error=None):
+        self.batch_size = batch_size
+        self.report = TrackingReport(max_errors=max_errors)
+        self.on_error = on_error
+
+    def _error(self, row_number: int, errors) -> None:
+        self.report.add_error(row_number, errors)
+        if self.on_error is not None:
+            self.on_error(row_number, errors)
+
+    def _flush(self, batch: List[Tuple[int, Tuple[str, str, date]]]) -> None:
+        if not batch:
+            return
+        with transaction.atomic():
+            self._apply(batch)
+
+    def _apply(self, batch: List[Tuple[int, Tuple[str, str, date]]]) -> None:
+        # locked in id order, so a concurrent confirm_delivery or chunk waits and then sees our changes
+        by_tracking_id = defaultdict(list)
+        for shipment in Shipment.objects.select_for_update().filter(
+                tracking_id__in={event[0] for _, event in batch}).order_by('pk'):
+            by_tracking_id[shipment.tracking_id].append(shipment)
+
+        changed, delivered = {}, {}
+        for row_number, (tracking_id, status, when) in batch:
+            shipments = by_tracking_id.get(tracking_id)
+            if not shipments:
+                self._error(row_number, {'tracking_id': [f'Unknown tracking_id {tracking_id!r}']})
+                continue
+            for shipment in shipments:
+                if status == 'delivered' and not shipment.delivered:
+                    shipment.delivered = True
+                    shipment.delivery_date = when
+                    delivered[shipment.contract_id] = shipment
+                elif status != 'delivered' and shipment.pickup_date is None:
+                    # any movement implies the pickup happened
+                    shipment.pickup_date = when
+                else:
+                    continue
+                changed[shipment.pk] = shipment
+            self.report.applied += 1
+
+        Shipment.objects.bulk_update(list(changed.values()), ['pickup_date', 'delivered', 'delivery_date'])
+        result = _after_delivery(list(delivered))
+        self.report.delivered += len(result['delivered'])
+        self.report.released += len(result['released'])
+
+    def run(self, rows: Iterable[Dict]) -> TrackingReport:
+        batch = []
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                batch.append((row_number, parse_event(row)))
+            except ValueError as exc:
+                self._error(row_number, exc.args[0])
+                continue
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        self._flush(batch)
+        return self.report
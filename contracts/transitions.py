@@ -0,0 +1,163 @@
+"""Contract status transitions.
+
+Every status change goes through ``TRANSITIONS``: a transition names the
+states it may start from, the target, an optional guard (a ``Q`` evaluated
+inside the UPDATE, so it cannot race with the change), extra columns to set,
+and hooks run in the same transaction with the ids that actually moved.
+
+``bulk_transition`` moves any number of contracts with one conditional
+``UPDATE ... WHERE status IN (...)`` (chunked by id when hooks need to know
+which rows moved); ``apply_transition`` is the single-contract case of it.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from notifications.outbox import enqueue_many
+from payments.pdf import pdf_settings
+
+from .ledger import record_changes
+from .models import Contract, EscrowTransaction
+from .reservations import release_reservations
+
+Hook = Callable[[List[int]], None]
+
+
+class TransitionNotAllowed(Exception):
+    """The contract is not in a source state of the transition, or the guard failed."""
+
+
+@dataclass(frozen=True)
+class Transition:
+    name: str
+    sources: Tuple[str, ...]
+    target: str
+    guard: Optional[Q] = None
+    updates: Optional[Callable[[], Dict]] = None
+    hooks: Tuple[Hook, ...] = field(default_factory=tuple)
+
+    def condition(self) -> Q:
+        condition = Q(status__in=self.sources)
+        return condition & self.guard if self.guard is not None else condition
+
+    def values(self) -> Dict:
+        values = {'status': self.target}
+        if self.updates is not None:
+            values.update(self.updates())
+        return values
+
+
+def notify(event_type: str) -> Hook:
+    def hook(ids: List[int]) -> None:
+        enqueue_many('payments.tasks.send_email_task', [(event_type, {'contract_id': pk}) for pk in ids],
+                     topic=f'email.{event_type}')
+    hook.__name__ = f'notify_{event_type}'
+    return hook
+
+
+def render_contract_pdfs(ids: List[int]) -> None:
+    size = pdf_settings()['BATCH_SIZE']
+    enqueue_many('payments.tasks_pdf.generate_contract_pdfs_task',
+                 [(ids[i:i + size],) for i in range(0, len(ids), size)], topic='contract_pdf')
+
+
+def void_pending_escrows(ids: List[int]) -> None:
+    # an escrow the gateway has not charged yet is voided on the spot (a charge task that has not run
+    # yet then skips it); a charged one stays pending until the gateway's refund webhook arrives
+    pending = list(EscrowTransaction.objects.select_for_update()
+                   .filter(contract_id__in=ids, status='pending').order_by('pk').values_list('pk', 'charge_id'))
+    voided = [pk for pk, charge_id in pending if not charge_id]
+    if voided:
+        EscrowTransaction.objects.filter(pk__in=voided, status='pending', charge_id='').update(status='refunded')
+        record_changes(((pk, 'pending', 'refunded') for pk in voided), unfunded=True)
+    enqueue_many('payments.tasks.refund_escrow_charge_task', [(pk,) for pk, charge_id in pending if charge_id],
+                 topic='escrow_refund')
+
+
+CANCEL_HOOKS = (release_reservations, void_pending_escrows, notify('contract_cancelled'))
+
+TRANSITIONS: Dict[str, Transition] = {t.name: t for t in [
+    Transition('propose', ('draft',), 'proposed'),
+    Transition('accept', ('draft', 'proposed'), 'accepted'),
+    Transition('sign', ('accepted',), 'active', updates=lambda: {'signed_at': Now()},
+               hooks=(notify('contract_signed'), render_contract_pdfs)),
+    Transition('dispute', ('accepted', 'active'), 'disputed'),
+    Transition('resolve', ('disputed',), 'active'),
+    Transition('complete', ('active',), 'completed', guard=Q(shipment__delivered=True),
+               hooks=(notify('contract_completed'),)),
+    # funds already held or paid out go through the dispute/refund flow instead
+    Transition('cancel', ('draft', 'proposed', 'accepted'), 'cancelled',
+               guard=~Q(escrow__status__in=('held', 'released')), hooks=CANCEL_HOOKS),
+    Transition('expire', ('draft', 'proposed'), 'cancelled', hooks=CANCEL_HOOKS),
+]}
+
+
+def get_transition(name: str) -> Transition:
+    try:
+        return TRANSITIONS[name]
+    except KeyError:
+        raise TransitionNotAllowed(f'Unknown transition {name!r}')
+
+
+def _move(queryset, trans: Transition, ids: Optional[List[int]] = None) -> int:
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset.filter(trans.condition()).update(**trans.values())
+
+
+def bulk_transition(name: str, queryset=None, chunk_size: int = 1000) -> Dict:
+    """Apply transition ``name`` to every contract in ``queryset`` it allows.
+
+    Contracts in other states (or failing the guard) are left untouched.
+    Without hooks this is a single UPDATE; with hooks, ids are claimed in
+    chunks (``FOR UPDATE SKIP LOCKED`` where supported) so each hook sees
+    exactly the rows its UPDATE moved.
+    """
+    trans = get_transition(name)
+    queryset = (queryset if queryset is not None else Contract.objects.all()).order_by()
+    if not trans.hooks:
+        with transaction.atomic():
+            moved = _move(queryset, trans)
+        return {'transition': name, 'target': trans.target, 'moved': moved}
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                queryset.filter(trans.condition()).select_for_update(skip_locked=True, of=('self',))
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            count = _move(Contract.objects.all(), trans, ids)
+            for hook in trans.hooks:
+                hook(ids)
+        moved += count
+        if count == 0:
+            break
+    return {'transition': name, 'target': trans.target, 'moved': moved}
+
+
+def apply_transition(contract: Contract, name: str) -> Contract:
+    """Move one contract, raising TransitionNotAllowed if its state or guard forbids it."""
+    trans = get_transition(name)
+    with transaction.atomic():
+        if not _move(Contract.objects.all(), trans, [contract.pk]):
+            raise TransitionNotAllowed(f'Cannot {name} a contract that is {contract.status}')
+        for hook in trans.hooks:
+            hook([contract.pk])
+    contract.refresh_from_db(fields=list(trans.values()) + ['reserved_quantity'])
+    return contract
+
+
+def expire_stale_offers(max_age_days: Optional[int] = None) -> Dict:
+    """Expire draft/proposed contracts nobody acted on within the offer window."""
+    days = max_age_days if max_age_days is not None else getattr(settings, 'CONTRACT_OFFER_EXPIRY_DAYS', 14)
+    cutoff = timezone.now() - timedelta(days=days)
+    return bulk_transition('expire', Contract.objects.filter(created_at__lt=cutoff))
@@ -2,19 +2,57 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
-from django.utils import timezone
+from django.db.models import Count, Prefetch
+from django.utils.dateparse import parse_date
 from .models import Contract, PriceProposal, EscrowTransaction, Shipment, Dispute
 from .serializers import ContractSerializer, PriceProposalSerializer, EscrowTransactionSerializer, ShipmentSerializer, DisputeSerializer
-from payments.mock_gateway import create_mock_charge
-from payments.tasks import send_email_task
-# from payments.tasks import generate_contract_pdf_task
+from core.downloads import download_settings, serve_file, signed_url
+from core.fieldsets import fieldset_params
+from notifications.outbox import enqueue, enqueue_email
+from marketplace.importer import FORMAT_NDJSON, batch_size_param, iter_lines, iter_rows
+from .tracking import TrackingIngestor, mark_delivered
+from .transitions import TRANSITIONS, TransitionNotAllowed, apply_transition, bulk_transition
 
 
     
 class ContractViewSet(viewsets.ModelViewSet):
-    queryset = Contract.objects.select_related('listing', 'buyer').all()
+    queryset = Contract.objects.select_related('listing__crop', 'listing__farmer', 'buyer').prefetch_related(
+        Prefetch('proposals', queryset=PriceProposal.objects.select_related('proposer'))
+    ).all()
     serializer_class = ContractSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 4, 'retrieve': 3, 'create': 6, 'propose_price': 7, 'accept_proposal': 15, 'sign': 9,
+                    'cancel': 15, 'bulk_transition': 16, 'document': 2, 'document_link': 2, 'default': 6}
+
+    def get_queryset(self):
+        if self.action in ('document', 'document_link'):
+            return Contract.objects.select_related('listing')
+        if self.action != 'list':
+            return super().get_queryset()
+        # compact list: join/prefetch only what the requested fieldset renders
+        requested, expand = fieldset_params(self.request)
+
+        def renders(name):
+            return requested is None or name in requested
+
+        queryset = Contract.objects.all()
+        if renders('listing') and 'listing' in expand:
+            queryset = queryset.select_related('listing__crop', 'listing__farmer')
+        if renders('proposals') and 'proposals' in expand:
+            queryset = queryset.prefetch_related(
+                Prefetch('proposals', queryset=PriceProposal.objects.select_related('proposer'))
+            )
+        elif renders('proposals_summary'):
+            queryset = queryset.annotate(proposal_count=Count('proposals')).prefetch_related(
+                Prefetch('proposals', queryset=PriceProposal.objects.select_related('proposer').order_by('-id')[:1],
+                         to_attr='latest_proposals')
+            )
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['compact'] = self.action == 'list'
+        return context
 
     @action(detail=True, methods=['post'])
     def propose_price(self, request, pk=None):
@@ -30,12 +68,10 @@ class ContractViewSet(viewsets.ModelViewSet):
 
         serializer = PriceProposalSerializer(data=data)
         serializer.is_valid(raise_exception=True)
-        proposal = serializer.save(contract=contract, proposer=request.user)
-        # notify counterparty
-        try:
-            send_email_task.delay('proposal_created', {'proposal_id': proposal.pk})
-        except Exception:
-            pass
+        with transaction.atomic():
+            proposal = serializer.save(contract=contract, proposer=request.user)
+            # notify counterparty once the proposal commits
+            enqueue_email('proposal_created', {'proposal_id': proposal.pk})
         return Response(PriceProposalSerializer(proposal).data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
@@ -54,65 +90,148 @@ class ContractViewSet(viewsets.ModelViewSet):
             except PriceProposal.DoesNotExist:
                 return Response({'detail': 'Proposal not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # mark accepted and update contract price
-        with transaction.atomic():
-            proposal.accepted = True
-            proposal.save()
-            contract.price_per_unit = proposal.price_per_unit
-            contract.total_value = proposal.price_per_unit * contract.agreed_quantity
-            contract.status = 'accepted'
-            contract.save()
-            # create escrow placeholder using mock gateway
-            try:
-                payment = create_mock_charge(contract=contract, amount=float(contract.total_value))
-                EscrowTransaction.objects.create(contract=contract, amount=contract.total_value, status='held', payment_reference=payment['payment_reference'])
-            except Exception:
-                pass
+        # commit the acceptance with a pending escrow and, through the outbox, the
+        # create_escrow_charge_task that calls the gateway; the webhook moves it to held
         try:
-            send_email_task.delay('proposal_accepted', {'contract_id': contract.pk})
-        except Exception:
-            pass
-        return Response({'detail': 'Proposal accepted, escrow created'}, status=status.HTTP_200_OK)
+            with transaction.atomic():
+                apply_transition(contract, 'accept')
+                proposal.accepted = True
+                proposal.save()
+                contract.price_per_unit = proposal.price_per_unit
+                contract.total_value = proposal.price_per_unit * contract.agreed_quantity
+                contract.save(update_fields=['price_per_unit', 'total_value'])
+                escrow, _ = EscrowTransaction.objects.get_or_create(
+                    contract=contract,
+                    defaults={'amount': contract.total_value, 'status': 'pending',
+                              'payment_reference': EscrowTransaction.new_payment_reference()},
+                )
+                enqueue('payments.tasks.create_escrow_charge_task', escrow.pk, topic='escrow_charge')
+                enqueue_email('proposal_accepted', {'contract_id': contract.pk})
+        except TransitionNotAllowed as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': 'Proposal accepted, escrow pending', 'escrow_id': escrow.pk,
+                         'escrow_status': escrow.status}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
     def sign(self, request, pk=None):
         contract = self.get_object()
-        # mark signed and generate signed PDF asynchronously
-        contract.signed_at = timezone.now()
-        contract.status = 'active'
-        contract.save()
-        # enqueue PDF generation task which will render and attach signed PDF
-        generate_contract_pdf_task.delay(contract.pk)
-        send_email_task.delay('contract_signed', {'contract_id': contract.pk})
+        # the sign transition stamps signed_at and queues the email and PDF rendering
+        try:
+            apply_transition(contract, 'sign')
+        except TransitionNotAllowed as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'detail': 'Contract signed; generating PDF'}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        contract = self.get_object()
+        if request.user.pk not in (contract.buyer_id, contract.listing.farmer_id):
+            return Response({'detail': 'Only the buyer or farmer can cancel'}, status=status.HTTP_403_FORBIDDEN)
+        # the cancel transition returns the reserved quantity and voids a pending escrow
+        try:
+            apply_transition(contract, 'cancel')
+        except TransitionNotAllowed as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': 'Contract cancelled'})
+
+    def _document_for(self, request):
+        contract = self.get_object()
+        if not (request.user.is_staff or request.user.pk in (contract.buyer_id, contract.listing.farmer_id)):
+            return None, Response({'detail': 'Only the buyer or farmer can download the contract'},
+                                  status=status.HTTP_403_FORBIDDEN)
+        if not contract.contract_document:
+            return None, Response({'detail': 'No document has been generated yet'}, status=status.HTTP_404_NOT_FOUND)
+        return contract, None
+
+    @action(detail=True, methods=['get'])
+    def document(self, request, pk=None):
+        contract, error = self._document_for(request)
+        if error is not None:
+            return error
+        return serve_file(request, contract.contract_document.name, filename=f'contract_{contract.pk}.pdf')
+
+    @action(detail=True, methods=['get'])
+    def document_link(self, request, pk=None):
+        """Expiring URL for the signed PDF that is served without further database lookups."""
+        contract, error = self._document_for(request)
+        if error is not None:
+            return error
+        return Response({'url': signed_url(request, contract.contract_document.name, f'contract_{contract.pk}.pdf'),
+                         'expires_in': download_settings()['URL_MAX_AGE']})
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_transition(self, request):
+        """Apply one transition to many contracts: ``{"transition", "ids"}`` or ``{"transition", "status"}``."""
+        name = request.data.get('transition')
+        if name not in TRANSITIONS:
+            return Response({'detail': f'transition must be one of {sorted(TRANSITIONS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ids, from_status = request.data.get('ids'), request.data.get('status')
+        if ids is None and from_status is None:
+            return Response({'detail': 'Provide ids or status to select contracts'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = Contract.objects.all()
+        if ids is not None:
+            if not isinstance(ids, list):
+                return Response({'detail': 'ids must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=ids)
+        if from_status is not None:
+            queryset = queryset.filter(status=from_status)
+        return Response(bulk_transition(name, queryset))
+
 
 class EscrowViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = EscrowTransaction.objects.select_related('contract').all()
     serializer_class = EscrowTransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 2}
 
 
 class ShipmentViewSet(viewsets.ModelViewSet):
     queryset = Shipment.objects.select_related('contract').all()
     serializer_class = ShipmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 2, 'confirm_delivery': 12, 'tracking': None, 'default': 4}
 
     @action(detail=True, methods=['post'])
     def confirm_delivery(self, request, pk=None):
         shipment = self.get_object()
-        shipment.delivered = True
-        shipment.delivery_date = request.data.get('delivery_date') or shipment.delivery_date
-        shipment.save()
-        # release escrow (in production this would go through checks and admin review)
-        escrow = shipment.contract.escrow
-        escrow.status = 'released'
-        escrow.save()
-        send_email_task.delay('shipment_delivered', {'contract_id': shipment.contract.pk})
-        return Response({'detail': 'Delivery confirmed and escrow released'})
+        delivery_date = request.data.get('delivery_date')
+        if delivery_date:
+            delivery_date = parse_date(str(delivery_date))
+            if delivery_date is None:
+                return Response({'detail': 'delivery_date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if shipment.delivered:
+            return Response({'detail': 'Delivery already confirmed'})
+        # held escrow is released under a row lock unless a dispute is open
+        result = mark_delivered([shipment], delivery_date)
+        if not result['delivered']:
+            # a concurrent confirmation or tracking event got there first
+            return Response({'detail': 'Delivery already confirmed'})
+        if result['released']:
+            return Response({'detail': 'Delivery confirmed and escrow released'})
+        return Response({'detail': 'Delivery confirmed; escrow not released (not held or disputed)'})
+
+    @action(detail=False, methods=['post'], url_path='tracking', permission_classes=[permissions.IsAdminUser])
+    def tracking(self, request):
+        """POST tracking events as NDJSON (raw body or multipart ``file``) from a logistics partner.
+
+        Events are applied in chunks of ``?batch_size=``; bad lines are
+        reported by 1-based row number and skipped.
+        """
+        if (request.content_type or '').startswith('multipart/'):
+            source = request.FILES.get('file')
+            if source is None:
+                return Response({'detail': 'No file provided.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # read the underlying HttpRequest as a stream instead of request.data
+            source = request._request
+        ingestor = TrackingIngestor(batch_size=batch_size_param(request))
+        report = ingestor.run(iter_rows(iter_lines(source), FORMAT_NDJSON))
+        return Response(report.as_dict())
 
 
 class DisputeViewSet(viewsets.ModelViewSet):
     queryset = Dispute.objects.select_related('contract', 'raised_by').all()
     serializer_class = DisputeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 2, 'default': 4}
@@ -0,0 +1,158 @@
+"""Buffered AuditLog sink used by RequestAuditMiddleware.
+
+Records are queued in-process and written with ``bulk_create`` once the
+batch is full or the flush interval elapses, instead of one INSERT per request.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_BLOCK = 'block'
+
+
+class AuditBuffer:
+    """Bounded in-process queue of pending AuditLog rows.
+
+    overflow='drop' discards new records when the queue is full (counted in
+    ``dropped``); overflow='block' waits up to ``block_timeout`` seconds for
+    room before dropping.
+    """
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 200, flush_interval: float = 5.0,
+                 overflow: str = OVERFLOW_DROP, block_timeout: float = 0.05, use_celery: bool = False):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.use_celery = use_celery
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def put(self, record: Dict) -> bool:
+        """Queue a record (``user_id``, ``action``, ``timestamp``, ``metadata``)."""
+        self._ensure_flusher()
+        try:
+            if self.overflow == OVERFLOW_BLOCK:
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self.flush(blocking=False)
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def drain(self, limit: Optional[int] = None) -> List[Dict]:
+        records = []
+        while limit is None or len(records) < limit:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+    def flush(self, blocking: bool = True) -> int:
+        """Write all queued records; returns the number written."""
+        if not self._flush_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            total = 0
+            while True:
+                records = self.drain(self.batch_size)
+                if not records:
+                    break
+                try:
+                    self._write(records)
+                    total += len(records)
+                except Exception:
+                    # Don't let audit logging break requests
+                    logger.exception("Failed to flush %d audit records", len(records))
+            self.written += total
+            return total
+        finally:
+            self._flush_lock.release()
+
+    def _write(self, records: List[Dict]) -> None:
+        if self.use_celery:
+            from .tasks import write_audit_batch_task
+            write_audit_batch_task.delay([_serialize(r) for r in records])
+        else:
+            write_audit_records(records)
+
+    def _ensure_flusher(self) -> None:
+        # Threads do not survive a fork, so restart the flusher per worker process.
+        if not self.flush_interval or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='audit-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            if self.pending():
+                self.flush()
+                connection.close()
+
+
+def write_audit_records(records: List[Dict]) -> None:
+    from accounts.models import AuditLog
+
+    AuditLog.objects.bulk_create([AuditLog(**r) for r in records], batch_size=500)
+
+
+def _serialize(record: Dict) -> Dict:
+    data = dict(record)
+    data['timestamp'] = data['timestamp'].isoformat()
+    return data
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_audit_buffer() -> AuditBuffer:
+    """Return the process-wide buffer configured from ``settings.AUDIT_BUFFER``."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                conf = getattr(settings, 'AUDIT_BUFFER', {})
+                _buffer = AuditBuffer(
+                    max_size=conf.get('MAX_SIZE', 10000),
+                    batch_size=conf.get('BATCH_SIZE', 200),
+                    flush_interval=conf.get('FLUSH_INTERVAL', 5.0),
+                    overflow=conf.get('OVERFLOW', OVERFLOW_DROP),
+                    block_timeout=conf.get('BLOCK_TIMEOUT', 0.05),
+                    use_celery=conf.get('USE_CELERY', False),
+                )
+                atexit.register(flush_audit_buffer)
+    return _buffer
+
+
+def flush_audit_buffer() -> int:
+    """Flush pending records; called on interpreter and worker shutdown."""
+    if _buffer is None:
+        return 0
+    return _buffer.flush()
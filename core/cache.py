@@ -0,0 +1,74 @@
+"""Cache helpers: generation-versioned keys, single-flight recompute, ETag responses."""
+import hashlib
+import json
+import time
+from typing import Any, Callable, Tuple
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_generation(namespace: str) -> int:
+    """Current generation for ``namespace``; bumping it invalidates every key built on it."""
+    key = f'{namespace}:gen'
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, 1, timeout=None)
+        generation = cache.get(key) or 1
+    return generation
+
+
+def bump_generation(namespace: str) -> None:
+    key = f'{namespace}:gen'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+
+
+def compute_etag(payload: Any) -> str:
+    body = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], timeout: int = 60,
+                   lock_timeout: int = 10, wait: float = 2.0, poll: float = 0.05) -> Tuple[Any, str]:
+    """Return ``(payload, etag)`` for ``key``, recomputing at most once per key at a time.
+
+    The first caller to miss takes a short-lived lock with ``cache.add`` and
+    recomputes; concurrent callers poll for the fresh value for up to ``wait``
+    seconds before computing it themselves, so a cold key does not stampede
+    the database.
+    """
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=lock_timeout):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(poll)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+    try:
+        payload = compute()
+        entry = (payload, compute_etag(payload))
+        cache.set(key, entry, timeout=timeout)
+        return entry
+    finally:
+        cache.delete(lock_key)
+
+
+def etag_response(request, payload: Any, etag: str) -> Response:
+    """200 with an ETag, or 304 when the client already holds this version."""
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(payload)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
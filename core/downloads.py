@@ -0,0 +1,180 @@
+"""Protected media downloads: permission checks in Django, bytes from the web server.
+
+``serve_file`` answers ``If-None-Match`` itself, then hands the transfer
+off according to ``PROTECTED_MEDIA['BACKEND']``:
+
+* ``nginx``: ``X-Accel-Redirect`` to ``INTERNAL_PREFIX`` (an ``internal``
+  location aliasing ``MEDIA_ROOT``), which also handles ranges.
+* ``apache``: ``X-Sendfile`` with the absolute path (mod_xsendfile).
+* ``django``: a ``FileResponse`` over the open file, honouring single
+  ``Range`` requests. Under gunicorn this is sent with ``os.sendfile``.
+
+The ETag is ``"<mtime hex>-<size hex>"``, the format nginx uses for static
+files, so validators agree whichever side produced them.
+
+``signed_url`` issues an expiring link whose token carries the storage name.
+``signed_download_view`` serves it without touching the ORM.
+"""
+import mimetypes
+import os
+import re
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+from core.querybudget import query_budget
+
+SIGNING_SALT = 'core.downloads'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def download_settings() -> Dict:
+    defaults = {'BACKEND': 'django', 'INTERNAL_PREFIX': '/protected-media/', 'URL_MAX_AGE': 300}
+    return {**defaults, **getattr(settings, 'PROTECTED_MEDIA', {})}
+
+
+def file_etag(stat: os.stat_result) -> str:
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive ``(start, end)`` for a single byte range, or None to send the whole file.
+
+    Multi-range and malformed headers are ignored, as RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - length), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    return (start, end) if end >= start else None
+
+
+class FileRange:
+    """Read-only view of ``length`` bytes of ``file`` from ``start``.
+
+    It keeps ``fileno`` so ``wsgi.file_wrapper`` can still use sendfile. It
+    has no ``tell``, so FileResponse leaves Content-Length to the caller.
+    """
+
+    def __init__(self, file, start: int, length: int):
+        file.seek(start)
+        self._file = file
+        self._remaining = length
+        self.name = getattr(file, 'name', '')
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        data = self._file.read(self._remaining if size is None or size < 0 else min(size, self._remaining))
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _attachment(response, filename: str, as_attachment: bool) -> None:
+    disposition = 'attachment' if as_attachment else 'inline'
+    response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+
+def serve_file(request, name: str, storage=default_storage, filename: Optional[str] = None,
+               as_attachment: bool = True):
+    """Respond with the stored file ``name``; callers have already checked permissions."""
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # remote storage: no stat, no ranges
+        if not storage.exists(name):
+            raise Http404('Document not found')
+        return FileResponse(storage.open(name, 'rb'), as_attachment=as_attachment, filename=filename)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('Document not found')
+
+    etag = file_etag(stat)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    config = download_settings()
+    if config['BACKEND'] == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(config['INTERNAL_PREFIX'].rstrip('/') + '/' + name)
+    elif config['BACKEND'] == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = _file_response(request, path, stat.st_size, etag, content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = 'private, no-cache'
+    response.setdefault('Accept-Ranges', 'bytes')
+    _attachment(response, filename, as_attachment)
+    return response
+
+
+def _file_response(request, path: str, size: int, etag: str, content_type: str):
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+    start, end = byte_range
+    length = end - start + 1
+    response = FileResponse(FileRange(open(path, 'rb'), start, length), status=206, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def signed_url(request, name: str, filename: Optional[str] = None) -> str:
+    token = signing.dumps({'n': name, 'f': filename or os.path.basename(name)}, salt=SIGNING_SALT, compress=True)
+    return request.build_absolute_uri(reverse('signed-download', args=[token]))
+
+
+@query_budget(1)
+@require_safe
+def signed_download_view(request, token: str):
+    try:
+        payload = signing.loads(token, salt=SIGNING_SALT, max_age=download_settings()['URL_MAX_AGE'])
+    except signing.SignatureExpired:
+        return HttpResponse('Download link expired', status=410, content_type='text/plain')
+    except signing.BadSignature:
+        raise Http404('Invalid download link')
+    return serve_file(request, payload['n'], filename=payload['f'])
@@ -0,0 +1,64 @@
+"""Sparse fieldsets (``?fields=``) and expandable nested fields (``?expand=``).
+
+A root serializer using ``SparseFieldsetMixin`` renders only the top-level
+fields named in ``?fields=a,b`` on reads. When the view passes
+``context['compact'] = True`` (list actions), each entry of
+``expandable_fields`` collapses to a cheap stand-in (e.g. a primary key) or is
+dropped unless named in ``?expand=``; ``summary_fields`` name compact
+replacements that are rendered only while the field they summarise is
+collapsed (or when asked for explicitly via ``?fields=``). Views use
+``fieldset_params`` to shape their querysets to match.
+"""
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_list(value: Optional[str]) -> Optional[Set[str]]:
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def fieldset_params(request) -> Tuple[Optional[Set[str]], Set[str]]:
+    """``(requested fields or None for all, expanded fields)`` for a request."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    params = request.query_params
+    return parse_field_list(params.get(FIELDS_PARAM)), parse_field_list(params.get(EXPAND_PARAM)) or set()
+
+
+class SparseFieldsetMixin:
+    # nested field -> factory for its collapsed stand-in (None drops it)
+    expandable_fields: Dict[str, Optional[Callable]] = {}
+    # summary field -> the expandable field it stands in for
+    summary_fields: Dict[str, str] = {}
+
+    def _is_root(self) -> bool:
+        # the serializer itself, or the child of a root many=True ListSerializer
+        return self.root is self or self.root is self.parent
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_root():
+            return fields
+        requested, expand = fieldset_params(self.context.get('request'))
+        compact = self.context.get('compact', False)
+        for summary, full in self.summary_fields.items():
+            collapsed = compact and full not in expand
+            if not collapsed and not (requested and summary in requested):
+                fields.pop(summary, None)
+        if compact:
+            for name, collapsed in self.expandable_fields.items():
+                if name in expand or name not in fields:
+                    continue
+                if collapsed is None:
+                    del fields[name]
+                else:
+                    fields[name] = collapsed()
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from accounts.models import AuditLog
+from core.audit import AuditBuffer
+from core import middleware as audit_middleware
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-request audit latency: direct INSERT vs buffered bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help='Keep the audit rows written by the run')
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        factory = RequestFactory()
+        mw = audit_middleware.RequestAuditMiddleware(lambda request: HttpResponse('ok'))
+        start_id = AuditLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        def run():
+            timings = []
+            for i in range(n):
+                request = factory.get(f'/bench/{i}/')
+                t0 = time.perf_counter()
+                mw(request)
+                timings.append(time.perf_counter() - t0)
+            return timings
+
+        with override_settings(AUDIT_BUFFER={'ENABLED': False}):
+            direct = run()
+
+        buffer = AuditBuffer(max_size=n, batch_size=options['batch_size'], flush_interval=0)
+        original = audit_middleware.get_audit_buffer
+        audit_middleware.get_audit_buffer = lambda: buffer
+        try:
+            with override_settings(AUDIT_BUFFER={'ENABLED': True}):
+                buffered = run()
+            t0 = time.perf_counter()
+            buffer.flush()
+            final_flush = time.perf_counter() - t0
+        finally:
+            audit_middleware.get_audit_buffer = original
+
+        for label, timings in (('direct', direct), ('buffered', buffered)):
+            timings.sort()
+            mean = sum(timings) / len(timings)
+            p50 = timings[len(timings) // 2]
+            p99 = timings[int(len(timings) * 0.99) - 1]
+            self.stdout.write(
+                f'{label:>9}: mean={mean * 1000:.3f}ms p50={p50 * 1000:.3f}ms p99={p99 * 1000:.3f}ms'
+            )
+        self.stdout.write(f'final flush: {final_flush * 1000:.1f}ms, dropped={buffer.dropped}')
+
+        if not options['keep']:
+            AuditLog.objects.filter(id__gt=start_id, action__startswith='GET /bench/').delete()
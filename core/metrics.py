@@ -0,0 +1,195 @@
+"""Per-route latency histograms exposed in Prometheus text format.
+
+Each process keeps its histograms in memory and periodically writes a
+snapshot to ``settings.METRICS['DIR']`` (one JSON file per pid). The
+``/metrics`` view merges every snapshot so gunicorn workers are aggregated.
+Apps can add scrape-time series (e.g. queue depths read from the database)
+with ``register_collector``.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+KEY_SEP = '|'
+
+
+def _bucket_index(bounds: Iterable[float], value: float) -> int:
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)  # +Inf
+
+
+def status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class RouteHistograms:
+    """In-memory histograms keyed by (route, method, status class)."""
+
+    def __init__(self, directory: Optional[str] = None, sync_interval: float = 1.0):
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self._series: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+
+    def observe(self, route: str, method: str, status_code: int, duration: float, queries: int = 0) -> None:
+        key = KEY_SEP.join((route, method, status_class(status_code)))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'duration_buckets': [0] * (len(DURATION_BUCKETS) + 1),
+                    'duration_sum': 0.0,
+                    'query_buckets': [0] * (len(QUERY_BUCKETS) + 1),
+                    'query_sum': 0,
+                    'count': 0,
+                }
+            series['duration_buckets'][_bucket_index(DURATION_BUCKETS, duration)] += 1
+            series['duration_sum'] += duration
+            series['query_buckets'][_bucket_index(QUERY_BUCKETS, queries)] += 1
+            series['query_sum'] += queries
+            series['count'] += 1
+        if self.directory and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return json.loads(json.dumps(self._series))
+
+    def sync(self) -> None:
+        """Atomically write this process's snapshot to the shared directory."""
+        if not self.directory:
+            return
+        self._last_sync = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+
+
+def collect(directory: str) -> Dict[str, Dict]:
+    """Merge the snapshots written by every worker process."""
+    merged: Dict[str, Dict] = {}
+    if not os.path.isdir(directory):
+        return merged
+    for name in os.listdir(directory):
+        if not (name.startswith('metrics_') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        for key, series in data.items():
+            target = merged.get(key)
+            if target is None:
+                merged[key] = series
+                continue
+            for field in ('duration_buckets', 'query_buckets'):
+                target[field] = [a + b for a, b in zip(target[field], series[field])]
+            for field in ('duration_sum', 'query_sum', 'count'):
+                target[field] += series[field]
+    return merged
+
+
+def _histogram_lines(name: str, labels: str, bounds, counts, total_sum, count):
+    cumulative = 0
+    for bound, value in zip(list(bounds) + ['+Inf'], counts):
+        cumulative += value
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f'{name}_sum{{{labels}}} {total_sum}'
+    yield f'{name}_count{{{labels}}} {count}'
+
+
+def render_prometheus(merged: Dict[str, Dict]) -> str:
+    duration, queries, requests = [], [], []
+    for key in sorted(merged):
+        route, method, status = key.split(KEY_SEP)
+        labels = f'route="{route}",method="{method}",status="{status}"'
+        series = merged[key]
+        duration.extend(_histogram_lines('http_request_duration_seconds', labels, DURATION_BUCKETS,
+                                         series['duration_buckets'], series['duration_sum'], series['count']))
+        queries.extend(_histogram_lines('http_request_db_queries', labels, QUERY_BUCKETS,
+                                        series['query_buckets'], series['query_sum'], series['count']))
+        requests.append(f'http_requests_total{{{labels}}} {series["count"]}')
+    lines = [
+        '# HELP http_requests_total Requests by resolved route, method and status class.',
+        '# TYPE http_requests_total counter',
+        *requests,
+        '# HELP http_request_duration_seconds Request latency by resolved route.',
+        '# TYPE http_request_duration_seconds histogram',
+        *duration,
+        '# HELP http_request_db_queries Database queries issued per request.',
+        '# TYPE http_request_db_queries histogram',
+        *queries,
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+_histograms = None
+_histograms_lock = threading.Lock()
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    """Add a callable returning extra Prometheus text lines, evaluated on every scrape."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def render_collectors() -> str:
+    lines = []
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def get_route_histograms() -> RouteHistograms:
+    global _histograms
+    if _histograms is None:
+        with _histograms_lock:
+            if _histograms is None:
+                conf = getattr(settings, 'METRICS', {})
+                _histograms = RouteHistograms(
+                    directory=conf.get('DIR'),
+                    sync_interval=conf.get('SYNC_INTERVAL', 1.0),
+                )
+                atexit.register(_histograms.sync)
+    return _histograms
+
+
+def metrics_view(request):
+    """GET /metrics - Prometheus text exposition aggregated across workers.
+
+    Scrapers authenticate with ``Authorization: Bearer <METRICS['TOKEN']>``.
+    Without a configured token the endpoint is only open in DEBUG or to staff.
+    """
+    conf = getattr(settings, 'METRICS', {})
+    token = conf.get('TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return HttpResponseForbidden()
+    elif not settings.DEBUG and not getattr(getattr(request, 'user', None), 'is_staff', False):
+        return HttpResponseForbidden()
+    histograms = get_route_histograms()
+    if histograms.directory:
+        histograms.sync()
+        merged = collect(histograms.directory)
+    else:
+        merged = histograms.snapshot()
+    body = render_prometheus(merged) + render_collectors()
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
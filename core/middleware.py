@@ -1,30 +1,73 @@
 import time
+from django.db import connection
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
 from django.utils.timezone import now
 
 from accounts.models import AuditLog  # local import to avoid circular at startup
+from .audit import get_audit_buffer
+from .metrics import get_route_histograms
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts queries issued during a request."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
 
 
 class RequestAuditMiddleware(MiddlewareMixin):
     """Logs each request to AuditLog model with duration and outcome.
 
-    This middleware intentionally avoids printing and writes to DB.
+    This middleware intentionally avoids printing and writes to DB. With
+    ``AUDIT_BUFFER['ENABLED']`` rows are queued and bulk-inserted by
+    ``core.audit.AuditBuffer`` instead of one INSERT per request.
+
+    Duration and query count are also fed into the per-route histograms
+    served at ``/metrics`` (see ``core.metrics``).
     """
 
     def process_request(self, request):
         request._audit_start = time.time()
+        request._audit_queries = QueryCounter()
+        connection.execute_wrappers.append(request._audit_queries)
+
+    def _stop_query_counter(self, request) -> int:
+        counter = getattr(request, '_audit_queries', None)
+        if counter is None:
+            return 0
+        if counter in connection.execute_wrappers:
+            connection.execute_wrappers.remove(counter)
+        return counter.count
 
     def process_response(self, request, response):
         try:
             duration = time.time() - getattr(request, '_audit_start', time.time())
+            queries = self._stop_query_counter(request)
+            match = getattr(request, 'resolver_match', None)
+            route = (match.url_name or match.view_name) if match else 'unmatched'
+            if getattr(settings, 'METRICS', {}).get('ENABLED'):
+                get_route_histograms().observe(route, request.method, response.status_code, duration, queries)
             user = getattr(request, 'user', None)
-            AuditLog.objects.create(
-                user=user if getattr(user, 'is_authenticated', False) else None,
-                action=f"{request.method} {request.path}",
-                timestamp=now(),
-                metadata={'status_code': response.status_code, 'duration': duration},
-            )
+            record = {
+                'user_id': user.pk if getattr(user, 'is_authenticated', False) else None,
+                'action': f"{request.method} {request.path}",
+                'timestamp': now(),
+                'metadata': {
+                    'status_code': response.status_code,
+                    'duration': duration,
+                    'queries': queries,
+                    'route': route,
+                },
+            }
+            if getattr(settings, 'AUDIT_BUFFER', {}).get('ENABLED'):
+                get_audit_buffer().put(record)
+            else:
+                AuditLog.objects.create(**record)
         except Exception:
             # Don't let logging break requests
             pass
@@ -0,0 +1,210 @@
+"""Keyset (cursor) pagination with a limit/offset compatibility mode.
+
+``HybridPagination`` is the project default and keeps the limit/offset
+response (with ``count``) unless the client opts in: a request carrying
+``?cursor=`` (empty for the first page) pages by an opaque cursor over
+``keyset_fields`` (default ``('created_at', 'id')``, newest first), so deep
+pages cost the same as the first and no COUNT(*) runs. Endpoints without
+limit/offset clients can make cursor paging their default with
+``pagination_mode = 'keyset'``. ``?offset=`` or an explicit ordering/ranking
+always uses limit/offset, where ``?count=false`` skips the total count.
+"""
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(values, reverse: bool = False) -> str:
+    payload = {'v': [v.isoformat() if isinstance(v, datetime) else v for v in values], 'r': int(reverse)}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = [parse_datetime(v) or v if isinstance(v, str) else v for v in payload['v']]
+        return values, bool(payload.get('r'))
+    except (TypeError, ValueError, KeyError):
+        raise NotFound('Invalid cursor')
+
+
+def keyset_filter(fields, values, descending: bool = True) -> Q:
+    """Rows strictly after ``values`` in (fields...) order: (a < x) OR (a = x AND b < y) ..."""
+    op = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, field in enumerate(fields):
+        clause = Q(**{f'{field}__{op}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            clause &= Q(**{prev_field: prev_value})
+        condition |= clause
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    cursor_query_description = 'Opaque pagination cursor from a previous `next`/`previous` link.'
+    limit_query_param = 'limit'
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 100
+    keyset_fields = ('created_at', 'id')
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_keyset_fields(self, view):
+        return tuple(getattr(view, 'keyset_fields', self.keyset_fields))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        fields = self.get_keyset_fields(view)
+        self.fields = fields
+        cursor = request.query_params.get(self.cursor_query_param)
+        reverse = False
+        if cursor:
+            values, reverse = decode_cursor(cursor)
+            if len(values) != len(fields):
+                raise NotFound('Invalid cursor')
+            queryset = queryset.filter(keyset_filter(fields, values, descending=not reverse))
+        ordering = list(fields) if reverse else [f'-{f}' for f in fields]
+        rows = list(queryset.order_by(*ordering)[:self.limit + 1])
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(cursor)
+        self.page = rows
+        return rows
+
+    def _row_values(self, row):
+        return [getattr(row, f) for f in self.fields]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(self._row_values(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   encode_cursor(self._row_values(self.page[0]), reverse=True))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': self.cursor_query_description, 'schema': {'type': 'string'}},
+            {'name': self.limit_query_param, 'required': False, 'in': 'query',
+             'description': 'Number of results to return per page.', 'schema': {'type': 'integer'}},
+        ]
+
+
+class CountOptionalLimitOffsetPagination(LimitOffsetPagination):
+    """LimitOffsetPagination where ``?count=false`` skips the COUNT(*) query."""
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param, '').lower() not in ('0', 'false', 'no'):
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = None
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_more = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_more:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.count is not None:
+            return super().get_previous_link()
+        if self.offset <= 0:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        if self.offset - self.limit <= 0:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, self.offset - self.limit)
+
+
+class HybridPagination(BasePagination):
+    """Keyset paging when the request (``?cursor=``) or view opts in, limit/offset otherwise."""
+
+    def __init__(self):
+        self.keyset = KeysetPagination()
+        self.offset = CountOptionalLimitOffsetPagination()
+        self.active = self.offset
+
+    def use_keyset(self, queryset, request, view) -> bool:
+        params = request.query_params
+        # views serving in-memory lists (e.g. the crop registry) can only be sliced
+        if not isinstance(queryset, QuerySet) or self.offset.offset_query_param in params:
+            return False
+        if self.keyset.cursor_query_param not in params and getattr(view, 'pagination_mode', None) != 'keyset':
+            return False
+        # an explicit ordering (e.g. ?ordering= or search rank) cannot be paged by keyset
+        first = self.keyset.get_keyset_fields(view)[0]
+        order_by = queryset.query.order_by
+        return not order_by or order_by[0] == f'-{first}'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.keyset if self.use_keyset(queryset, request, view) else self.offset
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.offset.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        params = self.offset.get_schema_operation_parameters(view)
+        return params + self.keyset.get_schema_operation_parameters(view)[:1]
+
+    def to_html(self):  # pragma: no cover - browsable API only
+        return ''
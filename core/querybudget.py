@@ -0,0 +1,128 @@
+"""Per-request SQL query budgets and N+1 detection.
+
+Views declare a budget with a ``query_budget`` attribute, either an int or a
+dict keyed by viewset action (``'default'`` as fallback)::
+
+    class ListingViewSet(viewsets.ModelViewSet):
+        query_budget = {'list': 2, 'retrieve': 1, 'default': 4}
+
+Function views use the ``@query_budget(n)`` decorator (outermost). The
+``QueryBudgetMiddleware`` enforces budgets when ``QUERY_BUDGET['ENABLED']``
+is set; tests can use ``assert_max_queries`` directly. Budgets count every
+query the request issues, including JWTAuthentication's user lookup, so
+calibrate them with bearer-token requests rather than ``force_authenticate``.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Union
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request issues more queries than its declared budget or an N+1 pattern."""
+
+
+def query_shape(sql: str) -> str:
+    """Normalise SQL so repeated lookups differing only in values compare equal."""
+    return _NUMBER.sub('N', _IN_LIST.sub('(%s...)', sql))
+
+
+class QueryInspector:
+    """connection.execute_wrapper recording every query and its shape."""
+
+    def __init__(self):
+        self.queries: List[str] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def repeated_shapes(self, threshold: int) -> Dict[str, int]:
+        """Query shapes issued at least ``threshold`` times (likely N+1)."""
+        shapes = Counter(query_shape(sql) for sql in self.queries)
+        return {shape: n for shape, n in shapes.items() if n >= threshold}
+
+    def violations(self, budget: Optional[int], n_plus_one_threshold: Optional[int]) -> List[str]:
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} queries exceeds budget of {budget}')
+        if n_plus_one_threshold:
+            for shape, n in self.repeated_shapes(n_plus_one_threshold).items():
+                problems.append(f'N+1: {n}x {shape}')
+        return problems
+
+
+def query_budget(budget: Union[int, Dict[str, int]]):
+    """Declare a budget on a function view (apply outside ``@api_view``)."""
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def resolve_budget(request) -> Optional[int]:
+    """Find the declared budget for the view/action that handled ``request``."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    func = match.func
+    budget = getattr(func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(func, 'cls', None), 'query_budget', None)
+    if isinstance(budget, dict):
+        action = (getattr(func, 'actions', None) or {}).get(request.method.lower())
+        budget = budget.get(action, budget.get('default'))
+    if budget is None:
+        budget = getattr(settings, 'QUERY_BUDGET', {}).get('DEFAULT')
+    return budget
+
+
+@contextmanager
+def assert_max_queries(budget: Optional[int], n_plus_one_threshold: Optional[int] = 3):
+    """Test helper: fail if the block exceeds ``budget`` queries or repeats a query shape."""
+    inspector = QueryInspector()
+    with connection.execute_wrapper(inspector):
+        yield inspector
+    problems = inspector.violations(budget, n_plus_one_threshold)
+    if problems:
+        raise QueryBudgetExceeded('; '.join(problems) + '\n' + '\n'.join(inspector.queries))
+
+
+class QueryBudgetMiddleware:
+    """Opt-in: count queries per request and log or raise on budget/N+1 violations.
+
+    The check runs after the view has committed its work, so ``RAISE`` only
+    applies with ``DEBUG`` (development and tests); elsewhere violations are
+    logged and the response is returned.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conf = getattr(settings, 'QUERY_BUDGET', {})
+        if not conf.get('ENABLED'):
+            return self.get_response(request)
+        inspector = QueryInspector()
+        with connection.execute_wrapper(inspector):
+            response = self.get_response(request)
+        problems = inspector.violations(resolve_budget(request), conf.get('N_PLUS_ONE_THRESHOLD'))
+        if problems:
+            message = f"{request.method} {request.path}: {'; '.join(problems)}"
+            if conf.get('RAISE') and settings.DEBUG:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -1,8 +1,12 @@
 # core/tasks.py
 from celery import shared_task
+from celery.signals import worker_process_shutdown, worker_shutdown
+from django.utils.dateparse import parse_datetime
 import time
 import logging
 
+from .audit import flush_audit_buffer, write_audit_records
+
 logger = logging.getLogger(__name__)
 
 @shared_task
@@ -11,3 +15,21 @@ def test_celery_task():
     time.sleep(2)
     logger.info("✅ Celery test task completed!")
     return "Celery is working!"
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def write_audit_batch_task(self, records: list):
+    """Bulk insert a batch of audit records handed off by AuditBuffer."""
+    for record in records:
+        record['timestamp'] = parse_datetime(record['timestamp'])
+    try:
+        write_audit_records(records)
+    except Exception as exc:
+        raise self.retry(exc=exc)
+    return len(records)
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def flush_audit_on_shutdown(**kwargs):
+    flush_audit_buffer()
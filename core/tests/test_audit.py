@@ -0,0 +1,26 @@
+import pytest
+from django.utils import timezone
+from accounts.models import AuditLog
+from core.audit import AuditBuffer
+
+
+def _record(i):
+    return {'user_id': None, 'action': f'GET /x/{i}/', 'timestamp': timezone.now(), 'metadata': {'status_code': 200}}
+
+
+@pytest.mark.django_db
+def test_audit_buffer_flushes_by_size_and_drops_on_overflow():
+    buffer = AuditBuffer(max_size=5, batch_size=3, flush_interval=0)
+    for i in range(3):
+        assert buffer.put(_record(i))
+    # reaching batch_size triggers a bulk_create
+    assert AuditLog.objects.count() == 3
+    assert buffer.pending() == 0
+
+    buffer.batch_size = 100
+    results = [buffer.put(_record(i)) for i in range(7)]
+    assert results.count(False) == 2
+    assert buffer.dropped == 2
+
+    assert buffer.flush() == 5
+    assert AuditLog.objects.count() == 8
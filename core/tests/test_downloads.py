@@ -0,0 +1,118 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import KYCDocument
+from contracts.models import Contract
+from core.downloads import RangeNotSatisfiable, parse_range
+from marketplace.models import Crop, Listing
+
+User = get_user_model()
+BODY = bytes(range(256)) * 40  # 10 KiB
+
+
+@pytest.fixture
+def media(db, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.QUERY_BUDGET = {'ENABLED': True, 'RAISE': True, 'DEFAULT': None, 'N_PLUS_ONE_THRESHOLD': 3}
+    settings.DEBUG = True  # RAISE only applies with DEBUG
+    return tmp_path
+
+
+@pytest.fixture
+def contract(media):
+    farmer = User.objects.create_user('dl_farmer', role='farmer')
+    buyer = User.objects.create_user('dl_buyer', role='buyer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Jowar'), quantity_available=10,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    contract = Contract.objects.create(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25,
+                                       total_value=25, status='active')
+    contract.contract_document.save('signed.pdf', ContentFile(BODY))
+    return contract
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+
+def body(response):
+    return b''.join(response.streaming_content)
+
+
+def test_parse_range():
+    assert parse_range('bytes=0-99', 1000) == (0, 99)
+    assert parse_range('bytes=900-', 1000) == (900, 999)
+    assert parse_range('bytes=-100', 1000) == (900, 999)
+    assert parse_range('bytes=990-5000', 1000) == (990, 999)
+    assert parse_range('bytes=0-1,5-9', 1000) is None
+    assert parse_range('items=0-1', 1000) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range('bytes=1000-', 1000)
+
+
+def test_parties_download_with_range_and_etag(contract):
+    url = f'/api/v1/contracts/contracts/{contract.pk}/document/'
+    outsider = User.objects.create_user('dl_outsider', role='buyer')
+    assert client_for(outsider).get(url).status_code == 403
+
+    client = client_for(contract.buyer)
+    r = client.get(url)
+    assert r.status_code == 200
+    assert body(r) == BODY
+    assert r['Content-Type'] == 'application/pdf' and r['Accept-Ranges'] == 'bytes'
+    assert f'contract_{contract.pk}.pdf' in r['Content-Disposition']
+    etag = r['ETag']
+
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    partial = client.get(url, HTTP_RANGE='bytes=100-199')
+    assert partial.status_code == 206
+    assert partial['Content-Range'] == f'bytes 100-199/{len(BODY)}'
+    assert partial['Content-Length'] == '100'
+    assert body(partial) == BODY[100:200]
+    # a stale If-Range validator gets the whole (changed) file
+    assert client.get(url, HTTP_RANGE='bytes=100-199', HTTP_IF_RANGE='"stale"').status_code == 200
+    assert client.get(url, HTTP_RANGE=f'bytes={len(BODY)}-').status_code == 416
+
+
+def test_offload_headers(contract, settings):
+    url = f'/api/v1/contracts/contracts/{contract.pk}/document/'
+    client = client_for(contract.listing.farmer)
+    settings.PROTECTED_MEDIA = {'BACKEND': 'nginx', 'INTERNAL_PREFIX': '/protected-media/'}
+    r = client.get(url)
+    assert r['X-Accel-Redirect'] == f'/protected-media/{contract.contract_document.name}'
+    assert r.content == b'' and r['ETag']
+    settings.PROTECTED_MEDIA = {'BACKEND': 'apache'}
+    assert client.get(url)['X-Sendfile'] == default_storage.path(contract.contract_document.name)
+
+
+def test_signed_link_skips_the_orm(contract, settings, django_assert_num_queries):
+    client = client_for(contract.buyer)
+    r = client.get(f'/api/v1/contracts/contracts/{contract.pk}/document_link/')
+    assert r.status_code == 200
+    link = r.data['url']
+
+    anonymous = APIClient()
+    with django_assert_num_queries(1):  # the audit row only
+        download = anonymous.get(link)
+    assert download.status_code == 200 and body(download) == BODY
+    tampered = link[:-2] + ('A' if link[-2] != 'A' else 'B') + '/'
+    assert anonymous.get(tampered).status_code == 404
+    settings.PROTECTED_MEDIA = {'URL_MAX_AGE': -1}
+    assert anonymous.get(link).status_code == 410
+
+
+def test_kyc_download_is_owner_only(media):
+    owner = User.objects.create_user('dl_kyc_owner', role='farmer')
+    doc = KYCDocument.objects.create(user=owner, document=ContentFile(b'%PDF-kyc', name='id.pdf'))
+    url = f'/api/v1/accounts/kyc/{doc.pk}/download/'
+    assert client_for(User.objects.create_user('dl_kyc_other', role='buyer')).get(url).status_code == 404
+    assert body(client_for(owner).get(url)) == b'%PDF-kyc'
+    staff = User.objects.create_user('dl_kyc_staff', is_staff=True)
+    link = client_for(staff).get(f'/api/v1/accounts/kyc/{doc.pk}/link/').data['url']
+    assert body(APIClient().get(link)) == b'%PDF-kyc'
@@ -0,0 +1,42 @@
+import json
+
+from django.contrib.auth.models import AnonymousUser
+
+from core.metrics import RouteHistograms, collect, metrics_view, render_prometheus
+
+
+def test_route_histograms_aggregate_across_workers(tmp_path):
+    worker_a = RouteHistograms(directory=str(tmp_path))
+    worker_a.observe('listing-list', 'GET', 200, 0.004, queries=2)
+    worker_a.observe('listing-list', 'GET', 503, 0.7, queries=1)
+    worker_a.sync()
+
+    # a second worker writes its own snapshot file
+    worker_b = RouteHistograms()
+    worker_b.observe('listing-list', 'GET', 201, 0.02, queries=12)
+    (tmp_path / 'metrics_other.json').write_text(json.dumps(worker_b.snapshot()))
+
+    merged = collect(str(tmp_path))
+    assert merged['listing-list|GET|2xx']['count'] == 2
+    assert merged['listing-list|GET|5xx']['count'] == 1
+
+    text = render_prometheus(merged)
+    assert 'http_requests_total{route="listing-list",method="GET",status="2xx"} 2' in text
+    assert 'http_request_duration_seconds_bucket{route="listing-list",method="GET",status="2xx",le="0.005"} 1' in text
+    assert 'http_request_duration_seconds_bucket{route="listing-list",method="GET",status="2xx",le="+Inf"} 2' in text
+    assert 'http_request_db_queries_sum{route="listing-list",method="GET",status="2xx"} 14' in text
+
+
+def test_metrics_stay_private_without_a_token(rf, settings, admin_user, tmp_path):
+    settings.DEBUG = False
+    settings.METRICS = {'DIR': str(tmp_path), 'TOKEN': ''}
+    request = rf.get('/metrics')
+    request.user = AnonymousUser()
+    assert metrics_view(request).status_code == 403
+
+    request.user = admin_user
+    assert metrics_view(request).status_code == 200
+
+    settings.METRICS = {'DIR': str(tmp_path), 'TOKEN': 's3cret'}
+    assert metrics_view(request).status_code == 403
+    assert metrics_view(rf.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')).status_code == 200
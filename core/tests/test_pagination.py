@@ -0,0 +1,57 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from marketplace.models import Crop, Listing
+
+URL = '/api/v1/marketplace/listings/'
+
+
+@pytest.fixture
+def listing_ids(db):
+    farmer = get_user_model().objects.create_user('page_farmer', role='farmer')
+    crop = Crop.objects.create(name='Millet')
+    now = timezone.now()
+    # two listings share a created_at to exercise the id tie-breaker
+    stamps = [now - timedelta(minutes=m) for m in (0, 1, 1, 2, 3)]
+    listings = [
+        Listing.objects.create(farmer=farmer, crop=crop, quantity_available=1, harvest_date=now.date(),
+                               price_floor=10 + i, created_at=ts)
+        for i, ts in enumerate(stamps)
+    ]
+    return [l.id for l in sorted(listings, key=lambda l: (l.created_at, l.id), reverse=True)]
+
+
+@pytest.mark.django_db
+def test_keyset_pages_forward_and_back(listing_ids):
+    client = APIClient()
+    r = client.get(URL, {'limit': 2, 'cursor': ''})  # an empty cursor opts in to keyset paging
+    assert 'count' not in r.data and r.data['previous'] is None
+    seen = [row['id'] for row in r.data['results']]
+    pages = [seen[:]]
+    while r.data['next']:
+        r = client.get(r.data['next'])
+        pages.append([row['id'] for row in r.data['results']])
+        seen += pages[-1]
+    assert seen == listing_ids
+
+    back = client.get(r.data['previous'])
+    assert [row['id'] for row in back.data['results']] == pages[-2]
+
+
+@pytest.mark.django_db
+def test_limit_offset_compatibility_and_optional_count(listing_ids):
+    client = APIClient()
+    r = client.get(URL, {'limit': 2})  # existing clients keep the limit/offset shape
+    assert r.data['count'] == 5 and 'offset=2' in r.data['next']
+
+    r = client.get(URL, {'limit': 2, 'offset': 2})
+    assert r.data['count'] == 5
+    assert [row['id'] for row in r.data['results']] == listing_ids[2:4]
+
+    r = client.get(URL, {'limit': 2, 'offset': 0, 'count': 'false'})
+    assert r.data['count'] is None
+    assert 'offset=2' in r.data['next']
+
+    assert client.get(URL, {'cursor': 'not-a-cursor'}).status_code == 404
@@ -0,0 +1,99 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from contracts.models import Contract, PriceProposal, EscrowTransaction, Shipment, Dispute
+from core.querybudget import QueryBudgetExceeded, assert_max_queries
+from marketplace.models import Crop, Listing
+
+User = get_user_model()
+
+
+@pytest.fixture
+def budget_settings(settings):
+    settings.QUERY_BUDGET = {'ENABLED': True, 'RAISE': True, 'DEFAULT': None, 'N_PLUS_ONE_THRESHOLD': 3}
+    settings.DEBUG = True  # RAISE only applies with DEBUG
+    return settings
+
+
+def bearer_client(user):
+    """A client sending a real JWT, so budgets include JWTAuthentication's user lookup."""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+
+@pytest.fixture
+def marketplace_data():
+    farmer = User.objects.create_user('qb_farmer', role='farmer')
+    buyers = [User.objects.create_user(f'qb_buyer{i}', role='buyer') for i in range(4)]
+    for i, buyer in enumerate(buyers):
+        crop = Crop.objects.create(name=f'QB crop {i}')
+        listing = Listing.objects.create(farmer=farmer, crop=crop, quantity_available=100,
+                                         harvest_date=timezone.now().date(), price_floor=20)
+        contract = Contract.objects.create(listing=listing, buyer=buyer, agreed_quantity=1,
+                                           price_per_unit=25, total_value=25)
+        for proposer in (buyer, farmer, buyer):
+            PriceProposal.objects.create(contract=contract, proposer=proposer, price_per_unit=24)
+        EscrowTransaction.objects.create(contract=contract, amount=25, status='held', payment_reference=f'qb_{i}')
+        Shipment.objects.create(contract=contract, tracking_id=f'trk{i}')
+        Dispute.objects.create(contract=contract, raised_by=buyer, description='late')
+    return farmer, buyers
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', [
+    '/api/v1/contracts/contracts/',
+    '/api/v1/contracts/escrows/',
+    '/api/v1/contracts/shipments/',
+    '/api/v1/contracts/disputes/',
+    '/api/v1/marketplace/crops/',
+    '/api/v1/marketplace/listings/',
+    '/api/v1/marketplace/listings/recent/',
+    '/api/v1/analytics/farmer-revenue/',
+    '/api/v1/analytics/active-contracts/',
+    '/api/v1/analytics/avg-delivery-time/',
+    '/api/v1/analytics/acceptance-rate/',
+])
+def test_endpoints_stay_within_query_budget(budget_settings, marketplace_data, url):
+    farmer, _ = marketplace_data
+    # QueryBudgetMiddleware raises QueryBudgetExceeded on a regression
+    assert bearer_client(farmer).get(url).status_code == 200
+
+
+@pytest.mark.django_db
+def test_contract_actions_stay_within_query_budget(budget_settings, marketplace_data):
+    budget_settings.PAYMENT_GATEWAY = {'LATENCY_MS': 0, 'FAILURE_RATE': 0.0, 'AUTO_WEBHOOK': False}
+    farmer, buyers = marketplace_data
+    EscrowTransaction.objects.update(status='pending')
+    contract, cancelled, *rest = Contract.objects.order_by('pk')
+    url = '/api/v1/contracts/contracts/'
+    admin = User.objects.create_user('qb_admin', role='farmer', is_staff=True)
+    assert bearer_client(buyers[0]).post(f'{url}{contract.pk}/propose_price/', {'price_per_unit': 23},
+                                         format='json').status_code == 201
+    assert bearer_client(farmer).post(f'{url}{contract.pk}/accept_proposal/', format='json').status_code == 200
+    assert bearer_client(buyers[0]).post(f'{url}{contract.pk}/sign/').status_code == 200
+    assert bearer_client(farmer).post(f'{url}{cancelled.pk}/cancel/').status_code == 200
+    r = bearer_client(admin).post(f'{url}bulk_transition/', {'transition': 'cancel', 'ids': [c.pk for c in rest]},
+                                  format='json')
+    assert r.data['moved'] == len(rest)
+
+
+@pytest.mark.django_db
+def test_production_logs_instead_of_failing_the_request(budget_settings, marketplace_data, caplog):
+    budget_settings.DEBUG = False
+    budget_settings.QUERY_BUDGET = {**budget_settings.QUERY_BUDGET, 'DEFAULT': 0}
+    farmer, _ = marketplace_data
+    assert bearer_client(farmer).get('/api/v1/accounts/me/').status_code == 200
+    assert 'exceeds budget of 0' in caplog.text
+
+
+@pytest.mark.django_db
+def test_assert_max_queries_detects_n_plus_one(marketplace_data):
+    with pytest.raises(QueryBudgetExceeded, match='N\\+1'):
+        with assert_max_queries(None):
+            [str(p) for p in PriceProposal.objects.all()]
+
+    with assert_max_queries(1):
+        [str(p) for p in PriceProposal.objects.select_related('proposer')]
@@ -0,0 +1,24 @@
+"""Cached listing feeds (``recent`` and the anonymous first page of ``listing-list``).
+
+Keys embed a generation counter bumped by Listing/Crop save and delete
+signals after commit, so every feed is invalidated at once.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import bump_generation, get_generation
+
+FEED_NAMESPACE = 'listing_feed'
+
+
+def feed_key(variant: str) -> str:
+    return f'{FEED_NAMESPACE}:{get_generation(FEED_NAMESPACE)}:{variant}'
+
+
+def feed_timeout() -> int:
+    return getattr(settings, 'LISTING_FEED_CACHE_TIMEOUT', 300)
+
+
+def invalidate_listing_feed() -> None:
+    # after commit so a reader cannot re-cache the pre-commit rows under the new generation
+    transaction.on_commit(lambda: bump_generation(FEED_NAMESPACE))
@@ -0,0 +1,101 @@
+"""Facet counts (crop, location, quality_grade) for the listing filter sidebar.
+
+Counts are summed from ``ListingFacet``, one row per combination of the three
+facet fields, so filters on those fields are answered from the facet table
+with the same FilterSet ``ListingViewSet`` uses. Filters the table cannot
+express (``?search=``, ``?near=``) fall back to grouping the filtered listing
+queryset itself.
+"""
+from collections import Counter
+from typing import Dict
+
+from django.db import transaction
+from django.db.models import Count
+from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+
+from .models import Listing, ListingFacet
+from .registry import crop_registry
+
+FACET_FIELDS = ('crop', 'location', 'quality_grade')
+# query parameters that do not change which listings are counted
+IGNORED_PARAMS = {'ordering', 'limit', 'offset', 'cursor', 'count', 'format'}
+
+
+def rebuild_facets() -> Dict[str, int]:
+    """Recount every combination from Listing and correct the facet table.
+
+    Only rows whose count drifted are written, so the returned numbers show
+    how far the incremental updates were off.
+    """
+    actual = {
+        (row['crop_id'], row['location'], row['quality_grade']): row['n']
+        for row in Listing.objects.order_by().values('crop_id', 'location', 'quality_grade').annotate(n=Count('id'))
+    }
+    report = {'combinations': len(actual), 'created': 0, 'updated': 0, 'deleted': 0}
+    with transaction.atomic():
+        stored = {row.facet_key: row for row in ListingFacet.objects.select_for_update()}
+        stale, changed = [], []
+        for key, row in stored.items():
+            if key not in actual:
+                stale.append(row.pk)
+            elif row.count != actual[key]:
+                row.count = actual[key]
+                changed.append(row)
+        missing = [
+            ListingFacet(crop_id=c, location=l, quality_grade=q, count=n)
+            for (c, l, q), n in actual.items() if (c, l, q) not in stored
+        ]
+        if stale:
+            ListingFacet.objects.filter(pk__in=stale).delete()
+        if changed:
+            ListingFacet.objects.bulk_update(changed, ['count'], batch_size=500)
+        if missing:
+            ListingFacet.objects.bulk_create(missing, batch_size=500)
+    report.update(created=len(missing), updated=len(changed), deleted=len(stale))
+    return report
+
+
+def summarize(rows, source: str) -> Dict:
+    """Collapse ``(crop_id, location, quality_grade, count)`` rows into per-facet counts."""
+    counters = {field: Counter() for field in FACET_FIELDS}
+    total = 0
+    for crop_id, location, grade, count in rows:
+        counters['crop'][crop_id] += count
+        counters['location'][location] += count
+        counters['quality_grade'][grade] += count
+        total += count
+    facets = {}
+    for field in FACET_FIELDS:
+        values = []
+        for value, count in sorted(counters[field].items(), key=lambda item: (-item[1], str(item[0]))):
+            entry = {'value': value, 'count': count}
+            if field == 'crop':
+                crop = crop_registry.get(value)
+                entry['label'] = crop.name if crop is not None else None
+            values.append(entry)
+        facets[field] = values
+    return {'total': total, 'source': source, 'facets': facets}
+
+
+def table_counts(queryset) -> Dict:
+    rows = queryset.filter(count__gt=0).values_list('crop_id', 'location', 'quality_grade', 'count')
+    return summarize(rows, 'table')
+
+
+def live_counts(queryset) -> Dict:
+    rows = queryset.order_by().values_list('crop_id', 'location', 'quality_grade').annotate(n=Count('id'))
+    return summarize(rows, 'live')
+
+
+def facet_counts(view, request) -> Dict:
+    """Facet counts for ``view``'s listing queryset under the request's filters."""
+    params = set(request.query_params) - IGNORED_PARAMS
+    if params <= set(view.filterset_fields):
+        # the facet table has the same crop/location/quality_grade fields, so the
+        # view's own FilterSet applies to it unchanged
+        filterset = DjangoFilterBackend().get_filterset(request, ListingFacet.objects.all(), view)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return table_counts(filterset.qs)
+    return live_counts(view.filter_queryset(view.get_queryset()))
@@ -0,0 +1,222 @@
+"""Listing coordinates and proximity search without PostGIS.
+
+Coordinates come from a local gazetteer CSV (``LISTING_GAZETTEER_PATH``:
+name, state, latitude, longitude, ``|``-separated aliases), so geocoding
+never calls an external service. Each geocoded listing also stores an
+integer ``geo_cell`` on a fixed ``GEO_CELL_DEGREES`` lat/lon grid, indexed
+with a plain B-tree.
+
+``?near=lat,lon&radius_km=`` turns the search circle into its bounding box,
+prunes candidates with one contiguous ``geo_cell`` range per grid row plus
+the latitude/longitude box, then evaluates the haversine distance set-wise
+in SQL over the surviving rows (Django registers the trigonometric functions
+on SQLite, PostgreSQL has them natively) and keeps those within the radius,
+nearest first.
+"""
+import csv
+import math
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.195
+GEO_CELL_DEGREES = 0.25
+GEO_GRID_COLUMNS = int(360 / GEO_CELL_DEGREES)
+GEO_GRID_ROWS = int(180 / GEO_CELL_DEGREES)
+# beyond this many grid rows a single lat/lon box is cheaper than the OR of ranges
+MAX_CELL_ROWS = 64
+DEFAULT_RADIUS_KM = 50.0
+MAX_RADIUS_KM = 1000.0
+
+DEFAULT_GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+
+Point = Tuple[float, float]
+
+
+def normalize_place(name: str) -> str:
+    return ' '.join(str(name).replace('.', ' ').split()).casefold()
+
+
+class Gazetteer:
+    """Place name -> (latitude, longitude), loaded once per process."""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._places: Optional[Dict[str, Point]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return Path(self._path or getattr(settings, 'LISTING_GAZETTEER_PATH', None) or DEFAULT_GAZETTEER_PATH)
+
+    def load(self) -> Dict[str, Point]:
+        places: Dict[str, Point] = {}
+        with open(self.path, newline='', encoding='utf-8') as handle:
+            for row in csv.DictReader(handle):
+                point = (float(row['latitude']), float(row['longitude']))
+                names = [row['name']] + [a for a in (row.get('aliases') or '').split('|') if a.strip()]
+                for name in names:
+                    places.setdefault(normalize_place(name), point)
+                    if row.get('state'):
+                        places.setdefault(normalize_place(f"{name}, {row['state']}"), point)
+        return places
+
+    @property
+    def places(self) -> Dict[str, Point]:
+        if self._places is None:
+            with self._lock:
+                if self._places is None:
+                    self._places = self.load()
+        return self._places
+
+    def reload(self) -> None:
+        with self._lock:
+            self._places = None
+
+    def geocode(self, location: str) -> Optional[Point]:
+        """Coordinates for a free-text location such as ``"Sinnar, Nashik"``.
+
+        Tries the whole string, then each comma-separated part from the most
+        specific (village) to the broadest (district/state).
+        """
+        if not location or not location.strip():
+            return None
+        places = self.places
+        key = normalize_place(location)
+        if key in places:
+            return places[key]
+        for part in location.split(','):
+            point = places.get(normalize_place(part))
+            if point is not None:
+                return point
+        return None
+
+
+gazetteer = Gazetteer()
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    row = min(int((latitude + 90) / GEO_CELL_DEGREES), GEO_GRID_ROWS - 1)
+    col = min(int((longitude + 180) / GEO_CELL_DEGREES), GEO_GRID_COLUMNS - 1)
+    return row * GEO_GRID_COLUMNS + col
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float):
+    """(min_lat, max_lat, [(min_lon, max_lon), ...]) enclosing the circle.
+
+    Longitude spans are split at the antimeridian; near the poles the box
+    covers every longitude.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    widest = max(abs(min_lat), abs(max_lat))
+    if widest >= 89.9:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    dlon = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(widest)))
+    if dlon >= 180:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    min_lon, max_lon = longitude - dlon, longitude + dlon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def cell_ranges(min_lat: float, max_lat: float, lon_spans) -> Optional[List[Tuple[int, int]]]:
+    """Contiguous ``geo_cell`` ranges covering the box, or None when too many rows."""
+    first_row = grid_cell(min_lat, 0) // GEO_GRID_COLUMNS
+    last_row = grid_cell(max_lat, 0) // GEO_GRID_COLUMNS
+    if last_row - first_row + 1 > MAX_CELL_ROWS:
+        return None
+    ranges = []
+    for row in range(first_row, last_row + 1):
+        base = row * GEO_GRID_COLUMNS
+        for min_lon, max_lon in lon_spans:
+            first = grid_cell(-90, min_lon) % GEO_GRID_COLUMNS
+            last = grid_cell(-90, max_lon) % GEO_GRID_COLUMNS
+            ranges.append((base + first, base + last))
+    return ranges
+
+
+def haversine_expression(latitude: float, longitude: float):
+    """Great-circle distance in km from the given point to each row's coordinates."""
+    lat0 = Value(math.radians(latitude), output_field=FloatField())
+    lon0 = Value(math.radians(longitude), output_field=FloatField())
+    lat1, lon1 = Radians(F('latitude')), Radians(F('longitude'))
+    a = Power(Sin((lat1 - lat0) / 2), 2) + Cos(lat0) * Cos(lat1) * Power(Sin((lon1 - lon0) / 2), 2)
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def haversine_km(a: Point, b: Point) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def filter_near(queryset, latitude: float, longitude: float, radius_km: float):
+    """Listings within ``radius_km`` of the point, annotated with ``distance_km``, nearest first."""
+    min_lat, max_lat, lon_spans = bounding_box(latitude, longitude, radius_km)
+    box = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    lon_box = Q()
+    for min_lon, max_lon in lon_spans:
+        lon_box |= Q(longitude__gte=min_lon, longitude__lte=max_lon)
+    ranges = cell_ranges(min_lat, max_lat, lon_spans)
+    if ranges is not None:
+        cells = Q()
+        for first, last in ranges:
+            cells |= Q(geo_cell__gte=first, geo_cell__lte=last)
+        box &= cells
+    return (
+        queryset.filter(box & lon_box)
+        .annotate(distance_km=haversine_expression(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+        .order_by('distance_km', '-created_at')
+    )
+
+
+def parse_near(near: str, radius) -> Tuple[float, float, float]:
+    try:
+        lat_text, lon_text = near.split(',')
+        latitude, longitude = float(lat_text), float(lon_text)
+    except ValueError:
+        raise ValidationError({'near': ['Expected "lat,lon", e.g. near=18.52,73.86.']})
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': ['Latitude must be within ±90 and longitude within ±180.']})
+    try:
+        radius_km = DEFAULT_RADIUS_KM if radius in (None, '') else float(radius)
+    except ValueError:
+        raise ValidationError({'radius_km': ['A number is required.']})
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValidationError({'radius_km': [f'Must be greater than 0 and at most {MAX_RADIUS_KM:g}.']})
+    return latitude, longitude, radius_km
+
+
+class NearFilter(filters.BaseFilterBackend):
+    """``?near=lat,lon&radius_km=`` proximity filter ordered by distance."""
+    near_param = 'near'
+    radius_param = 'radius_km'
+
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get(self.near_param)
+        if not near:
+            return queryset
+        latitude, longitude, radius_km = parse_near(near, request.query_params.get(self.radius_param))
+        return filter_near(queryset, latitude, longitude, radius_km)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.near_param, 'required': False, 'in': 'query',
+             'description': 'Only listings near this point, nearest first ("lat,lon").',
+             'schema': {'type': 'string'}},
+            {'name': self.radius_param, 'required': False, 'in': 'query',
+             'description': f'Search radius in km for `near` (default {DEFAULT_RADIUS_KM:g}).',
+             'schema': {'type': 'number'}},
+        ]
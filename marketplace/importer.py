@@ -0,0 +1,189 @@
+"""Streaming bulk import of listings from NDJSON or CSV.
+
+Rows are parsed lazily, validated in chunks with crop lookups served by the
+crop registry, and written with ``bulk_create``; a bad row is reported and
+skipped without aborting the file. Only one chunk is held in memory at a time.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from .cache import invalidate_listing_feed
+from .models import Listing
+from .registry import crop_registry
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+MAX_BATCH_SIZE = 10000
+
+
+def batch_size_param(request, default: int = 1000) -> int:
+    """``?batch_size=`` for the streaming import endpoints; ValidationError (400) if malformed."""
+    raw = request.query_params.get('batch_size')
+    if raw in (None, ''):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise serializers.ValidationError({'batch_size': ['A valid integer is required.']})
+    if not 1 <= value <= MAX_BATCH_SIZE:
+        raise serializers.ValidationError({'batch_size': [f'Must be between 1 and {MAX_BATCH_SIZE}.']})
+    return value
+
+
+def iter_lines(stream) -> Iterator[str]:
+    """Decode a byte or text stream line by line without reading it whole."""
+    for line in stream:
+        yield line.decode('utf-8-sig') if isinstance(line, bytes) else line
+
+
+def iter_rows(lines: Iterable[str], fmt: str) -> Iterator[Dict]:
+    """Yield one dict per record; unparseable NDJSON lines yield ``{'__error__': ...}``."""
+    if fmt == FORMAT_CSV:
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield {'__error__': f'Invalid JSON: {exc}'}
+            continue
+        yield row if isinstance(row, dict) else {'__error__': 'Each line must be a JSON object'}
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    failed: int = 0
+    max_errors: Optional[int] = 1000
+    errors: List[Dict] = field(default_factory=list)
+
+    def add_error(self, row_number: int, errors) -> None:
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self) -> Dict:
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+class ListingImporter:
+    """Validate and insert listing rows for one farmer in batches."""
+
+    def __init__(self, farmer, batch_size: int = 1000, max_errors: Optional[int] = 1000, on_error=None):
+        self.farmer = farmer
+        self.batch_size = batch_size
+        self.report = ImportReport(max_errors=max_errors)
+        self.on_error = on_error
+        # DRF fields reused across rows for parsing; mirrors ListingSerializer/Listing.clean
+        self._quantity = serializers.DecimalField(max_digits=12, decimal_places=3)
+        self._price = serializers.DecimalField(max_digits=12, decimal_places=2)
+        self._date = serializers.DateField()
+        self._text = serializers.CharField(max_length=255, allow_blank=True, required=False)
+        self._grade = serializers.CharField(max_length=32, allow_blank=True, required=False)
+        self._lat = serializers.FloatField(min_value=-90, max_value=90)
+        self._lon = serializers.FloatField(min_value=-180, max_value=180)
+
+    def _error(self, row_number: int, errors) -> None:
+        self.report.add_error(row_number, errors)
+        if self.on_error:
+            self.on_error(row_number, errors)
+
+    def build(self, row: Dict, today) -> Listing:
+        """Return an unsaved Listing or raise ValidationError with per-field messages."""
+        if '__error__' in row:
+            raise serializers.ValidationError({'row': [row['__error__']]})
+        errors, values = {}, {}
+        crop = None
+        crop_id, crop_name = row.get('crop_id'), row.get('crop_name')
+        if crop_id not in (None, ''):
+            crop = crop_registry.get(crop_id)
+            if crop is None:
+                errors['crop_id'] = [f'Invalid pk "{crop_id}" - object does not exist.']
+        elif not (crop_name and str(crop_name).strip()):
+            errors['crop'] = ['Provide either crop_id or crop_name.']
+
+        for name, parser in (('quantity_available', self._quantity), ('price_floor', self._price),
+                             ('harvest_date', self._date)):
+            try:
+                values[name] = parser.run_validation(row.get(name, empty))
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+        for name, parser in (('location', self._text), ('quality_grade', self._grade)):
+            try:
+                values[name] = parser.run_validation(row.get(name) or '')
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+
+        # optional explicit coordinates; otherwise Listing.refresh_geo geocodes location
+        if row.get('latitude') not in (None, '') or row.get('longitude') not in (None, ''):
+            for name, parser in (('latitude', self._lat), ('longitude', self._lon)):
+                try:
+                    values[name] = parser.run_validation(row.get(name, empty))
+                except serializers.ValidationError as exc:
+                    errors[name] = exc.detail
+
+        if 'quantity_available' in values and values['quantity_available'] <= 0:
+            errors['quantity_available'] = ['Quantity must be positive']
+        if 'harvest_date' in values and values['harvest_date'] < today:
+            errors['harvest_date'] = ['Harvest date cannot be in the past']
+        if errors:
+            raise serializers.ValidationError(errors)
+        if crop is None:
+            # only once the row is known to be valid, so rejected rows leave no crops behind
+            crop = crop_registry.get_or_create_by_name(crop_name)
+        return Listing(farmer=self.farmer, crop=crop, **values)
+
+    def _flush(self, batch: List) -> None:
+        if not batch:
+            return
+        try:
+            with transaction.atomic():
+                Listing.objects.bulk_create([listing for _, listing in batch])
+            self.report.created += len(batch)
+        except DatabaseError:
+            # isolate the failing rows instead of losing the whole batch
+            for row_number, listing in batch:
+                try:
+                    with transaction.atomic():
+                        Listing.objects.bulk_create([listing])
+                    self.report.created += 1
+                except DatabaseError as exc:
+                    self._error(row_number, {'database': [str(exc)]})
+
+    def run(self, rows: Iterable[Dict]) -> ImportReport:
+        today = timezone.now().date()
+        batch = []
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                batch.append((row_number, self.build(row, today)))
+            except serializers.ValidationError as exc:
+                self._error(row_number, exc.detail)
+                continue
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        self._flush(batch)
+        if self.report.created:
+            invalidate_listing_feed()
+        return self.report
+
+
+def detect_format(content_type: str = '', filename: str = '') -> str:
+    if 'csv' in (content_type or '') or (filename or '').lower().endswith('.csv'):
+        return FORMAT_CSV
+    return FORMAT_NDJSON
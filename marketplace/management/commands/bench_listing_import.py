@@ -0,0 +1,84 @@
+import random
+import resource
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+
+from marketplace.importer import ListingImporter
+from marketplace.models import Listing
+from marketplace.registry import crop_registry
+from marketplace.serializers import ListingSerializer
+
+CROPS = ['Wheat', 'Rice', 'Maize', 'Barley', 'Soybean', 'Cotton', 'Potato', 'Onion']
+VILLAGES = ['Nashik', 'Pune', 'Indore', 'Ludhiana', 'Karnal', 'Guntur', 'Hubli', 'Rajkot']
+
+
+def synthetic_rows(n, error_rate):
+    """Lazily generate rows so the benchmark itself does not hold the file in memory."""
+    rng = random.Random(42)
+    harvest = (timezone.now().date() + timedelta(days=30)).isoformat()
+    for i in range(n):
+        row = {
+            'crop_name': rng.choice(CROPS),
+            'quantity_available': str(rng.randint(1, 5000)),
+            'harvest_date': harvest,
+            'price_floor': f'{rng.uniform(10, 90):.2f}',
+            'location': rng.choice(VILLAGES),
+            'quality_grade': rng.choice(['A', 'B', 'C']),
+        }
+        if rng.random() < error_rate:
+            row['quantity_available'] = '-1'
+        yield row
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulk listing import throughput and memory (default 100k rows)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--error-rate', type=float, default=0.01)
+        parser.add_argument('--compare', type=int, default=500,
+                            help='Rows to push through the per-row ListingSerializer path for comparison')
+        parser.add_argument('--keep', action='store_true', help='Keep the imported listings')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        farmer, _ = User.objects.get_or_create(username='bench_import_farmer', defaults={'role': 'farmer'})
+        crop_registry.all()
+
+        rss_before = max_rss_mb()
+        t0 = time.perf_counter()
+        report = ListingImporter(farmer, batch_size=options['batch_size']).run(
+            synthetic_rows(options['rows'], options['error_rate'])
+        )
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(
+            f"bulk import: {report.created} created, {report.failed} failed in {elapsed:.2f}s "
+            f"({options['rows'] / elapsed:,.0f} rows/s), max RSS {rss_before:.0f} -> {max_rss_mb():.0f} MB"
+        )
+
+        if options['compare']:
+            request = RequestFactory().post('/')
+            request.user = farmer
+            t0 = time.perf_counter()
+            for row in synthetic_rows(options['compare'], 0):
+                serializer = ListingSerializer(data=row, context={'request': request})
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            per_row = time.perf_counter() - t0
+            self.stdout.write(
+                f"per-row serializer: {options['compare']} rows in {per_row:.2f}s "
+                f"({options['compare'] / per_row:,.0f} rows/s)"
+            )
+
+        if not options['keep']:
+            Listing.objects.filter(farmer=farmer).delete()
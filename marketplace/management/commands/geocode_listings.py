@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.geo import gazetteer
+from marketplace.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Fill listing coordinates from the local gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Re-geocode listings that already have coordinates')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        gazetteer.reload()
+        updated = Listing.objects.geocode(overwrite=options['overwrite'], batch_size=options['batch_size'])
+        missing = Listing.objects.filter(latitude__isnull=True).exclude(location='').count()
+        self.stdout.write(self.style.SUCCESS(f'Geocoded {updated} listings; {missing} locations not in the gazetteer'))
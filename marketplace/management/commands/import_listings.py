@@ -0,0 +1,48 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from marketplace.importer import ListingImporter, detect_format, iter_lines, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream-import listings for a farmer from an NDJSON or CSV file ("-" for stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--farmer', required=True, help='Username of the owning farmer')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--errors-file', help='Write every row error here as NDJSON')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            farmer = User.objects.get(username=options['farmer'], role='farmer')
+        except User.DoesNotExist:
+            raise CommandError(f"Farmer {options['farmer']} not found")
+
+        path = options['path']
+        fmt = options['format'] or detect_format(filename=path)
+        errors_file = open(options['errors_file'], 'w') if options['errors_file'] else None
+
+        def on_error(row_number, errors):
+            if errors_file:
+                errors_file.write(json.dumps({'row': row_number, 'errors': errors}) + '\n')
+
+        # errors are streamed to --errors-file, so keep only a short sample in memory
+        importer = ListingImporter(farmer, batch_size=options['batch_size'], max_errors=20, on_error=on_error)
+        source = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            report = importer.run(iter_rows(iter_lines(source), fmt))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if errors_file:
+                errors_file.close()
+
+        for error in report.errors:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(f'Imported {report.created} listings, {report.failed} rows failed'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = 'Recount the listing facet table from Listing'
+
+    def handle(self, *args, **options):
+        report = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['combinations']} combinations: {report['created']} created, "
+            f"{report['updated']} corrected, {report['deleted']} removed"
+        ))
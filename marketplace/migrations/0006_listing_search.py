@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_search_document(apps, schema_editor):
+    Listing = apps.get_model('marketplace', 'Listing')
+    batch = []
+    for listing in Listing.objects.select_related('crop').iterator(chunk_size=500):
+        parts = [listing.crop.name, listing.crop.variety, listing.location, listing.quality_grade]
+        listing.search_document = ' '.join(p.strip() for p in parts if p and p.strip())
+        batch.append(listing)
+        if len(batch) >= 500:
+            Listing.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        Listing.objects.bulk_update(batch, ['search_document'])
+
+
+def install_search_backend(apps, schema_editor):
+    from marketplace.search import install_search_backend
+
+    install_search_backend(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_seed_crops'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name='listing',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='listing_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='listing_search_trgm_gin', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+        migrations.RunPython(install_search_backend, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0006_listing_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['created_at', 'id'], name='listing_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:46
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_coordinates(apps, schema_editor):
+    from marketplace.geo import gazetteer, grid_cell
+
+    Listing = apps.get_model('marketplace', 'Listing')
+    batch = []
+    for listing in Listing.objects.exclude(location='').iterator(chunk_size=500):
+        point = gazetteer.geocode(listing.location)
+        if point is None:
+            continue
+        listing.latitude, listing.longitude = point
+        listing.geo_cell = grid_cell(*point)
+        batch.append(listing)
+        if len(batch) >= 500:
+            Listing.objects.bulk_update(batch, ['latitude', 'longitude', 'geo_cell'])
+            batch = []
+    if batch:
+        Listing.objects.bulk_update(batch, ['latitude', 'longitude', 'geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0007_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='geo_cell',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['geo_cell'], name='listing_geo_cell_idx'),
+        ),
+        migrations.RunPython(backfill_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_facets(apps, schema_editor):
+    Listing = apps.get_model('marketplace', 'Listing')
+    ListingFacet = apps.get_model('marketplace', 'ListingFacet')
+    rows = Listing.objects.order_by().values('crop_id', 'location', 'quality_grade').annotate(n=models.Count('id'))
+    ListingFacet.objects.bulk_create(
+        [ListingFacet(crop_id=r['crop_id'], location=r['location'], quality_grade=r['quality_grade'], count=r['n'])
+         for r in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0008_listing_geo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(blank=True, max_length=255)),
+                ('quality_grade', models.CharField(blank=True, max_length=32)),
+                ('count', models.IntegerField(default=0)),
+                ('crop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='marketplace.crop')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('crop', 'location', 'quality_grade'), name='listing_facet_unique')],
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
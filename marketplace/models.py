@@ -1,7 +1,14 @@
+from collections import Counter
+
 from django.db import models
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 
+from .geo import gazetteer, grid_cell
+
 
 class Crop(models.Model):
     name = models.CharField(max_length=128)
@@ -13,6 +20,61 @@ class Crop(models.Model):
         return f"{self.name} ({self.variety})"
 
 
+def build_search_document(crop, location: str = '', quality_grade: str = '') -> str:
+    """Denormalized text indexed for listing search (crop, variety, village, grade)."""
+    parts = [crop.name, crop.variety] if crop is not None else []
+    parts += [location, quality_grade]
+    return ' '.join(p.strip() for p in parts if p and p.strip())
+
+
+class ListingQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_search_document()
+            obj.refresh_geo()
+        created = super().bulk_create(objs, *args, **kwargs)
+        ListingFacet.objects.apply_deltas(Counter(obj.facet_key for obj in created))
+        return created
+
+    def refresh_search_documents(self, batch_size: int = 500) -> int:
+        """Recompute search_document after bulk ``update()`` calls or crop renames."""
+        updated = 0
+        batch = []
+        for listing in self.select_related('crop').iterator(chunk_size=batch_size):
+            if listing.refresh_search_document():
+                batch.append(listing)
+            if len(batch) >= batch_size:
+                updated += Listing.objects.bulk_update(batch, ['search_document'])
+                batch = []
+        if batch:
+            updated += Listing.objects.bulk_update(batch, ['search_document'])
+        return updated
+
+    def geocode(self, overwrite: bool = False, batch_size: int = 500) -> int:
+        """Fill coordinates from the gazetteer (e.g. after it gains new places).
+
+        ``overwrite`` re-geocodes listings that already have coordinates.
+        """
+        queryset = self if overwrite else self.filter(latitude__isnull=True)
+        updated = 0
+        batch = []
+        for listing in queryset.exclude(location='').iterator(chunk_size=batch_size):
+            if overwrite:
+                listing.latitude = listing.longitude = None
+            if listing.refresh_geo():
+                batch.append(listing)
+            if len(batch) >= batch_size:
+                updated += Listing.objects.bulk_update(batch, GEO_FIELDS)
+                batch = []
+        if batch:
+            updated += Listing.objects.bulk_update(batch, GEO_FIELDS)
+        return updated
+
+
+GEO_FIELDS = ['latitude', 'longitude', 'geo_cell']
+
+
 class Listing(models.Model):
     farmer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='listings')
     crop = models.ForeignKey(Crop, on_delete=models.CASCADE, related_name='listings')
@@ -22,9 +84,64 @@ class Listing(models.Model):
     location = models.CharField(max_length=255, blank=True)
     price_floor = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(default=timezone.now)
+    # Maintained by save()/bulk_create; indexed by FTS5 on SQLite and, on
+    # PostgreSQL, by a trigram index and a trigger-maintained search_vector.
+    search_document = models.TextField(blank=True, default='', editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Geocoded from ``location`` via the local gazetteer unless given explicitly;
+    # geo_cell is the fixed-grid cell used to prune proximity queries.
+    latitude = models.FloatField(null=True, blank=True,
+                                 validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True,
+                                  validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geo_cell = models.IntegerField(null=True, editable=False)
+
+    objects = ListingQuerySet.as_manager()
 
     class Meta:
-        indexes = [models.Index(fields=['crop', 'location', 'harvest_date'])]
+        indexes = [
+            models.Index(fields=['crop', 'location', 'harvest_date']),
+            models.Index(fields=['created_at', 'id'], name='listing_created_id_idx'),
+            GinIndex(fields=['search_vector'], name='listing_search_vector_gin'),
+            GinIndex(fields=['search_document'], name='listing_search_trgm_gin', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['geo_cell'], name='listing_geo_cell_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so post_save can move the listing between facet rows
+        instance._loaded_facet_key = instance.facet_key
+        return instance
+
+    @property
+    def facet_key(self):
+        return (self.crop_id, self.location, self.quality_grade)
+
+    def refresh_search_document(self) -> bool:
+        document = build_search_document(self.crop if self.crop_id else None, self.location, self.quality_grade)
+        changed = document != self.search_document
+        self.search_document = document
+        return changed
+
+    def refresh_geo(self) -> bool:
+        """Geocode ``location`` when no coordinates are set and recompute ``geo_cell``."""
+        before = (self.latitude, self.longitude, self.geo_cell)
+        if self.latitude is None or self.longitude is None:
+            point = gazetteer.geocode(self.location)
+            self.latitude, self.longitude = point if point else (None, None)
+        has_point = self.latitude is not None and self.longitude is not None
+        self.geo_cell = grid_cell(self.latitude, self.longitude) if has_point else None
+        return (self.latitude, self.longitude, self.geo_cell) != before
+
+    def save(self, *args, **kwargs):
+        self.refresh_search_document()
+        self.refresh_geo()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            derived = ['search_document'] + GEO_FIELDS
+            kwargs['update_fields'] = list(update_fields) + [f for f in derived if f not in update_fields]
+        super().save(*args, **kwargs)
 
     def clean(self) -> None:
         # simple validation: quantity positive, harvest date not in past
@@ -37,3 +154,47 @@ class Listing(models.Model):
 
     def __str__(self) -> str:
         return f"Listing {self.pk} - {self.crop.name} by {self.farmer.username}"
+
+
+class ListingFacetQuerySet(models.QuerySet):
+    def apply_deltas(self, deltas) -> None:
+        """Add ``{(crop_id, location, quality_grade): delta}`` to the stored counts."""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.bulk_create(
+            [ListingFacet(crop_id=c, location=l, quality_grade=q, count=0)
+             for (c, l, q), delta in deltas.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        for (crop_id, location, quality_grade), delta in deltas.items():
+            self.filter(crop_id=crop_id, location=location, quality_grade=quality_grade).update(
+                count=models.F('count') + delta
+            )
+
+
+class ListingFacet(models.Model):
+    """Listing count per (crop, location, quality_grade) combination.
+
+    Kept current by listing signals and ``ListingQuerySet.bulk_create`` and
+    reconciled by ``marketplace.facets.rebuild_facets``; the facets endpoint
+    sums these rows instead of grouping over Listing.
+    """
+    crop = models.ForeignKey(Crop, on_delete=models.CASCADE, related_name='+')
+    location = models.CharField(max_length=255, blank=True)
+    quality_grade = models.CharField(max_length=32, blank=True)
+    count = models.IntegerField(default=0)
+
+    objects = ListingFacetQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['crop', 'location', 'quality_grade'], name='listing_facet_unique'),
+        ]
+
+    @property
+    def facet_key(self):
+        return (self.crop_id, self.location, self.quality_grade)
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"{self.crop_id}/{self.location}/{self.quality_grade}: {self.count}"
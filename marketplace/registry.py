@@ -0,0 +1,98 @@
+"""Process-local crop catalog indexed by id and normalized name.
+
+Crop is tiny and read-mostly, so each worker keeps the whole table in memory
+and reloads it when the shared ``crop_registry`` generation changes (bumped on
+Crop save/delete). The generation is re-read at most every
+``CROP_REGISTRY_CHECK_INTERVAL`` seconds.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from core.cache import bump_generation, get_generation
+
+from .models import Crop
+
+NAMESPACE = 'crop_registry'
+
+
+def normalize_crop_name(name: str) -> str:
+    return ' '.join(str(name).split()).casefold()
+
+
+class CropRegistry:
+    def __init__(self):
+        self._by_id: Dict[int, Crop] = {}
+        self._by_name: Dict[str, Crop] = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _check_interval(self) -> float:
+        return getattr(settings, 'CROP_REGISTRY_CHECK_INTERVAL', 1.0)
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self._check_interval():
+            return
+        version = get_generation(NAMESPACE)
+        self._checked_at = now
+        if version != self._version:
+            self.reload(version)
+
+    def reload(self, version=None) -> None:
+        crops = list(Crop.objects.order_by('id'))
+        by_name: Dict[str, Crop] = {}
+        for crop in crops:
+            by_name.setdefault(normalize_crop_name(crop.name), crop)
+        with self._lock:
+            self._by_id = {crop.pk: crop for crop in crops}
+            self._by_name = by_name
+            self._version = version if version is not None else get_generation(NAMESPACE)
+
+    def all(self) -> List[Crop]:
+        self._ensure_fresh()
+        return list(self._by_id.values())
+
+    def get(self, crop_id) -> Optional[Crop]:
+        self._ensure_fresh()
+        try:
+            crop_id = int(crop_id)
+        except (TypeError, ValueError):
+            return None
+        crop = self._by_id.get(crop_id)
+        if crop is None:
+            # created by another worker since our last reload
+            crop = Crop.objects.filter(pk=crop_id).first()
+            if crop is not None:
+                self.reload()
+        return crop
+
+    def get_by_name(self, name: str) -> Optional[Crop]:
+        self._ensure_fresh()
+        return self._by_name.get(normalize_crop_name(name))
+
+    def get_or_create_by_name(self, name: str) -> Crop:
+        crop = self.get_by_name(name)
+        if crop is not None:
+            return crop
+        clean = ' '.join(str(name).split())
+        crop = Crop.objects.filter(name__iexact=clean).order_by('id').first()
+        if crop is None:
+            crop = Crop.objects.create(name=clean, variety='', unit='kg', typical_price_range='')
+        self.reload()
+        return crop
+
+    def invalidate_local(self) -> None:
+        with self._lock:
+            self._version = None
+
+    def invalidate(self) -> None:
+        """Force every worker (this one immediately) to reload on next access."""
+        bump_generation(NAMESPACE)
+        self.invalidate_local()
+
+
+crop_registry = CropRegistry()
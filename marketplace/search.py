@@ -0,0 +1,151 @@
+"""Ranked, typo-tolerant listing search over ``Listing.search_document``.
+
+PostgreSQL: a trigger keeps ``search_vector`` in sync with ``search_document``;
+queries rank with ``ts_rank`` and fall back to pg_trgm word similarity for
+misspelt crop or village names. SQLite: an FTS5 external-content table kept in
+sync by triggers, ranked by bm25, with misspelt terms corrected against the
+FTS5 vocabulary. Other backends use ``icontains`` on the single denormalized
+column.
+"""
+import difflib
+import re
+from typing import List, Optional
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+LISTING_TABLE = 'marketplace_listing'
+FTS_TABLE = 'marketplace_listing_fts'
+FTS_VOCAB_TABLE = 'marketplace_listing_fts_vocab'
+SEARCH_CONFIG = 'simple'
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"search_document, content='{LISTING_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {LISTING_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {LISTING_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {LISTING_TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document); "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document); END",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"DROP TRIGGER IF EXISTS listing_search_vector_update ON {LISTING_TABLE}",
+    f"CREATE TRIGGER listing_search_vector_update BEFORE INSERT OR UPDATE OF search_document ON {LISTING_TABLE} "
+    f"FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.{SEARCH_CONFIG}', search_document)",
+    f"UPDATE {LISTING_TABLE} SET search_vector = to_tsvector('{SEARCH_CONFIG}', search_document)",
+]
+
+_sqlite_fts_ready = {}
+
+
+def install_search_backend(conn=connection) -> None:
+    """Create the vendor-specific search structures (used by migrations)."""
+    if conn.vendor == 'postgresql':
+        with conn.cursor() as cursor:
+            for statement in POSTGRES_DDL:
+                cursor.execute(statement)
+    elif conn.vendor == 'sqlite':
+        ensure_sqlite_fts(conn, rebuild=True)
+
+
+def ensure_sqlite_fts(conn=connection, rebuild: bool = False) -> bool:
+    """Create the FTS5 table and triggers if missing; False when FTS5 is unavailable.
+
+    SQLite table rebuilds during later ALTERs drop triggers, so a missing
+    trigger also forces a full rebuild of the index.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_a_'],
+            )
+            if cursor.fetchone()[0] < 3:
+                rebuild = True
+            for statement in SQLITE_FTS_DDL:
+                cursor.execute(statement)
+            if rebuild:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except Exception:
+        return False
+    return True
+
+
+def _sqlite_fts_available() -> bool:
+    key = connection.settings_dict.get('NAME')
+    if key not in _sqlite_fts_ready:
+        _sqlite_fts_ready[key] = ensure_sqlite_fts()
+    return _sqlite_fts_ready[key]
+
+
+def search_terms(query: str) -> List[str]:
+    return [t.lower() for t in _TERM.findall(query or '')]
+
+
+def _correct_term(cursor, term: str) -> List[str]:
+    """Known vocabulary terms close to ``term`` (same first letter, difflib ratio)."""
+    cursor.execute(f"SELECT 1 FROM {FTS_VOCAB_TABLE} WHERE term = %s", [term])
+    if cursor.fetchone():
+        return [term]
+    first = term[0]
+    cursor.execute(
+        f"SELECT term FROM {FTS_VOCAB_TABLE} WHERE term >= %s AND term < %s",
+        [first, chr(ord(first) + 1)],
+    )
+    vocab = [row[0] for row in cursor.fetchall()]
+    return difflib.get_close_matches(term, vocab, n=3, cutoff=0.75)
+
+
+def sqlite_match_expression(terms: List[str]) -> Optional[str]:
+    """FTS5 MATCH string: every term as a prefix, OR-ed with close spellings."""
+    groups = []
+    with connection.cursor() as cursor:
+        for term in terms:
+            options = [f'"{term}"*'] + [f'"{alt}"' for alt in _correct_term(cursor, term) if alt != term]
+            groups.append('(' + ' OR '.join(options) + ')')
+    return ' AND '.join(groups) if groups else None
+
+
+def search_listings(queryset, query: str):
+    """Filter ``queryset`` to listings matching ``query``, best matches first."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    if connection.vendor == 'postgresql':
+        text = ' '.join(terms)
+        ts_query = SearchQuery(text, config=SEARCH_CONFIG, search_type='plain')
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), ts_query),
+            search_similarity=TrigramWordSimilarity(text, 'search_document'),
+        ).filter(
+            Q(search_vector=ts_query) | Q(search_document__trigram_word_similar=text)
+        ).order_by('-search_rank', '-search_similarity', '-created_at')
+    if connection.vendor == 'sqlite' and _sqlite_fts_available():
+        match = sqlite_match_expression(terms)
+        # bm25() is lower-is-better; negate so higher search_rank means a better match
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {LISTING_TABLE}.id",
+            [match], output_field=FloatField(),
+        )
+        ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('-search_rank', '-created_at')
+    for term in terms:
+        queryset = queryset.filter(search_document__icontains=term)
+    return queryset
+
+
+class ListingSearchFilter(filters.SearchFilter):
+    """Drop-in replacement for SearchFilter on listings; keeps the ``?search=`` parameter."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return search_listings(queryset, query)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Crop, Listing
+from .registry import crop_registry
 
 
 class CropSerializer(serializers.ModelSerializer):
@@ -8,17 +9,43 @@ class CropSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'variety', 'unit', 'typical_price_range')
 
 
+class RegistryCropField(serializers.PrimaryKeyRelatedField):
+    """crop_id resolved through the in-process crop registry instead of a query."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Crop.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        crop = crop_registry.get(data)
+        if crop is None:
+            self.fail('does_not_exist', pk_value=data)
+        return crop
+
+
+class RegistryCropSerializer(CropSerializer):
+    """Nested crop rendered from the registry by crop_id, so listings need no crop join."""
+
+    def get_attribute(self, instance):
+        return crop_registry.get(instance.crop_id) or instance.crop
+
+
 class ListingSerializer(serializers.ModelSerializer):
-    crop = CropSerializer(read_only=True)
-    crop_id = serializers.PrimaryKeyRelatedField(queryset=Crop.objects.all(), source='crop', write_only=True, required=False)
+    crop = RegistryCropSerializer(read_only=True)
+    crop_id = RegistryCropField(source='crop', write_only=True, required=False)
     # Allow submitting crop_name when crop_id is not available (fallback)
     crop_name = serializers.CharField(write_only=True, required=False, allow_blank=False)
+    # only present on ?near= results
+    distance_km = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Listing
         fields = (
             'id', 'farmer', 'crop', 'crop_id', 'crop_name',
-            'quantity_available', 'harvest_date', 'quality_grade', 'location', 'price_floor', 'created_at'
+            'quantity_available', 'harvest_date', 'quality_grade', 'location', 'latitude', 'longitude',
+            'distance_km', 'price_floor', 'created_at'
         )
         read_only_fields = ('id', 'farmer', 'created_at', 'crop')
 
@@ -27,21 +54,24 @@ class ListingSerializer(serializers.ModelSerializer):
         # Read crop_name from initial_data to be robust with multipart/form-data
         crop_name = self.initial_data.get('crop_name') or validated_data.pop('crop_name', None)
         if crop_name and not validated_data.get('crop'):
-            crop_obj, _ = Crop.objects.get_or_create(name=str(crop_name).strip(), defaults={
-                'variety': '',
-                'unit': 'kg',
-                'typical_price_range': ''
-            })
-            validated_data['crop'] = crop_obj
+            validated_data['crop'] = crop_registry.get_or_create_by_name(crop_name)
 
         validated_data['farmer'] = request.user
         return super().create(validated_data)
 
+    def update(self, instance, validated_data):
+        # a new location without explicit coordinates is geocoded again on save
+        if 'location' in validated_data and 'latitude' not in validated_data:
+            validated_data['latitude'] = validated_data['longitude'] = None
+        return super().update(instance, validated_data)
+
     def validate(self, data):
         # Ensure either crop or crop_name is provided
         crop_name = self.initial_data.get('crop_name')
         if not data.get('crop') and not crop_name:
             raise serializers.ValidationError({'crop': 'Provide either crop_id or crop_name.'})
+        if ('latitude' in data) != ('longitude' in data):
+            raise serializers.ValidationError({'latitude': 'Provide latitude and longitude together.'})
 
         # Build a temporary instance for model.clean without unknown fields
         temp = {k: v for k, v in data.items() if k != 'crop_name'}
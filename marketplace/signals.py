@@ -0,0 +1,54 @@
+"""Signal handlers keeping denormalized listing data in sync."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from django.db import transaction
+
+from .cache import invalidate_listing_feed
+from .models import Crop, Listing, ListingFacet
+from .registry import crop_registry
+
+
+@receiver(post_save, sender=Crop)
+def refresh_listing_search_on_crop_change(sender, instance, created, **kwargs):
+    # crop name/variety are part of Listing.search_document
+    if not created:
+        Listing.objects.filter(crop=instance).refresh_search_documents()
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Crop)
+@receiver(post_delete, sender=Crop)
+def invalidate_feed_on_change(sender, **kwargs):
+    invalidate_listing_feed()
+
+
+@receiver(post_save, sender=Crop)
+@receiver(post_delete, sender=Crop)
+def invalidate_crop_registry(sender, **kwargs):
+    # this worker reloads at once; others see the bumped generation after commit
+    crop_registry.invalidate_local()
+    transaction.on_commit(crop_registry.invalidate)
+
+
+@receiver(post_save, sender=Listing)
+def update_facets_on_save(sender, instance, created, **kwargs):
+    new_key = instance.facet_key
+    old_key = None if created else getattr(instance, '_loaded_facet_key', None)
+    if old_key == new_key:
+        return
+    deltas = {new_key: 1}
+    if old_key is not None:
+        deltas[old_key] = -1
+    elif not created:
+        # instance not loaded from the database; the periodic rebuild reconciles it
+        return
+    ListingFacet.objects.apply_deltas(deltas)
+    instance._loaded_facet_key = new_key
+
+
+@receiver(post_delete, sender=Listing)
+def update_facets_on_delete(sender, instance, **kwargs):
+    key = getattr(instance, '_loaded_facet_key', instance.facet_key)
+    ListingFacet.objects.apply_deltas({key: -1})
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .facets import rebuild_facets
+
+
+@shared_task
+def rebuild_listing_facets_task():
+    """Periodic reconciliation of the ListingFacet table (see CELERY_BEAT_SCHEDULE)."""
+    return rebuild_facets()
@@ -0,0 +1,36 @@
+import pytest
+from rest_framework.test import APIClient
+from core.cache import bump_generation
+from core.querybudget import assert_max_queries
+from marketplace.models import Crop
+from marketplace.registry import CropRegistry, NAMESPACE
+
+
+@pytest.mark.django_db
+def test_registry_serves_lookups_from_memory_and_reloads_on_version_change(settings):
+    settings.CROP_REGISTRY_CHECK_INTERVAL = 0
+    bajra = Crop.objects.create(name='Pearl  Millet', variety='Bajra')
+    registry = CropRegistry()
+    registry.all()
+
+    with assert_max_queries(0):
+        assert registry.get(bajra.pk) == bajra
+        assert registry.get(str(bajra.pk)) == bajra
+        assert registry.get_by_name(' pearl millet ') == bajra
+        assert registry.get_or_create_by_name('PEARL MILLET') == bajra
+
+    # another worker changed the catalog and bumped the shared version
+    Crop.objects.filter(pk=bajra.pk).update(variety='Hybrid')
+    bump_generation(NAMESPACE)
+    assert registry.get(bajra.pk).variety == 'Hybrid'
+
+    created = registry.get_or_create_by_name('Foxtail millet')
+    assert registry.get_by_name('foxtail MILLET') == created
+
+
+@pytest.mark.django_db
+def test_crop_list_ignores_a_cursor():
+    Crop.objects.bulk_create([Crop(name=f'Crop {i}') for i in range(3)])
+    r = APIClient().get('/api/v1/marketplace/crops/', {'cursor': 'x', 'limit': 2})
+    assert r.status_code == 200
+    assert len(r.data['results']) == 2 and r.data['next']
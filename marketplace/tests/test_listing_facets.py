@@ -0,0 +1,79 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from core.querybudget import assert_max_queries
+from marketplace.facets import rebuild_facets
+from marketplace.importer import ListingImporter
+from marketplace.models import Crop, Listing, ListingFacet
+from marketplace.registry import crop_registry
+
+URL = '/api/v1/marketplace/listings/facets/'
+
+
+def counts(data, facet):
+    return {entry['value']: entry['count'] for entry in data['facets'][facet]}
+
+
+@pytest.fixture
+def catalog(db):
+    farmer = get_user_model().objects.create_user('facet_farmer', role='farmer')
+    wheat, rice = Crop.objects.create(name='Wheat'), Crop.objects.create(name='Rice')
+    harvest = timezone.now().date() + timedelta(days=5)
+
+    def make(crop, location, grade):
+        return Listing.objects.create(farmer=farmer, crop=crop, quantity_available=1, harvest_date=harvest,
+                                      price_floor=10, location=location, quality_grade=grade)
+
+    listings = [make(wheat, 'Pune', 'A'), make(wheat, 'Pune', 'B'), make(wheat, 'Nashik', 'A'), make(rice, 'Pune', 'A')]
+    return farmer, wheat, rice, listings
+
+
+@pytest.mark.django_db
+def test_facets_follow_saves_deletes_and_imports(catalog):
+    farmer, wheat, rice, listings = catalog
+    client = APIClient()
+    data = client.get(URL).data
+    assert data['source'] == 'table' and data['total'] == 4
+    assert counts(data, 'crop') == {wheat.id: 3, rice.id: 1}
+    assert data['facets']['crop'][0]['label'] == 'Wheat'
+
+    moved = Listing.objects.get(pk=listings[2].pk)
+    moved.location = 'Pune'
+    moved.save()
+    listings[3].delete()
+    future = (timezone.now().date() + timedelta(days=5)).isoformat()
+    ListingImporter(farmer).run([
+        {'crop_name': 'Rice', 'quantity_available': '3', 'harvest_date': future, 'price_floor': '9',
+         'location': 'Akola', 'quality_grade': 'C'},
+    ])
+
+    data = client.get(URL).data
+    assert counts(data, 'location') == {'Pune': 3, 'Akola': 1}
+    assert counts(data, 'quality_grade') == {'A': 2, 'B': 1, 'C': 1}
+    assert rebuild_facets()['updated'] == 0
+
+
+@pytest.mark.django_db
+def test_facets_honour_list_filters(catalog):
+    _, wheat, _, _ = catalog
+    client = APIClient()
+    crop_registry.all()  # warm, as in a long-running worker
+    with assert_max_queries(3):
+        data = client.get(URL, {'crop': wheat.id, 'quality_grade': 'A'}).data
+    assert data['source'] == 'table'
+    assert counts(data, 'location') == {'Pune': 1, 'Nashik': 1}
+
+    data = client.get(URL, {'search': 'nashik'}).data
+    assert data['source'] == 'live' and counts(data, 'location') == {'Nashik': 1}
+    assert client.get(URL, {'crop': 'x'}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_rebuild_reconciles_drift(catalog):
+    ListingFacet.objects.update(count=0)
+    Listing.objects.filter(location='Nashik').update(location='Indore')
+    report = rebuild_facets()
+    assert report == {'combinations': 4, 'created': 1, 'updated': 3, 'deleted': 1}
+    assert sum(ListingFacet.objects.values_list('count', flat=True)) == 4
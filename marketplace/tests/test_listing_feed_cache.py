@@ -0,0 +1,39 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APIClient
+from core.querybudget import assert_max_queries
+from marketplace.models import Crop, Listing
+
+
+@pytest.fixture
+def farmer(db):
+    cache.clear()
+    farmer = get_user_model().objects.create_user('feed_farmer', role='farmer')
+    Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Jowar'), quantity_available=5,
+                           harvest_date=timezone.now().date(), price_floor=15)
+    return farmer
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('url', ['/api/v1/marketplace/listings/recent/', '/api/v1/marketplace/listings/'])
+def test_feed_is_cached_with_etag_and_invalidated_on_write(farmer, url):
+    client = APIClient()
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first['ETag']
+
+    # served from cache: only the audit middleware's insert touches the database
+    with assert_max_queries(1):
+        again = client.get(url)
+    assert again.data == first.data
+
+    not_modified = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert not_modified.status_code == 304
+
+    Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Ragi'), quantity_available=5,
+                           harvest_date=timezone.now().date(), price_floor=15)
+    fresh = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert fresh.status_code == 200
+    assert fresh['ETag'] != etag
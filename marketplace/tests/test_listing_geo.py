@@ -0,0 +1,73 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from marketplace.geo import bounding_box, cell_ranges, gazetteer, grid_cell, haversine_km
+from marketplace.models import Crop, Listing
+
+PUNE = (18.5204, 73.8567)
+
+
+@pytest.fixture
+def listings(db):
+    farmer = get_user_model().objects.create_user('geo_farmer', role='farmer')
+    crop = Crop.objects.create(name='Wheat')
+    harvest = timezone.now().date() + timedelta(days=5)
+
+    def make(location, **extra):
+        return Listing.objects.create(farmer=farmer, crop=crop, quantity_available=10, harvest_date=harvest,
+                                      price_floor=20, location=location, **extra)
+
+    return {
+        'pune': make('Pune'),
+        'nashik': make('Sinnar, Nashik'),
+        'akola': make('Akola'),
+        'khed': make('Khed', latitude=18.84, longitude=73.88),
+        'unknown': make('Somewhere Else'),
+    }
+
+
+def test_gazetteer_geocodes_parts_and_aliases():
+    assert gazetteer.geocode('Poona') == PUNE
+    assert gazetteer.geocode('Hubballi, Karnataka') == gazetteer.geocode('Hubli')
+    assert gazetteer.geocode('') is None
+
+
+def test_cell_ranges_cover_bounding_box():
+    min_lat, max_lat, spans = bounding_box(*PUNE, 50)
+    ranges = cell_ranges(min_lat, max_lat, spans)
+    for lat in (min_lat, PUNE[0], max_lat):
+        for lon in (spans[0][0], PUNE[1], spans[0][1]):
+            assert any(lo <= grid_cell(lat, lon) <= hi for lo, hi in ranges)
+    # a continent-sized box falls back to the plain lat/lon box
+    assert cell_ranges(*bounding_box(0, 0, 1000)) is None
+
+
+@pytest.mark.django_db
+def test_listings_geocoded_on_save(listings):
+    assert (listings['nashik'].latitude, listings['nashik'].longitude) == gazetteer.geocode('Nashik')
+    assert listings['khed'].geo_cell == grid_cell(18.84, 73.88)
+    assert listings['unknown'].latitude is None and listings['unknown'].geo_cell is None
+
+
+@pytest.mark.django_db
+def test_near_filter_orders_by_distance(listings):
+    client = APIClient()
+    r = client.get('/api/v1/marketplace/listings/', {'near': '18.52,73.86', 'radius_km': 200})
+    assert r.status_code == 200
+    ids = [row['id'] for row in r.data['results']]
+    assert ids == [listings['pune'].id, listings['khed'].id, listings['nashik'].id]
+    expected = haversine_km(PUNE, (18.52, 73.86))
+    assert r.data['results'][0]['distance_km'] == pytest.approx(expected, abs=1e-6)
+
+    r = client.get('/api/v1/marketplace/listings/', {'near': '18.52,73.86'})
+    assert [row['id'] for row in r.data['results']] == [listings['pune'].id, listings['khed'].id]
+    assert 'distance_km' not in client.get(f"/api/v1/marketplace/listings/{listings['pune'].id}/").data
+
+
+@pytest.mark.django_db
+def test_near_filter_rejects_bad_input(listings):
+    client = APIClient()
+    assert client.get('/api/v1/marketplace/listings/', {'near': 'pune'}).status_code == 400
+    assert client.get('/api/v1/marketplace/listings/', {'near': '18.5,73.8', 'radius_km': 0}).status_code == 400
@@ -0,0 +1,70 @@
+import json
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from rest_framework.test import APIClient
+from marketplace.models import Crop, Listing
+
+URL = '/api/v1/marketplace/listings/import/'
+
+
+@pytest.fixture
+def farmer_client(db):
+    farmer = get_user_model().objects.create_user('import_farmer', role='farmer')
+    client = APIClient()
+    client.force_authenticate(farmer)
+    return farmer, client
+
+
+@pytest.mark.django_db
+def test_ndjson_import_reports_bad_rows_without_aborting(farmer_client):
+    farmer, client = farmer_client
+    crop = Crop.objects.create(name='Sorghum')
+    future = (timezone.now().date() + timedelta(days=10)).isoformat()
+    past = (timezone.now().date() - timedelta(days=10)).isoformat()
+    rows = [
+        {'crop_id': crop.id, 'quantity_available': '10', 'harvest_date': future, 'price_floor': '20', 'location': 'Akola'},
+        {'crop_name': 'sorghum', 'quantity_available': '5', 'harvest_date': future, 'price_floor': '22'},
+        {'crop_name': 'Sorghum', 'quantity_available': '0', 'harvest_date': past, 'price_floor': '22'},
+        {'crop_id': 999999, 'quantity_available': '5', 'harvest_date': future, 'price_floor': '22'},
+        {'crop_name': 'Quinoa', 'quantity_available': '-1', 'harvest_date': future, 'price_floor': '22'},
+    ]
+    body = '\n'.join(json.dumps(r) for r in rows) + '\nnot json\n'
+    r = client.post(URL, data=body, content_type='application/x-ndjson')
+    assert r.status_code == 200
+    assert r.data['created'] == 2
+    assert r.data['failed'] == 4
+    errors = {e['row']: e['errors'] for e in r.data['errors']}
+    assert set(errors) == {3, 4, 5, 6}
+    assert set(errors[3]) == {'quantity_available', 'harvest_date'}
+    assert 'crop_id' in errors[4]
+    # crop_name resolved case-insensitively to the existing crop
+    assert Listing.objects.filter(farmer=farmer, crop=crop).count() == 2
+    # a rejected row does not create its crop
+    assert not Crop.objects.filter(name__iexact='quinoa').exists()
+
+
+@pytest.mark.django_db
+def test_csv_upload_import(farmer_client):
+    farmer, client = farmer_client
+    future = (timezone.now().date() + timedelta(days=3)).isoformat()
+    csv_body = (
+        'crop_name,quantity_available,harvest_date,price_floor,location\n'
+        f'Turmeric,40,{future},90,Erode\n'
+        f'Turmeric,abc,{future},90,Erode\n'
+    )
+    upload = SimpleUploadedFile('listings.csv', csv_body.encode(), content_type='text/csv')
+    r = client.post(URL, {'file': upload}, format='multipart')
+    assert r.data['created'] == 1
+    assert r.data['errors'][0]['row'] == 2
+    assert Listing.objects.get(farmer=farmer).search_document == 'Turmeric Erode'
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('batch_size', ['ten', '0', '100000'])
+def test_bad_batch_size_is_rejected(farmer_client, batch_size):
+    farmer, client = farmer_client
+    r = client.post(f'{URL}?batch_size={batch_size}', data='', content_type='application/x-ndjson')
+    assert r.status_code == 400 and 'batch_size' in r.data
@@ -0,0 +1,47 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from marketplace.models import Crop, Listing
+from marketplace.search import ensure_sqlite_fts
+
+
+@pytest.fixture
+def listings(db):
+    ensure_sqlite_fts()
+    farmer = get_user_model().objects.create_user('search_farmer', role='farmer')
+    wheat = Crop.objects.create(name='Wheat', variety='Durum')
+    rice = Crop.objects.create(name='Rice', variety='Basmati')
+    today = timezone.now().date()
+    Listing.objects.bulk_create([
+        Listing(farmer=farmer, crop=wheat, quantity_available=10, harvest_date=today, price_floor=20, location='Nashik'),
+        Listing(farmer=farmer, crop=rice, quantity_available=10, harvest_date=today, price_floor=30, location='Nashik'),
+        Listing(farmer=farmer, crop=wheat, quantity_available=10, harvest_date=today, price_floor=25, location='Pune'),
+    ])
+    return wheat, rice
+
+
+def _search(q):
+    r = APIClient().get('/api/v1/marketplace/listings/', {'search': q})
+    assert r.status_code == 200
+    return [(row['crop']['name'], row['location']) for row in r.data['results']]
+
+
+@pytest.mark.django_db
+def test_search_matches_crop_and_village_with_typos(listings):
+    assert sorted(_search('wheat')) == [('Wheat', 'Nashik'), ('Wheat', 'Pune')]
+    assert _search('wheat nashik') == [('Wheat', 'Nashik')]
+    # typo tolerance for crop and village names
+    assert sorted(_search('wheet')) == [('Wheat', 'Nashik'), ('Wheat', 'Pune')]
+    assert sorted(_search('nasik')) == [('Rice', 'Nashik'), ('Wheat', 'Nashik')]
+    # prefix
+    assert _search('basm') == [('Rice', 'Nashik')]
+
+
+@pytest.mark.django_db
+def test_search_document_follows_crop_rename(listings):
+    wheat, _ = listings
+    wheat.name = 'Emmer'
+    wheat.save()
+    assert sorted(_search('emmer')) == [('Emmer', 'Nashik'), ('Emmer', 'Pune')]
+    assert _search('wheat') == []
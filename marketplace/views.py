@@ -1,31 +1,103 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.http import Http404
 from .models import Crop, Listing
 from .serializers import CropSerializer, ListingSerializer
+from .registry import crop_registry
+from .importer import ListingImporter, batch_size_param, detect_format, iter_lines, iter_rows
+from .search import ListingSearchFilter
+from .geo import NearFilter
+from .facets import facet_counts
+from .cache import feed_key, feed_timeout
+from core.cache import etag_response, get_or_compute
 from django_filters.rest_framework import DjangoFilterBackend
 
 
 class CropViewSet(viewsets.ReadOnlyModelViewSet):
+    """Served from the in-process crop registry; no per-request queries once warm."""
     queryset = Crop.objects.all()
     serializer_class = CropSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = {'list': 2, 'retrieve': 1}
+
+    def list(self, request, *args, **kwargs):
+        crops = crop_registry.all()
+        page = self.paginate_queryset(crops)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(crops, many=True).data)
+
+    def get_object(self):
+        crop = crop_registry.get(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if crop is None:
+            raise Http404
+        return crop
 
 
 class ListingViewSet(viewsets.ModelViewSet):
-    queryset = Listing.objects.select_related('crop', 'farmer').all().order_by('-created_at')
+    # crop is rendered from the crop registry, so only farmer needs a join
+    queryset = Listing.objects.select_related('farmer').all().order_by('-created_at')
     serializer_class = ListingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # ?search= is ranked full-text/trigram search over Listing.search_document;
+    # ?near=lat,lon&radius_km= keeps listings within the radius, nearest first
+    filter_backends = [DjangoFilterBackend, ListingSearchFilter, NearFilter, filters.OrderingFilter]
     filterset_fields = ['crop', 'location', 'quality_grade']
-    search_fields = ['crop__name', 'location']
     ordering_fields = ['price_floor', 'harvest_date']
+    query_budget = {'list': 4, 'retrieve': 2, 'recent': 3, 'facets': 2, 'create': 4, 'bulk_import': None, 'default': 4}
 
     def perform_create(self, serializer):
         serializer.save(farmer=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        # the anonymous, unfiltered first page is the landing page: serve it from cache
+        if request.user.is_authenticated or request.query_params:
+            return super().list(request, *args, **kwargs)
+        payload, etag = get_or_compute(
+            feed_key(f'list:{request.get_host()}'),
+            lambda: super(ListingViewSet, self).list(request, *args, **kwargs).data,
+            timeout=feed_timeout(),
+        )
+        return etag_response(request, payload, etag)
+
     @action(detail=False, methods=['get'])
     def recent(self, request):
-        qs = self.get_queryset()[:10]
-        serializer = self.get_serializer(qs, many=True)
-        return Response(serializer.data)
+        def compute():
+            qs = self.get_queryset()[:10]
+            return self.get_serializer(qs, many=True).data
+
+        payload, etag = get_or_compute(feed_key('recent'), compute, timeout=feed_timeout())
+        return etag_response(request, payload, etag)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Counts per crop, location and quality_grade under the same filters as the list."""
+        return Response(facet_counts(self, request))
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """POST NDJSON or CSV (raw body, or multipart ``file``) to create many listings.
+
+        ``?input_format=ndjson|csv`` overrides detection from the content type
+        or file name (``?format=`` is reserved for DRF renderer selection).
+
+        The body is streamed and validated row by row; invalid rows are reported
+        by 1-based row number and skipped.
+        """
+        if getattr(request.user, 'role', None) != 'farmer':
+            return Response({'detail': 'Only farmers can import listings'}, status=status.HTTP_403_FORBIDDEN)
+        content_type = request.content_type or ''
+        if content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'detail': 'No file provided.'}, status=status.HTTP_400_BAD_REQUEST)
+            fmt = request.query_params.get('input_format') or detect_format(upload.content_type, upload.name)
+            source = upload
+        else:
+            fmt = request.query_params.get('input_format') or detect_format(content_type)
+            # read the underlying HttpRequest as a stream instead of request.data
+            source = request._request
+        importer = ListingImporter(request.user, batch_size=batch_size_param(request))
+        report = importer.run(iter_rows(iter_lines(source), fmt))
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
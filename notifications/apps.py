@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
+
+    def ready(self):
+        from core.metrics import register_collector
+        from .outbox import prometheus_lines
+
+        register_collector(prometheus_lines)
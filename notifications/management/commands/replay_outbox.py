@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from notifications.models import OutboxMessage
+from notifications.outbox import outbox_settings, replay
+
+
+class Command(BaseCommand):
+    help = 'Mark outbox messages pending again so the relay re-sends them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='Specific message ids')
+        parser.add_argument('--dead', action='store_true', help='Messages that exhausted their attempts')
+        parser.add_argument('--topic', help='Only this topic, e.g. email.contract_signed')
+        parser.add_argument('--since', help='Created at or after this ISO datetime')
+        parser.add_argument('--until', help='Created before this ISO datetime')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        queryset = OutboxMessage.objects.all()
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+        if options['dead']:
+            queryset = queryset.filter(dispatched_at__isnull=True, attempts__gte=outbox_settings()['MAX_ATTEMPTS'])
+        if options['topic']:
+            queryset = queryset.filter(topic=options['topic'])
+        for name, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+            if options[name]:
+                value = parse_datetime(options[name])
+                if value is None:
+                    raise CommandError(f'--{name} must be an ISO datetime')
+                queryset = queryset.filter(**{lookup: value})
+        if not (options['ids'] or options['dead'] or options['topic'] or options['since'] or options['until']):
+            raise CommandError('Refusing to replay the whole outbox; pass ids or a filter')
+        if options['dry_run']:
+            self.stdout.write(f'{queryset.count()} messages would be replayed')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Replaying {replay(queryset)} messages'))
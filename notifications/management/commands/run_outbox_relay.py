@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import relay_batch
+
+
+class Command(BaseCommand):
+    help = 'Relay outbox messages to Celery; safe to run several relays in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once drained')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the outbox is empty')
+
+    def handle(self, *args, **options):
+        sent = failed = 0
+        while True:
+            result = relay_batch(options['batch_size'])
+            sent += result['sent']
+            failed += result['failed']
+            if not result['claimed']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Relayed {sent} messages, {failed} failed'))
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class SMSLog(models.Model):
@@ -8,3 +9,31 @@ class SMSLog(models.Model):
 
     def __str__(self) -> str:
         return f"SMS to {self.to} at {self.sent_at}"
+
+
+class OutboxMessage(models.Model):
+    """A task to hand to Celery, written in the same transaction as the change it announces.
+
+    ``notifications.outbox.relay_batch`` claims pending rows with
+    ``FOR UPDATE SKIP LOCKED`` and sends them, so a broker outage delays
+    notifications instead of failing requests or dropping events.
+    """
+    topic = models.CharField(max_length=64)
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=timezone.now)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_pending_idx',
+                         condition=models.Q(dispatched_at__isnull=True)),
+            models.Index(fields=['topic', 'created_at'], name='outbox_topic_idx'),
+        ]
+
+    def __str__(self) -> str:
+        state = 'dispatched' if self.dispatched_at else 'pending'
+        return f"Outbox({self.pk}) {self.topic} [{state}]"
@@ -0,0 +1,167 @@
+"""Transactional outbox: enqueue Celery tasks atomically with the business change.
+
+``enqueue`` writes an ``OutboxMessage`` using the caller's transaction, so
+the message exists if and only if the change commits. Relays (the
+``relay_outbox_task`` beat job or ``manage.py run_outbox_relay``) drain
+pending rows in id order. Each batch is claimed with
+``SELECT ... FOR UPDATE SKIP LOCKED``, so several relays can run side by
+side without sending a message twice. A failed send is retried with
+exponential backoff until ``OUTBOX['MAX_ATTEMPTS']``; after that the message
+is dead until replayed (``manage.py replay_outbox``).
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+
+
+def outbox_settings() -> Dict:
+    defaults = {'BATCH_SIZE': 100, 'MAX_ATTEMPTS': 10}
+    return {**defaults, **getattr(settings, 'OUTBOX', {})}
+
+
+def enqueue(task, *args, topic: str = '') -> OutboxMessage:
+    """Record ``task.delay(*args)`` to be sent once the current transaction commits.
+
+    ``task`` is a Celery task (or its dotted name); arguments must be JSON
+    serializable.
+    """
+    task_name = task if isinstance(task, str) else task.name
+    return OutboxMessage.objects.create(topic=topic or task_name.rsplit('.', 1)[-1], task_name=task_name,
+                                        args=list(args))
+
+
+def enqueue_many(task, args_list, topic: str = '') -> List[OutboxMessage]:
+    """``enqueue`` for many argument tuples with a single bulk insert."""
+    task_name = task if isinstance(task, str) else task.name
+    topic = topic or task_name.rsplit('.', 1)[-1]
+    return OutboxMessage.objects.bulk_create(
+        [OutboxMessage(topic=topic, task_name=task_name, args=list(args)) for args in args_list], batch_size=1000
+    )
+
+
+def enqueue_email(event_type: str, payload: dict) -> OutboxMessage:
+    """Outbox equivalent of ``send_email_task.delay(event_type, payload)``."""
+    return enqueue('payments.tasks.send_email_task', event_type, payload, topic=f'email.{event_type}')
+
+
+def _send(message: OutboxMessage) -> None:
+    # apply_async honours CELERY_TASK_ALWAYS_EAGER, unlike app.send_task
+    import_string(message.task_name).apply_async(args=message.args)
+
+
+def backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0)))
+
+
+def pending_messages():
+    config = outbox_settings()
+    return OutboxMessage.objects.filter(
+        dispatched_at__isnull=True, available_at__lte=timezone.now(), attempts__lt=config['MAX_ATTEMPTS'],
+    ).order_by('available_at', 'id')
+
+
+def relay_batch(batch_size: int = None) -> Dict[str, int]:
+    """Claim and send one batch of pending messages; returns sent/failed counts."""
+    batch_size = batch_size or outbox_settings()['BATCH_SIZE']
+    sent = failed = 0
+    with transaction.atomic():
+        # no-op on SQLite, which has no row locks (and one writer at a time)
+        claimed: List[OutboxMessage] = list(
+            pending_messages().select_for_update(skip_locked=True)[:batch_size]
+        )
+        now = timezone.now()
+        for message in claimed:
+            message.attempts += 1
+            try:
+                _send(message)
+            except Exception as exc:
+                logger.warning('Outbox message %s (%s) failed: %s', message.pk, message.topic, exc)
+                message.last_error = f'{type(exc).__name__}: {exc}'[:2000]
+                message.available_at = now + backoff(message.attempts)
+                failed += 1
+            else:
+                message.dispatched_at = timezone.now()
+                message.last_error = ''
+                sent += 1
+        if claimed:
+            OutboxMessage.objects.bulk_update(
+                claimed, ['attempts', 'dispatched_at', 'available_at', 'last_error'], batch_size=500
+            )
+    return {'claimed': len(claimed), 'sent': sent, 'failed': failed}
+
+
+def relay_pending(batch_size: int = None, max_batches: int = 100) -> Dict[str, int]:
+    """Relay batches until the outbox is drained (or ``max_batches`` is reached)."""
+    totals = {'claimed': 0, 'sent': 0, 'failed': 0}
+    for _ in range(max_batches):
+        result = relay_batch(batch_size)
+        for key in totals:
+            totals[key] += result[key]
+        if not result['claimed']:
+            break
+    return totals
+
+
+def replay(queryset) -> int:
+    """Make the selected messages pending again (dead, failed or already dispatched)."""
+    return queryset.update(dispatched_at=None, attempts=0, available_at=timezone.now(), last_error='')
+
+
+def delivery_stats(window: timedelta = timedelta(minutes=5)) -> Dict[str, float]:
+    """Backlog by state, oldest undelivered age and recent commit-to-dispatch lag."""
+    max_attempts = outbox_settings()['MAX_ATTEMPTS']
+    now = timezone.now()
+    live = Q(attempts__lt=max_attempts)
+    backlog = OutboxMessage.objects.filter(dispatched_at__isnull=True).aggregate(
+        pending=Count('id', filter=Q(attempts=0)),
+        retrying=Count('id', filter=Q(attempts__gt=0) & live),
+        dead=Count('id', filter=~live),
+        oldest=Min('created_at', filter=live),
+    )
+    recent = OutboxMessage.objects.filter(dispatched_at__gte=now - window).aggregate(
+        dispatched=Count('id'), lag=Avg(F('dispatched_at') - F('created_at')),
+    )
+    return {
+        'pending': backlog['pending'],
+        'retrying': backlog['retrying'],
+        'dead': backlog['dead'],
+        'dispatched_recent': recent['dispatched'],
+        'oldest_pending_age_seconds': (now - backlog['oldest']).total_seconds() if backlog['oldest'] else 0.0,
+        'dispatch_lag_seconds': recent['lag'].total_seconds() if recent['lag'] else 0.0,
+    }
+
+
+def prometheus_lines():
+    """Scrape-time outbox gauges for ``/metrics`` (see core.metrics.register_collector)."""
+    try:
+        stats = delivery_stats()
+    except Exception:  # database unavailable; keep the rest of /metrics working
+        logger.exception('Could not collect outbox metrics')
+        return []
+    return [
+        '# HELP outbox_messages Outbox messages by delivery state.',
+        '# TYPE outbox_messages gauge',
+        *(f'outbox_messages{{state="{state}"}} {stats[state]}' for state in ('pending', 'retrying', 'dead')),
+        '# HELP outbox_dispatched_recent Messages dispatched in the last five minutes.',
+        '# TYPE outbox_dispatched_recent gauge',
+        f'outbox_dispatched_recent {stats["dispatched_recent"]}',
+        '# HELP outbox_oldest_pending_age_seconds Age of the oldest undelivered message.',
+        '# TYPE outbox_oldest_pending_age_seconds gauge',
+        f'outbox_oldest_pending_age_seconds {stats["oldest_pending_age_seconds"]}',
+        '# HELP outbox_dispatch_lag_seconds Mean commit-to-dispatch delay over the last five minutes.',
+        '# TYPE outbox_dispatch_lag_seconds gauge',
+        f'outbox_dispatch_lag_seconds {stats["dispatch_lag_seconds"]}',
+    ]
@@ -22,3 +22,11 @@ def send_email_task_notification(self, subject: str, message: str, recipients: l
         return f'Email sent to {recipients}'
     except Exception as exc:
         raise self.retry(exc=exc)
+
+
+@shared_task
+def relay_outbox_task():
+    """Drain the transactional outbox (scheduled by CELERY_BEAT_SCHEDULE)."""
+    from .outbox import relay_pending
+
+    return relay_pending()
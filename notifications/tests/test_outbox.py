@@ -0,0 +1,49 @@
+import pytest
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import Client
+from notifications.models import OutboxMessage
+from notifications.outbox import delivery_stats, enqueue, enqueue_email, relay_batch, relay_pending
+
+
+@pytest.mark.django_db
+def test_message_only_exists_if_transaction_commits():
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            enqueue_email('contract_signed', {'contract_id': 1})
+            raise RuntimeError('business change failed')
+    assert not OutboxMessage.objects.exists()
+
+
+@pytest.mark.django_db
+def test_relay_dispatches_in_batches():
+    for i in range(5):
+        enqueue_email('proposal_created', {'proposal_id': i})
+    assert relay_batch(batch_size=2) == {'claimed': 2, 'sent': 2, 'failed': 0}
+    assert relay_pending(batch_size=2) == {'claimed': 3, 'sent': 3, 'failed': 0}
+    assert len(mail.outbox) == 5
+    assert not OutboxMessage.objects.filter(dispatched_at__isnull=True).exists()
+    assert delivery_stats()['dispatched_recent'] == 5
+
+
+@pytest.mark.django_db
+def test_failed_messages_back_off_die_and_replay(settings):
+    settings.OUTBOX = {'BATCH_SIZE': 10, 'MAX_ATTEMPTS': 2}
+    message = enqueue('notifications.tasks.missing_task', topic='broken')
+    assert relay_batch()['failed'] == 1
+    message.refresh_from_db()
+    assert message.attempts == 1 and 'missing_task' in message.last_error
+    assert relay_batch()['claimed'] == 0  # backing off
+
+    OutboxMessage.objects.filter(pk=message.pk).update(available_at=message.created_at)
+    relay_batch()
+    assert delivery_stats()['dead'] == 1
+    settings.METRICS = {**settings.METRICS, 'TOKEN': 'scraper'}
+    scrape = Client().get('/metrics', HTTP_AUTHORIZATION='Bearer scraper')
+    assert 'outbox_messages{state="dead"} 1' in scrape.content.decode()
+
+    OutboxMessage.objects.filter(pk=message.pk).update(task_name='payments.tasks.send_email_task',
+                                                       args=['contract_signed', {}])
+    call_command('replay_outbox', '--dead')
+    assert relay_batch()['sent'] == 1
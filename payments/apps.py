@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        from core.metrics import register_collector
+        from .webhooks import prometheus_lines
+
+        register_collector(prometheus_lines)
@@ -0,0 +1,332 @@
+"""A standalone payment gateway simulator for load and chaos testing.
+
+``GatewaySimulator`` is a small asyncio HTTP server speaking the same
+protocol as ``mock_gateway.HttpGateway``:
+
+* ``POST /v1/charges`` with ``{"reference", "amount", "webhook_url"}``
+  creates a charge (idempotent on ``reference``), then sends a ``pending``
+  and a ``held`` webhook for it.
+* ``POST /v1/charges/<reference>/release`` and ``.../refund`` settle a
+  charge and send a ``released`` or ``refunded`` webhook.
+* ``GET /v1/charges/<reference>`` returns the charge; ``GET /v1/stats``
+  returns counters for what was simulated.
+
+Every response takes a delay drawn from a ``Latency`` distribution. A share
+of requests fail with a 503 (``error_rate``), and a share hang until the
+client times out (``timeout_rate``); neither creates the charge, as with a
+provider failing before it commits. Webhooks go to the charge's
+``webhook_url`` after their own delay. A share are delivered twice
+(``duplicate_rate``), and a share are held back so later events for the
+same charge overtake them (``reorder_rate``); the others go out in order
+after the charge's previous delivery. Every event carries the
+charge's ``sequence`` number. Deliveries answered with anything but a 2xx
+are retried with backoff, as real providers do.
+
+Run it with ``manage.py run_gateway_simulator`` and point the app at it with
+``PAYMENT_GATEWAY['URL']``; ``manage.py bench_escrow_flow`` starts one
+in-process.
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import threading
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           503: 'Service Unavailable'}
+SETTLE_ACTIONS = {'release': 'released', 'refund': 'refunded'}
+
+
+class Latency:
+    """A delay distribution parsed from ``kind:params`` in milliseconds.
+
+    ``fixed:50``, ``uniform:20,200``, ``exp:80`` (mean) or
+    ``lognormal:80,0.6`` (median and sigma, a long tail like real providers).
+    """
+
+    KINDS = {'fixed': 1, 'uniform': 2, 'exp': 1, 'lognormal': 2}
+
+    def __init__(self, spec: str = 'fixed:0'):
+        kind, _, raw = spec.partition(':')
+        try:
+            params = [float(value) for value in raw.split(',')] if raw else []
+        except ValueError:
+            params = None
+        if kind not in self.KINDS or params is None or len(params) != self.KINDS[kind] or min(params, default=0) < 0:
+            raise ValueError(f'Invalid latency {spec!r}; expected fixed:MS, uniform:MIN,MAX, exp:MEAN '
+                             f'or lognormal:MEDIAN,SIGMA')
+        self.spec, self.kind, self.params = spec, kind, params
+
+    def sample(self, rng: random.Random) -> float:
+        """A delay in seconds."""
+        if self.kind == 'fixed':
+            ms = self.params[0]
+        elif self.kind == 'uniform':
+            ms = rng.uniform(*self.params)
+        elif self.kind == 'exp':
+            ms = rng.expovariate(1 / self.params[0]) if self.params[0] else 0.0
+        else:
+            median, sigma = self.params
+            ms = rng.lognormvariate(math.log(median), sigma) if median else 0.0
+        return ms / 1000.0
+
+    def __repr__(self) -> str:
+        return f'Latency({self.spec!r})'
+
+
+@dataclass
+class SimulatorConfig:
+    latency: Latency = field(default_factory=Latency)
+    webhook_delay: Latency = field(default_factory=lambda: Latency('fixed:10'))
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 30.0
+    duplicate_rate: float = 0.0
+    reorder_rate: float = 0.0
+    # how long a reordered event is held back, so later events overtake it
+    reorder_delay: Latency = field(default_factory=lambda: Latency('uniform:200,1000'))
+    webhook_url: str = ''
+    max_delivery_attempts: int = 8
+    seed: Optional[int] = None
+
+
+class GatewaySimulator:
+    def __init__(self, config: SimulatorConfig = None):
+        self.config = config or SimulatorConfig()
+        self.rng = random.Random(self.config.seed)
+        self.charges: Dict[str, Dict] = {}
+        self.stats = Counter()
+        self._deliveries = set()
+        self._connections = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # --- HTTP server -------------------------------------------------------
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8089) -> int:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self, drain_timeout: float = 0) -> None:
+        if drain_timeout and self._deliveries:
+            await asyncio.wait(set(self._deliveries), timeout=drain_timeout)
+        if self._server is not None:
+            self._server.close()
+        for task in list(self._deliveries) + list(self._connections):
+            task.cancel()
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    def pending_deliveries(self) -> int:
+        return len(self._deliveries)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            request = await _read_request(reader)
+            if request is None:
+                return
+            method, path, body = request
+            await asyncio.sleep(self.config.latency.sample(self.rng))
+            if path.startswith('/v1/charges') and method == 'POST':
+                roll = self.rng.random()
+                if roll < self.config.timeout_rate:
+                    self.stats['timeouts_injected'] += 1
+                    await asyncio.sleep(self.config.timeout_seconds)
+                    return
+                if roll < self.config.timeout_rate + self.config.error_rate:
+                    self.stats['errors_injected'] += 1
+                    await _write_response(writer, 503, {'error': 'simulated outage'})
+                    return
+            status, payload = self._route(method, path, body)
+            await _write_response(writer, status, payload)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        parts = [part for part in path.split('?', 1)[0].split('/') if part]
+        if parts == ['v1', 'stats'] and method == 'GET':
+            return 200, {**self.stats, 'charges': len(self.charges), 'pending_deliveries': len(self._deliveries)}
+        if parts[:2] != ['v1', 'charges']:
+            return 404, {'error': 'not found'}
+        if len(parts) == 2:
+            if method != 'POST':
+                return 405, {'error': 'method not allowed'}
+            try:
+                data = json.loads(body or b'{}')
+                reference, amount = str(data['reference']), str(data['amount'])
+            except (ValueError, KeyError, TypeError):
+                return 400, {'error': 'expected JSON with reference and amount'}
+            return self.create_charge(reference, amount, data.get('webhook_url') or self.config.webhook_url)
+        charge = self.charges.get(parts[2])
+        if charge is None:
+            return 404, {'error': 'no such charge'}
+        if len(parts) == 3 and method == 'GET':
+            return 200, _public(charge)
+        if len(parts) == 4 and parts[3] in SETTLE_ACTIONS and method == 'POST':
+            return self.settle(charge, SETTLE_ACTIONS[parts[3]])
+        return 404, {'error': 'not found'}
+
+    # --- charges and webhooks ------------------------------------------------
+
+    def create_charge(self, reference: str, amount: str, webhook_url: str) -> Tuple[int, Dict]:
+        charge = self.charges.get(reference)
+        if charge is not None:
+            self.stats['idempotent_replays'] += 1
+            return 200, _public(charge)
+        charge = self.charges[reference] = {
+            'charge_id': f'ch_{uuid.uuid4().hex}', 'payment_reference': reference, 'amount': amount,
+            'status': 'held', 'sequence': 0, 'webhook_url': webhook_url,
+        }
+        self.stats['charges_created'] += 1
+        self._emit(charge, 'pending')
+        self._emit(charge, 'held')
+        return 201, _public(charge)
+
+    def settle(self, charge: Dict, status: str) -> Tuple[int, Dict]:
+        if charge['status'] != status:
+            if charge['status'] != 'held':
+                return 400, {'error': f'charge is already {charge["status"]}'}
+            charge['status'] = status
+            self._emit(charge, status)
+        return 200, _public(charge)
+
+    def _emit(self, charge: Dict, status: str) -> None:
+        charge['sequence'] += 1
+        event = {'event_id': f'evt_{uuid.uuid4().hex}', 'payment_reference': charge['payment_reference'],
+                 'charge_id': charge['charge_id'], 'status': status, 'sequence': charge['sequence']}
+        self.stats['events'] += 1
+        if not charge['webhook_url']:
+            return
+        delay = self.config.webhook_delay.sample(self.rng)
+        reordered = self.rng.random() < self.config.reorder_rate
+        if reordered:
+            self.stats['events_reordered'] += 1
+            delay += self.config.reorder_delay.sample(self.rng)
+        # events that are not held back go out after the charge's previous one, in order
+        task = self._schedule(charge['webhook_url'], event, delay, None if reordered else charge.get('last_delivery'))
+        if not reordered:
+            charge['last_delivery'] = task
+        if self.rng.random() < self.config.duplicate_rate:
+            self.stats['events_duplicated'] += 1
+            self._schedule(charge['webhook_url'], event, delay + self.config.webhook_delay.sample(self.rng))
+
+    def _schedule(self, url: str, event: Dict, delay: float, after: Optional[asyncio.Task] = None) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self._deliver(url, event, delay, after))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+        return task
+
+    async def _deliver(self, url: str, event: Dict, delay: float, after: Optional[asyncio.Task] = None) -> None:
+        if after is not None:
+            await asyncio.wait([after])
+        await asyncio.sleep(delay)
+        for attempt in range(1, self.config.max_delivery_attempts + 1):
+            try:
+                status = await post_json(url, event)
+            except (OSError, asyncio.TimeoutError) as exc:
+                status = None
+                logger.debug('Webhook %s to %s failed: %s', event['event_id'], url, exc)
+            if status is not None and 200 <= status < 300:
+                self.stats['webhooks_delivered'] += 1
+                return
+            self.stats['webhook_retries'] += 1
+            await asyncio.sleep(min(30.0, 0.1 * 2 ** attempt))
+        self.stats['webhooks_abandoned'] += 1
+
+
+def _public(charge: Dict) -> Dict:
+    return {key: charge[key] for key in ('charge_id', 'payment_reference', 'amount', 'status')}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, path, _ = lines[0].split(' ', 2)
+    except ValueError:
+        return None
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value.strip() or 0)
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), path, body
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, payload: Dict) -> None:
+    body = json.dumps(payload).encode()
+    writer.write(
+        f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+    )
+    await writer.drain()
+
+
+async def post_json(url: str, payload: Dict, timeout: float = 10.0) -> int:
+    """POST ``payload`` to an ``http://`` URL; returns the response status code."""
+    parts = urlsplit(url)
+    body = json.dumps(payload).encode()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    try:
+        writer.write(
+            f'POST {parts.path or "/"}{"?" + parts.query if parts.query else ""} HTTP/1.1\r\n'
+            f'Host: {parts.netloc}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+class SimulatorThread:
+    """Run a ``GatewaySimulator`` on its own event loop in a background thread."""
+
+    def __init__(self, simulator: GatewaySimulator, host: str = '127.0.0.1', port: int = 0):
+        self.simulator = simulator
+        self.host = host
+        self.loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(port,), daemon=True)
+        self.port = None
+
+    def _run(self, port: int) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.port = self.loop.run_until_complete(self.simulator.start(self.host, port))
+        self._started.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        self.loop.close()
+
+    def start(self) -> str:
+        self._thread.start()
+        self._started.wait()
+        return f'http://{self.host}:{self.port}'
+
+    def call(self, fn, *args):
+        """Run ``fn(*args)`` on the simulator's loop and return its result."""
+        future = asyncio.run_coroutine_threadsafe(_call(fn, *args), self.loop)
+        return future.result()
+
+    def stop(self, drain_timeout: float = 0) -> None:
+        asyncio.run_coroutine_threadsafe(self.simulator.stop(drain_timeout), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+async def _call(fn, *args):
+    return fn(*args)
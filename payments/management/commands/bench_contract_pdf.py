@@ -0,0 +1,70 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from contracts.models import Contract
+from marketplace.models import Crop, Listing
+from payments.pdf import PdfWorkerPool, engine_name, pdf_settings, render_contract_pdfs
+
+
+class Command(BaseCommand):
+    help = 'Benchmark contract PDF throughput (contracts/s) inline and on worker pools'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=200)
+        parser.add_argument('--workers', default=f'1,{os.cpu_count() or 1}',
+                            help='Comma-separated pool sizes; 0 renders inline in this process')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data and files')
+
+    def handle(self, *args, **options):
+        if engine_name() is None:
+            raise CommandError('Install weasyprint (or xhtml2pdf) to run this benchmark')
+        sizes = [int(size) for size in options['workers'].split(',') if size.strip()]
+        batch_size = options['batch_size'] or pdf_settings()['BATCH_SIZE']
+
+        User = get_user_model()
+        farmer, _ = User.objects.get_or_create(username='bench_pdf_farmer', defaults={'role': 'farmer'})
+        buyer, _ = User.objects.get_or_create(username='bench_pdf_buyer', defaults={'role': 'buyer'})
+        crop, _ = Crop.objects.get_or_create(name='Bench crop')
+        listing = Listing.objects.create(farmer=farmer, crop=crop, quantity_available=10 ** 6,
+                                         harvest_date=timezone.now().date(), price_floor=20)
+        now = timezone.now()
+        contracts = Contract.objects.bulk_create(
+            [Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25,
+                      status='active', signed_at=now) for _ in range(options['contracts'])],
+            batch_size=500,
+        )
+        ids = [contract.pk for contract in contracts]
+        batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        self.stdout.write(f'engine {engine_name()}, {len(ids)} contracts in batches of {batch_size}')
+
+        try:
+            for workers in sizes:
+                pool = PdfWorkerPool(workers) if workers else None
+                try:
+                    if pool is not None:
+                        pool.warm()  # process start-up is paid once per pool, not per batch
+                    else:
+                        render_contract_pdfs(ids[:1])
+                    t0 = time.perf_counter()
+                    for batch in batches:
+                        render_contract_pdfs(batch, pool=pool)
+                    elapsed = time.perf_counter() - t0
+                finally:
+                    if pool is not None:
+                        pool.close()
+                label = f'{workers} worker(s)' if workers else 'inline'
+                self.stdout.write(f'{label:14s} {len(ids) / elapsed:8.1f} contracts/s  ({elapsed:.2f} s)')
+                if workers != sizes[-1] or not options['keep']:
+                    self._delete_documents(ids)
+        finally:
+            if not options['keep']:
+                listing.delete()
+
+    def _delete_documents(self, ids):
+        for contract in Contract.objects.filter(pk__in=ids).exclude(contract_document=''):
+            contract.contract_document.delete(save=False)
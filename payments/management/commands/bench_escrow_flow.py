@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, close_old_connections, connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from contracts.models import Contract, EscrowTransaction, PriceProposal, Shipment
+from marketplace.models import Crop, Listing
+from payments.gateway_sim import GatewaySimulator, Latency, SimulatorConfig, SimulatorThread
+from payments.mock_gateway import gateway_settings
+from payments.models import WebhookEvent
+from payments.webhooks import process_batch, process_pending
+
+CONTRACTS_URL = '/api/v1/contracts/contracts'
+SHIPMENTS_URL = '/api/v1/contracts/shipments'
+WEBHOOK_PATH = '/api/v1/payments/mock/webhook/'
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the escrow flow end to end against the gateway simulator: accept -> charge -> held webhook '
+            '-> sign -> delivery -> release, with latency, failures and duplicate/reordered webhooks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--latency', default='lognormal:80,0.5', help='Gateway API latency (see gateway_sim)')
+        parser.add_argument('--webhook-delay', default='exp:200')
+        parser.add_argument('--error-rate', type=float, default=0.05)
+        parser.add_argument('--timeout-rate', type=float, default=0.0)
+        parser.add_argument('--duplicate-rate', type=float, default=0.2)
+        parser.add_argument('--reorder-rate', type=float, default=0.2)
+        parser.add_argument('--gateway-timeout', type=float, default=2.0,
+                            help="The app's gateway client timeout; simulated hangs last twice as long")
+        parser.add_argument('--wait', type=float, default=120.0, help='Seconds to wait for escrows to be held')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data')
+
+    def handle(self, *args, **options):
+        try:
+            config = SimulatorConfig(
+                latency=Latency(options['latency']), webhook_delay=Latency(options['webhook_delay']),
+                error_rate=options['error_rate'], timeout_rate=options['timeout_rate'],
+                timeout_seconds=options['gateway_timeout'] * 2,
+                duplicate_rate=options['duplicate_rate'], reorder_rate=options['reorder_rate'], seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        listing, farmer, buyer, contracts = self._setup(options['contracts'])
+
+        # the app serves the simulator's webhooks over real HTTP on a local port
+        app_server = make_server('127.0.0.1', 0, get_wsgi_application(), server_class=_ThreadingWSGIServer,
+                                 handler_class=_QuietHandler)
+        threading.Thread(target=app_server.serve_forever, daemon=True).start()
+        config.webhook_url = f'http://127.0.0.1:{app_server.server_port}{WEBHOOK_PATH}'
+        simulator = SimulatorThread(GatewaySimulator(config))
+        gateway_url = simulator.start()
+        self.stdout.write(f'{len(contracts)} contracts, concurrency {options["concurrency"]}; '
+                          f'gateway {gateway_url}, webhooks to {config.webhook_url}')
+
+        gateway = {**gateway_settings(), 'URL': gateway_url, 'WEBHOOK_URL': config.webhook_url,
+                   'TIMEOUT': options['gateway_timeout']}
+        try:
+            with override_settings(PAYMENT_GATEWAY=gateway):
+                self._run(contracts, farmer, buyer, simulator, options)
+        finally:
+            simulator.stop()
+            app_server.shutdown()
+            if not options['keep']:
+                WebhookEvent.objects.filter(
+                    payment_reference__in=EscrowTransaction.objects.filter(contract__listing=listing)
+                    .values('payment_reference')
+                ).delete()
+                listing.delete()
+
+    def _setup(self, count):
+        User = get_user_model()
+        farmer, _ = User.objects.get_or_create(username='bench_escrow_farmer', defaults={'role': 'farmer'})
+        buyer, _ = User.objects.get_or_create(username='bench_escrow_buyer', defaults={'role': 'buyer'})
+        crop, _ = Crop.objects.get_or_create(name='Bench crop')
+        listing = Listing.objects.create(farmer=farmer, crop=crop, quantity_available=10 ** 6,
+                                         harvest_date=timezone.now().date(), price_floor=20)
+        contracts = Contract.objects.bulk_create(
+            [Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25,
+                      status='proposed') for _ in range(count)], batch_size=500,
+        )
+        PriceProposal.objects.bulk_create(
+            [PriceProposal(contract=contract, proposer=buyer, price_per_unit=24) for contract in contracts],
+            batch_size=500,
+        )
+        Shipment.objects.bulk_create([Shipment(contract=contract) for contract in contracts], batch_size=500)
+        return listing, farmer, buyer, [contract.pk for contract in contracts]
+
+    def _parallel(self, user, fn, items, concurrency):
+        """Run ``fn(client, item)`` across threads; returns ``{item: (seconds, status code)}``."""
+        local = threading.local()
+
+        def call(item):
+            if not hasattr(local, 'client'):
+                local.client = APIClient()
+                local.client.force_authenticate(user)
+            close_old_connections()
+            t0 = time.perf_counter()
+            status_code = fn(local.client, item)
+            return item, (time.perf_counter() - t0, status_code)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = dict(pool.map(call, items))
+        return results
+
+    def _run(self, contracts, farmer, buyer, simulator, options):
+        shipments = dict(Shipment.objects.filter(contract_id__in=contracts).values_list('contract_id', 'pk'))
+        started = time.perf_counter()
+        accepted_at = {}
+
+        def accept(client, contract_id):
+            response = client.post(f'{CONTRACTS_URL}/{contract_id}/accept_proposal/', {}, format='json')
+            accepted_at[contract_id] = time.perf_counter()
+            connection.close()
+            return response.status_code
+
+        accepts = self._parallel(farmer, accept, contracts, options['concurrency'])
+        self._report('accept (incl. charge when eager)', accepts)
+
+        held_at = self._wait_for('held', contracts, options['wait'])
+        to_held = [held_at[pk] - accepted_at[pk] for pk in held_at if pk in accepted_at]
+        self.stdout.write(f'{"accept -> held webhook applied":36s} ' + self._summary(to_held)
+                          + f'  ({len(held_at)}/{len(contracts)} held)')
+
+        def settle(client, contract_id):
+            client.post(f'{CONTRACTS_URL}/{contract_id}/sign/', {}, format='json')
+            response = client.post(f'{SHIPMENTS_URL}/{shipments[contract_id]}/confirm_delivery/', {}, format='json')
+            connection.close()
+            return response.status_code
+
+        settles = self._parallel(buyer, settle, list(held_at), options['concurrency'])
+        self._report('sign + confirm delivery (release)', settles)
+        elapsed = time.perf_counter() - started
+
+        # let duplicate and reordered webhooks land, then apply anything still queued
+        deadline = time.monotonic() + options['wait']
+        while simulator.call(simulator.simulator.pending_deliveries) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        process_pending(max_batches=10 ** 6)
+
+        escrows = EscrowTransaction.objects.filter(contract_id__in=contracts)
+        final = Counter(escrows.values_list('status', flat=True))
+        outcomes = Counter(WebhookEvent.objects.filter(payment_reference__in=escrows.values('payment_reference'))
+                           .values_list('outcome', flat=True))
+        self.stdout.write(f'end to end: {final.get("released", 0) / elapsed:.1f} releases/s ({elapsed:.2f} s)')
+        self.stdout.write(f'final escrow states: {dict(final)}')
+        self.stdout.write(f'webhook outcomes: {dict(outcomes)}')
+        self.stdout.write(f'simulator: {dict(simulator.simulator.stats)}')
+
+    def _wait_for(self, status, contracts, timeout):
+        """Poll until every contract's escrow reaches ``status``; returns when each was first seen there.
+
+        Also drains the webhook queue, standing in for ``process_webhooks --loop``.
+        """
+        seen, deadline = {}, time.monotonic() + timeout
+        while len(seen) < len(contracts) and time.monotonic() < deadline:
+            try:
+                process_batch()
+            except OperationalError:
+                pass  # SQLite refuses concurrent writers ("database is locked"); retried on the next poll
+            now = time.perf_counter()
+            for contract_id in EscrowTransaction.objects.filter(
+                    contract_id__in=[pk for pk in contracts if pk not in seen], status=status,
+            ).values_list('contract_id', flat=True):
+                seen[contract_id] = now
+            time.sleep(0.02)
+        return seen
+
+    def _summary(self, seconds):
+        return (f'p50 {percentile(seconds, 50) * 1000:7.1f} ms  p95 {percentile(seconds, 95) * 1000:7.1f} ms  '
+                f'p99 {percentile(seconds, 99) * 1000:7.1f} ms  max {max(seconds, default=0) * 1000:7.1f} ms')
+
+    def _report(self, label, results):
+        codes = Counter(code for _, code in results.values())
+        self.stdout.write(f'{label:36s} {self._summary([seconds for seconds, _ in results.values()])}  '
+                          f'status {dict(codes)}')
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from payments.pdf import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored contract documents that no contract references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-minutes', type=int, default=60,
+                            help='Keep unreferenced files younger than this (renders in flight)')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        report = collect_garbage(timedelta(minutes=options['min_age_minutes']), dry_run=options['dry_run'])
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['referenced']} referenced, {verb} {report['deleted']}, kept {report['recent']} recent"
+        ))
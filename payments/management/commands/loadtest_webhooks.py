@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from contracts.models import Contract, EscrowTransaction
+from marketplace.models import Crop, Listing
+from payments.models import WebhookEvent
+from payments.webhooks import process_pending, queue_settings
+
+SINGLE_URL = '/api/v1/payments/mock/webhook/'
+BATCH_URL = '/api/v1/payments/mock/webhook/batch/'
+
+
+class Command(BaseCommand):
+    help = ('Load-test webhook ingestion with duplicate and out-of-order deliveries: '
+            'acknowledgement rate, then queue drain rate and final escrow states')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escrows', type=int, default=500)
+        parser.add_argument('--duplicates', type=float, default=0.3, help='Share of events delivered twice')
+        parser.add_argument('--reorder', type=float, default=0.2,
+                            help='Share of escrows whose "released" arrives before "held"')
+        parser.add_argument('--batch-size', type=int, default=0, help='Events per request; 0 uses the single endpoint')
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--inline', action='store_true',
+                            help='Process after every request (as with an eager Celery) instead of draining at the end')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        run = uuid.uuid4().hex[:8]
+        listing, references = self._setup(run, options['escrows'])
+        stream = self._stream(run, references, options['duplicates'], options['reorder'], rng)
+        self.stdout.write(f'{len(stream)} deliveries for {len(references)} escrows, '
+                          f'{options["threads"]} thread(s), batch size {options["batch_size"] or 1}')
+
+        outcomes = Counter()
+        lock = threading.Lock()
+        shards = [stream[i::options['threads']] for i in range(options['threads'])]
+
+        def worker(events):
+            client = Client()
+            local = Counter()
+            try:
+                if options['batch_size']:
+                    for start in range(0, len(events), options['batch_size']):
+                        response = client.post(BATCH_URL, events[start:start + options['batch_size']],
+                                               content_type='application/json')
+                        local.update(response.json()['counts'])
+                else:
+                    for event in events:
+                        response = client.post(SINGLE_URL, event, content_type='application/json')
+                        local[response.json().get('detail', response.status_code)] += 1
+            finally:
+                connection.close()
+            with lock:
+                outcomes.update(local)
+
+        threads = [threading.Thread(target=worker, args=(shard,)) for shard in shards]
+        t0 = time.perf_counter()
+        with override_settings(WEBHOOK_QUEUE={**queue_settings(), 'PROCESS_ON_COMMIT': options['inline']}):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        drained = process_pending(max_batches=10 ** 6)
+        drain_elapsed = time.perf_counter() - t0
+
+        final = Counter(EscrowTransaction.objects.filter(payment_reference__in=references)
+                        .values_list('status', flat=True))
+        self.stdout.write(f'acknowledged {len(stream) / elapsed:10.1f} events/s  ({elapsed:.2f} s)')
+        self.stdout.write(f'outcomes: {dict(outcomes)}')
+        if drained['claimed']:
+            self.stdout.write(f'drained      {drained["claimed"] / drain_elapsed:10.1f} events/s  '
+                              f'({drain_elapsed:.2f} s): {drained}')
+        self.stdout.write(f'final escrow states: {dict(final)} '
+                          f'({final.get("released", 0)}/{len(references)} ended released)')
+        if not options['keep']:
+            WebhookEvent.objects.filter(event_id__startswith=f'lt_{run}_').delete()
+            listing.delete()
+
+    def _setup(self, run, count):
+        User = get_user_model()
+        farmer, _ = User.objects.get_or_create(username='loadtest_farmer', defaults={'role': 'farmer'})
+        buyer, _ = User.objects.get_or_create(username='loadtest_buyer', defaults={'role': 'buyer'})
+        crop, _ = Crop.objects.get_or_create(name='Bench crop')
+        listing = Listing.objects.create(farmer=farmer, crop=crop, quantity_available=10 ** 6,
+                                         harvest_date=timezone.now().date(), price_floor=20)
+        contracts = Contract.objects.bulk_create(
+            [Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25,
+                      status='accepted') for _ in range(count)], batch_size=500,
+        )
+        references = [f'lt_{run}_{i}' for i in range(count)]
+        EscrowTransaction.objects.bulk_create(
+            [EscrowTransaction(contract=contract, amount=25, status='pending', payment_reference=reference)
+             for contract, reference in zip(contracts, references)], batch_size=500,
+        )
+        return listing, references
+
+    def _stream(self, run, references, duplicates, reorder, rng):
+        """Each escrow gets held then released; some swapped, some redelivered later, all interleaved."""
+        positioned = []
+        for reference in references:
+            events = [{'event_id': f'lt_{run}_{reference}_{status}', 'payment_reference': reference, 'status': status}
+                      for status in ('held', 'released')]
+            if rng.random() < reorder:
+                events.reverse()
+            first, second = sorted(rng.random() for _ in events)
+            positioned += [(first, events[0]), (second, events[1])]
+            for position, event in ((first, events[0]), (second, events[1])):
+                if rng.random() < duplicates:
+                    positioned.append((position + rng.random() * (1 - position), dict(event)))
+        positioned.sort(key=lambda item: item[0])
+        return [event for _, event in positioned]
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply queued gateway webhook events; safe to run several processors in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once drained')
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        totals = {}
+        while True:
+            result = process_batch(options['batch_size'])
+            for key, count in result.items():
+                totals[key] = totals.get(key, 0) + count
+            if not result['claimed']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        summary = ', '.join(f'{count} {key}' for key, count in sorted(totals.items()) if key != 'claimed')
+        self.stdout.write(self.style.SUCCESS(f'Processed {totals["claimed"]} events ({summary or "none"})'))
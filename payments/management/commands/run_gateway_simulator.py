@@ -0,0 +1,50 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.gateway_sim import GatewaySimulator, Latency, SimulatorConfig
+
+
+class Command(BaseCommand):
+    help = ('Run a local payment gateway simulator with configurable latency, failures and duplicate/reordered '
+            'webhooks; point PAYMENT_GATEWAY_URL at it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--webhook-url', default='http://127.0.0.1:8000/api/v1/payments/mock/webhook/',
+                            help='Where to send webhooks when a charge request names none')
+        parser.add_argument('--latency', default='lognormal:80,0.5',
+                            help='API response delay: fixed:MS, uniform:MIN,MAX, exp:MEAN or lognormal:MEDIAN,SIGMA')
+        parser.add_argument('--webhook-delay', default='exp:200', help='Delay before a webhook is sent')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of charge requests answered 503')
+        parser.add_argument('--timeout-rate', type=float, default=0.0, help='Share of charge requests left hanging')
+        parser.add_argument('--duplicate-rate', type=float, default=0.0, help='Share of webhooks delivered twice')
+        parser.add_argument('--reorder-rate', type=float, default=0.0,
+                            help='Share of webhooks held back so later events overtake them')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            config = SimulatorConfig(
+                latency=Latency(options['latency']), webhook_delay=Latency(options['webhook_delay']),
+                error_rate=options['error_rate'], timeout_rate=options['timeout_rate'],
+                duplicate_rate=options['duplicate_rate'], reorder_rate=options['reorder_rate'],
+                webhook_url=options['webhook_url'], seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        try:
+            asyncio.run(self._serve(GatewaySimulator(config), options['host'], options['port']))
+        except KeyboardInterrupt:
+            pass
+
+    async def _serve(self, simulator, host, port):
+        port = await simulator.start(host, port)
+        self.stdout.write(self.style.SUCCESS(f'Gateway simulator on http://{host}:{port}/v1/charges '
+                                             f'(webhooks to {simulator.config.webhook_url})'))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await simulator.stop()
+            self.stdout.write(f'stats: {dict(simulator.stats)}')
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:11
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_processed(apps, schema_editor):
+    # events recorded before the queue were applied synchronously on receipt
+    WebhookEvent = apps.get_model('payments', 'WebhookEvent')
+    WebhookEvent.objects.update(processed_at=F('received_at'), outcome='processed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='outcome',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='payment_reference',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='status',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.RunPython(mark_existing_processed, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['available_at', 'id'], name='webhook_pending_idx'),
+        ),
+    ]
@@ -1,16 +1,133 @@
+"""Local stand-in for the payment gateway.
+
+``MockGateway`` behaves like a hosted provider: every call takes
+``PAYMENT_GATEWAY['LATENCY_MS']``, fails transiently with probability
+``FAILURE_RATE``, is idempotent on the caller's reference (the same
+reference always yields the same charge), and, with ``AUTO_WEBHOOK``,
+confirms the charge by sending a ``held`` webhook asynchronously, as the real
+provider would.
+
+With ``PAYMENT_GATEWAY['URL']`` set, ``get_gateway`` returns an
+``HttpGateway`` talking to that server instead, e.g. the simulator from
+``manage.py run_gateway_simulator`` (payments/gateway_sim.py), which sends
+its webhooks over HTTP to ``WEBHOOK_URL``.
+"""
+import json
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
 import uuid
 from typing import Dict
 
+from django.conf import settings
+
+
+class GatewayError(Exception):
+    """The gateway rejected the request; retrying will not help."""
+
+
+class TransientGatewayError(GatewayError):
+    """Timeout or 5xx from the gateway; safe to retry with the same reference."""
+
+
+def gateway_settings() -> Dict:
+    defaults = {'LATENCY_MS': 0, 'FAILURE_RATE': 0.0, 'AUTO_WEBHOOK': True, 'URL': '', 'WEBHOOK_URL': '',
+                'TIMEOUT': 10.0}
+    return {**defaults, **getattr(settings, 'PAYMENT_GATEWAY', {})}
+
+
+class MockGateway:
+    def __init__(self):
+        self._charges: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create_charge(self, reference: str, amount) -> Dict:
+        """Create (or return the existing) charge for ``reference``."""
+        config = gateway_settings()
+        if config['LATENCY_MS']:
+            time.sleep(config['LATENCY_MS'] / 1000.0)
+        if config['FAILURE_RATE'] and random.random() < config['FAILURE_RATE']:
+            raise TransientGatewayError(f'gateway timeout for {reference}')
+        with self._lock:
+            charge = self._charges.get(reference)
+            created = charge is None
+            if created:
+                charge = {
+                    'charge_id': f'ch_{uuid.uuid4().hex}',
+                    'payment_reference': reference,
+                    'status': 'created',
+                    'amount': str(amount),
+                }
+                self._charges[reference] = charge
+        if created and config['AUTO_WEBHOOK']:
+            from .tasks import deliver_mock_webhook_task
+
+            deliver_mock_webhook_task.delay(reference, 'held')
+        return dict(charge)
+
+    def refund_charge(self, reference: str) -> Dict:
+        """Refund the charge for ``reference``; the ``refunded`` webhook confirms it."""
+        with self._lock:
+            charge = self._charges.get(reference)
+            if charge is None:
+                raise GatewayError(f'no charge for {reference}')
+            refunded = charge['status'] != 'refunded'
+            charge['status'] = 'refunded'
+        if refunded and gateway_settings()['AUTO_WEBHOOK']:
+            from .tasks import deliver_mock_webhook_task
+
+            deliver_mock_webhook_task.delay(reference, 'refunded')
+        return dict(charge)
+
+
+class HttpGateway:
+    """Client for a gateway reached over HTTP (the simulator's protocol)."""
+
+    def __init__(self, base_url: str, webhook_url: str = '', timeout: float = 10.0):
+        self.base_url = base_url.rstrip('/')
+        self.webhook_url = webhook_url
+        self.timeout = timeout
+
+    def create_charge(self, reference: str, amount) -> Dict:
+        """Create (or return the existing) charge for ``reference``."""
+        return self._post('/v1/charges', {'reference': reference, 'amount': str(amount),
+                                          'webhook_url': self.webhook_url}, reference)
+
+    def refund_charge(self, reference: str) -> Dict:
+        """Refund the charge for ``reference``; the ``refunded`` webhook confirms it."""
+        return self._post(f'/v1/charges/{urllib.parse.quote(reference)}/refund', {}, reference)
+
+    def _post(self, path: str, payload: Dict, reference: str) -> Dict:
+        request = urllib.request.Request(f'{self.base_url}{path}', data=json.dumps(payload).encode(),
+                                         method='POST', headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as exc:
+            if exc.code == 429 or exc.code >= 500:
+                raise TransientGatewayError(f'gateway returned {exc.code} for {reference}') from exc
+            raise GatewayError(f'gateway rejected {reference}: {exc.code} {exc.read()[:200]!r}') from exc
+        except (urllib.error.URLError, socket.timeout, ConnectionError) as exc:
+            raise TransientGatewayError(f'gateway unreachable for {reference}: {exc}') from exc
+
+
+_gateway = MockGateway()
+
+
+def get_gateway():
+    config = gateway_settings()
+    if config['URL']:
+        return HttpGateway(config['URL'], config['WEBHOOK_URL'], config['TIMEOUT'])
+    return _gateway
+
+
 def create_mock_charge(contract, amount: float) -> Dict[str, str]:
     """Simulate creating a payment charge and return a payment reference.
 
     In a real integration, this would call Stripe/other provider and return a charge id or session id.
     """
-    payment_reference = f"mock_{uuid.uuid4().hex}"
-    # In a real implementation, you'd persist a pending payment or return a checkout URL.
-    return {
-        'payment_reference': payment_reference,
-        'status': 'created',
-        'amount': amount,
-    }
-
+    return get_gateway().create_charge(f"mock_{uuid.uuid4().hex}", amount)
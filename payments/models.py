@@ -1,11 +1,29 @@
 from django.db import models
+from django.utils import timezone
 
 
 class WebhookEvent(models.Model):
-    """Records processed webhook event ids for idempotency."""
+    """A gateway webhook, recorded on receipt and applied asynchronously.
+
+    The unique ``event_id`` makes redeliveries no-ops. Rows with no
+    ``processed_at`` are the queue drained by ``payments.webhooks.process_pending``;
+    ``outcome`` records what applying the event did.
+    """
     event_id = models.CharField(max_length=255, unique=True)
+    payment_reference = models.CharField(max_length=255, blank=True, db_index=True)
+    status = models.CharField(max_length=16, blank=True)
     payload = models.JSONField(default=dict)
     received_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.CharField(max_length=16, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='webhook_pending_idx',
+                         condition=models.Q(processed_at__isnull=True)),
+        ]
 
     def __str__(self) -> str:
         return f"WebhookEvent({self.event_id})"
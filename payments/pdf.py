@@ -0,0 +1,359 @@
+"""Contract PDF rendering.
+
+The expensive parts are paid once per process, not once per contract: the
+Django template is compiled and the shared stylesheet read once
+(``get_renderer``), and the PDF engine (WeasyPrint, else xhtml2pdf) is
+imported with its fonts configured and stylesheet parsed once per worker
+process (``get_engine``).
+
+``render_contract_pdfs`` takes a batch of contract ids, loads them with
+their listing, crop, farmer and buyer in one query, builds the HTML in the
+calling process and converts it to PDF inline or on a ``PdfWorkerPool`` of
+warm processes. The files are then stored with one bulk UPDATE. In Celery
+the dedicated ``pdf`` queue plays the pool's role (see ``PDF_RENDERING`` in
+settings).
+
+Documents are content addressed: each is stored at a path derived from the
+hash of everything the template reads, plus the template version
+(``rendering_key``), and the hash is kept on ``Contract.document_hash``.
+Rendering the same inputs again is skipped. A file already stored under
+that key is reused instead of rendered. Files no contract references any
+more are removed by ``collect_garbage`` (``manage.py gc_contract_documents``).
+"""
+import hashlib
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.template.loader import get_template
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_NAME = 'contracts/contract_pdf.html'
+STYLESHEET_NAME = 'contracts/contract_pdf.css'
+DOCUMENT_ROOT = 'contracts'
+DOCUMENT_PREFIX = f'{DOCUMENT_ROOT}/by-input'
+
+
+class PdfEngineUnavailable(Exception):
+    """Neither WeasyPrint nor xhtml2pdf is installed."""
+
+
+def pdf_settings() -> Dict:
+    defaults = {'BATCH_SIZE': 50, 'WARM_ON_START': False}
+    return {**defaults, **getattr(settings, 'PDF_RENDERING', {})}
+
+
+@lru_cache(maxsize=1)
+def engine_name() -> Optional[str]:
+    for name in ('weasyprint', 'xhtml2pdf'):
+        if importlib.util.find_spec(name) is not None:
+            return name
+    return None
+
+
+@lru_cache(maxsize=1)
+def stylesheet() -> str:
+    return get_template(STYLESHEET_NAME).template.source
+
+
+class WeasyPrintEngine:
+    inline_css = False
+
+    def __init__(self, css: str):
+        import weasyprint
+        try:
+            from weasyprint.text.fonts import FontConfiguration
+        except ImportError:  # WeasyPrint < 53
+            from weasyprint.fonts import FontConfiguration
+
+        self._html = weasyprint.HTML
+        self._font_config = FontConfiguration()
+        self._stylesheets = [weasyprint.CSS(string=css, font_config=self._font_config)]
+
+    def write_pdf(self, html: str) -> bytes:
+        return self._html(string=html).write_pdf(stylesheets=self._stylesheets, font_config=self._font_config)
+
+
+class Xhtml2PdfEngine:
+    # xhtml2pdf has no external stylesheet support; the template inlines it
+    inline_css = True
+
+    def __init__(self, css: str):
+        from xhtml2pdf import pisa
+
+        self._pisa = pisa
+
+    def write_pdf(self, html: str) -> bytes:
+        out = BytesIO()
+        result = self._pisa.pisaDocument(BytesIO(html.encode('utf-8')), out)
+        if result.err:
+            raise RuntimeError(f'xhtml2pdf reported {result.err} error(s)')
+        return out.getvalue()
+
+
+ENGINES = {'weasyprint': WeasyPrintEngine, 'xhtml2pdf': Xhtml2PdfEngine}
+
+_engine = None
+_engine_pid = None
+
+
+def get_engine():
+    """The PDF engine of this process, created on first use (and again after a fork)."""
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        name = engine_name()
+        if name is None:
+            raise PdfEngineUnavailable('Install weasyprint (or xhtml2pdf) to render contract PDFs')
+        _engine, _engine_pid = ENGINES[name](stylesheet()), os.getpid()
+    return _engine
+
+
+def html_to_pdf(html: str) -> bytes:
+    return get_engine().write_pdf(html)
+
+
+def try_html_to_pdf(html: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """``(pdf, None)``, or ``(None, error)`` if this document failed; a missing engine still raises."""
+    try:
+        return html_to_pdf(html), None
+    except PdfEngineUnavailable:
+        raise
+    except Exception as exc:
+        return None, f'{type(exc).__name__}: {exc}'
+
+
+def warm_engine() -> None:
+    """Load the engine and its fonts before the first real document."""
+    html_to_pdf('<p>warm-up</p>')
+
+
+class ContractRenderer:
+    def __init__(self):
+        self.template = get_template(TEMPLATE_NAME)
+        self.inline_css = stylesheet() if ENGINES.get(engine_name(), WeasyPrintEngine).inline_css else ''
+
+    def render_html(self, contract) -> str:
+        return self.template.render({
+            'contract': contract,
+            'listing': contract.listing,
+            'buyer': contract.buyer,
+            'farmer': contract.listing.farmer,
+            'signed_at': contract.signed_at,
+            'inline_css': self.inline_css,
+        })
+
+
+@lru_cache(maxsize=1)
+def get_renderer() -> ContractRenderer:
+    return ContractRenderer()
+
+
+def _init_pool_worker() -> None:
+    import django
+
+    django.setup()
+    warm_engine()
+
+
+class PdfWorkerPool:
+    """Processes that keep a warm PDF engine across batches.
+
+    Workers only turn HTML into PDF bytes and never touch the database.
+    They are spawned rather than forked, so no connection is shared with the
+    parent. Celery prefork workers are daemonic and cannot start this pool;
+    there, run a dedicated ``pdf`` queue worker instead.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_pool_worker)
+
+    def warm(self) -> None:
+        # the initializer runs when a worker starts; one task per worker starts them all
+        list(self._executor.map(html_to_pdf, ['<p>warm-up</p>'] * self.workers))
+
+    def map(self, documents: List[str]) -> List[Tuple[Optional[bytes], Optional[str]]]:
+        """``try_html_to_pdf`` for each document, so one bad document does not fail the batch."""
+        chunksize = max(1, len(documents) // (self.workers * 4))
+        return list(self._executor.map(try_html_to_pdf, documents, chunksize=chunksize))
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def fetch_contracts(contract_ids: Iterable[int]) -> list:
+    from contracts.models import Contract
+
+    return list(
+        Contract.objects.filter(pk__in=list(contract_ids))
+        .select_related('listing__crop', 'listing__farmer', 'buyer').order_by('pk')
+    )
+
+
+@lru_cache(maxsize=1)
+def template_version() -> str:
+    """Changes whenever the template, the stylesheet or the engine changes."""
+    digest = hashlib.sha256()
+    for part in (get_template(TEMPLATE_NAME).template.source, stylesheet(), engine_name() or ''):
+        digest.update(part.encode('utf-8') + b'\0')
+    return digest.hexdigest()[:16]
+
+
+def _display_name(user) -> str:
+    return user.get_full_name() or user.username
+
+
+def rendering_inputs(contract) -> Dict:
+    """Everything the contract template reads, as JSON-safe values."""
+    listing = contract.listing
+    return {
+        'template': template_version(),
+        'contract': contract.pk,
+        'status': contract.status,
+        'crop': listing.crop.name,
+        'unit': listing.crop.unit,
+        'agreed_quantity': str(contract.agreed_quantity),
+        'price_per_unit': str(contract.price_per_unit),
+        'total_value': str(contract.total_value),
+        'farmer': _display_name(listing.farmer),
+        'buyer': _display_name(contract.buyer),
+        'start_date': str(contract.start_date),
+        'end_date': str(contract.end_date) if contract.end_date else None,
+        'signed_at': contract.signed_at.isoformat() if contract.signed_at else None,
+    }
+
+
+def rendering_key(contract) -> str:
+    encoded = json.dumps(rendering_inputs(contract), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def document_path(key: str) -> str:
+    return f'{DOCUMENT_PREFIX}/{key[:2]}/{key}.pdf'
+
+
+def document_storage():
+    from contracts.models import Contract
+
+    return Contract._meta.get_field('contract_document').storage
+
+
+def render_contract_pdfs(contract_ids: Iterable[int], pool: Optional[PdfWorkerPool] = None) -> Dict:
+    """Render and attach PDFs for a batch of contracts.
+
+    Returns the ids that were rendered, reused from an already stored file,
+    skipped as current, missing, or failed. A contract whose document fails
+    to render or store is logged and reported as failed; the rest of the
+    batch is still attached.
+    """
+    from contracts.models import Contract
+
+    contract_ids = list(contract_ids)
+    storage = document_storage()
+    contracts = fetch_contracts(contract_ids)
+    keys = {contract.pk: rendering_key(contract) for contract in contracts}
+    current, stored, stale = [], [], []
+    for contract in contracts:
+        path = document_path(keys[contract.pk])
+        if contract.document_hash == keys[contract.pk] and contract.contract_document.name == path:
+            current.append(contract)
+        elif storage.exists(path):
+            stored.append(contract)
+        else:
+            stale.append(contract)
+
+    renderer = get_renderer()
+    failed, rendering, documents = {}, [], []
+    for contract in stale:
+        try:
+            documents.append(renderer.render_html(contract))
+        except Exception as exc:
+            failed[contract.pk] = f'{type(exc).__name__}: {exc}'
+            continue
+        rendering.append(contract)
+    results = pool.map(documents) if pool is not None else [try_html_to_pdf(document) for document in documents]
+    rendered = []
+    for contract, (pdf, error) in zip(rendering, results):
+        path = document_path(keys[contract.pk])
+        if error is None:
+            try:
+                name = storage.save(path, ContentFile(pdf))
+                if name != path:
+                    # another worker stored the same inputs first; its file is identical
+                    storage.delete(name)
+            except Exception as exc:
+                error = f'{type(exc).__name__}: {exc}'
+        if error is not None:
+            failed[contract.pk] = error
+            continue
+        rendered.append(contract)
+    for pk, error in failed.items():
+        logger.warning('Rendering the PDF of contract %s failed: %s', pk, error)
+
+    changed = stored + rendered
+    for contract in changed:
+        contract.document_hash = keys[contract.pk]
+        contract.contract_document.name = document_path(contract.document_hash)
+    Contract.objects.bulk_update(changed, ['contract_document', 'document_hash'])
+    found = set(keys)
+    return {
+        'rendered': [contract.pk for contract in rendered],
+        'reused': [contract.pk for contract in stored],
+        'skipped': [contract.pk for contract in current],
+        'missing': [pk for pk in contract_ids if pk not in found],
+        'failed': sorted(failed),
+    }
+
+
+def _walk(storage, directory: str) -> Iterator[str]:
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from _walk(storage, f'{directory}/{name}')
+
+
+def collect_garbage(min_age: timedelta = timedelta(hours=1), dry_run: bool = False) -> Dict[str, int]:
+    """Delete contract documents no contract references.
+
+    Files younger than ``min_age`` are kept: a render stores its file before
+    the UPDATE that references it commits.
+    """
+    from contracts.models import Contract
+
+    storage = document_storage()
+    referenced = set(Contract.objects.exclude(contract_document='').exclude(contract_document__isnull=True)
+                     .values_list('contract_document', flat=True))
+    cutoff = timezone.now() - min_age
+    report = {'referenced': 0, 'deleted': 0, 'recent': 0}
+    for name in _walk(storage, DOCUMENT_ROOT):
+        if name in referenced:
+            report['referenced'] += 1
+        elif storage.get_modified_time(name) > cutoff:
+            report['recent'] += 1
+        else:
+            if not dry_run:
+                storage.delete(name)
+            report['deleted'] += 1
+    return report
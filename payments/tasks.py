@@ -1,6 +1,10 @@
+import logging
+
 from celery import shared_task
 from django.core.mail import send_mail
 
+logger = logging.getLogger(__name__)
+
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
 def send_email_task(self, event_type: str, payload: dict):
@@ -10,6 +14,7 @@ def send_email_task(self, event_type: str, payload: dict):
         'proposal_accepted': 'Proposal accepted',
         'contract_signed': 'Contract signed',
         'shipment_delivered': 'Shipment delivered',
+        'escrow_released': 'Escrow released',
     }
     subject = subject_map.get(event_type, 'Notification')
     try:
@@ -17,3 +22,79 @@ def send_email_task(self, event_type: str, payload: dict):
     except Exception as exc:
         raise self.retry(exc=exc)
 
+
+
+@shared_task(bind=True, max_retries=6, default_retry_delay=5)
+def create_escrow_charge_task(self, escrow_id: int):
+    """Create the gateway charge for a pending escrow, outside any request transaction.
+
+    The escrow's payment_reference is the gateway idempotency key, so a retry
+    after a timeout never creates a second charge. The escrow moves to
+    ``held`` when the gateway's webhook confirms the charge.
+    """
+    from contracts.models import EscrowTransaction
+    from .mock_gateway import GatewayError, TransientGatewayError, get_gateway
+
+    escrow = EscrowTransaction.objects.filter(pk=escrow_id).only(
+        'id', 'amount', 'status', 'payment_reference', 'charge_id').first()
+    if escrow is None or escrow.status != 'pending' or escrow.charge_id:
+        return 'skipped'
+    try:
+        charge = get_gateway().create_charge(escrow.payment_reference, escrow.amount)
+    except TransientGatewayError as exc:
+        raise self.retry(exc=exc, countdown=min(300, 5 * 2 ** self.request.retries))
+    except GatewayError as exc:
+        logger.error('Charge for escrow %s rejected: %s', escrow_id, exc)
+        EscrowTransaction.objects.filter(pk=escrow_id).update(charge_error=str(exc))
+        return 'rejected'
+    uncharged = EscrowTransaction.objects.filter(pk=escrow_id, charge_id='')
+    if uncharged.exclude(status='refunded').update(charge_id=charge['charge_id'], charge_error=''):
+        return charge['charge_id']
+    if uncharged.filter(status='refunded').update(charge_id=charge['charge_id']):
+        # the contract was cancelled while the gateway call was in flight: give the money back
+        refund_escrow_charge_task.delay(escrow_id)
+        return 'refunding'
+    return charge['charge_id']
+
+
+@shared_task(bind=True, max_retries=6, default_retry_delay=5)
+def refund_escrow_charge_task(self, escrow_id: int):
+    """Refund the gateway charge of an escrow whose contract was cancelled before funds were held.
+
+    Idempotent on the payment reference like the charge; the escrow moves to
+    ``refunded`` when the gateway's webhook confirms the refund.
+    """
+    from contracts.models import EscrowTransaction
+    from .mock_gateway import GatewayError, TransientGatewayError, get_gateway
+
+    escrow = EscrowTransaction.objects.filter(pk=escrow_id).only('id', 'payment_reference', 'charge_id').first()
+    if escrow is None or not escrow.charge_id:
+        return 'skipped'
+    try:
+        get_gateway().refund_charge(escrow.payment_reference)
+    except TransientGatewayError as exc:
+        raise self.retry(exc=exc, countdown=min(300, 5 * 2 ** self.request.retries))
+    except GatewayError as exc:
+        logger.error('Refund for escrow %s rejected: %s', escrow_id, exc)
+        EscrowTransaction.objects.filter(pk=escrow_id).update(charge_error=str(exc))
+        return 'rejected'
+    return 'refund_requested'
+
+
+@shared_task
+def deliver_mock_webhook_task(payment_reference: str, new_status: str):
+    """The mock gateway's asynchronous webhook callback."""
+    import uuid
+    from .webhooks import apply_webhook_event
+
+    event_id = f"mockevt_{uuid.uuid4().hex}"
+    payload = {'event_id': event_id, 'payment_reference': payment_reference, 'status': new_status}
+    return apply_webhook_event(event_id, payment_reference, new_status, payload)
+
+
+@shared_task
+def process_webhook_events_task():
+    """Apply queued gateway webhook events (scheduled after each receipt and by beat)."""
+    from .webhooks import process_pending
+
+    return process_pending()
@@ -1,45 +1,59 @@
-"""Task to generate signed PDF contracts using WeasyPrint."""
+"""Tasks to generate signed PDF contracts (rendering lives in payments/pdf.py)."""
+import logging
+
 from celery import shared_task
-from django.template.loader import render_to_string
-from io import BytesIO
+from celery.signals import worker_process_init
+
+from .pdf import PdfEngineUnavailable, pdf_settings, render_contract_pdfs, warm_engine
+
+logger = logging.getLogger(__name__)
+
+
+@worker_process_init.connect
+def warm_pdf_engine(**kwargs):
+    # set PDF_RENDERING['WARM_ON_START'] on the dedicated `pdf` queue workers only
+    if not pdf_settings()['WARM_ON_START']:
+        return
+    try:
+        warm_engine()
+    except PdfEngineUnavailable as exc:
+        logger.warning('Not warming the PDF engine: %s', exc)
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def generate_contract_pdf_task(contract_id: int):
+def generate_contract_pdfs_task(self, contract_ids):
+    """Generate signed PDFs for a batch of contracts and save them.
+
+    Contracts whose document failed are retried on their own; the rest of
+    the batch is not rendered again.
+    """
+    try:
+        result = render_contract_pdfs(contract_ids)
+    except PdfEngineUnavailable as exc:
+        # retrying cannot install the engine
+        logger.error('Cannot render contract PDFs %s: %s', contract_ids, exc)
+        return {'rendered': [], 'missing': [], 'error': str(exc)}
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=120)
+    if result['failed']:
+        if self.request.retries < self.max_retries:
+            raise self.retry(args=[result['failed']], countdown=120)
+        logger.error('Giving up on contract PDFs %s', result['failed'])
+    return result
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def generate_contract_pdf_task(self, contract_id: int):
     """Generate a signed PDF for a contract and save it."""
     try:
-        from contracts.models import Contract
-        from django.core.files.base import ContentFile
-        
-        contract = Contract.objects.get(pk=contract_id)
-        
-        # Render HTML template for contract
-        html_string = render_to_string('contracts/contract_pdf.html', {
-            'contract': contract,
-            'listing': contract.listing,
-            'buyer': contract.buyer,
-            'farmer': contract.listing.farmer,
-            'signed_at': contract.signed_at,
-        })
-        
-        # Generate PDF using WeasyPrint
-        try:
-            import weasyprint
-            html = weasyprint.HTML(string=html_string)
-            pdf_bytes = html.write_pdf()
-        except ImportError:
-            # Fallback: use xhtml2pdf if WeasyPrint not available
-            from xhtml2pdf import pisa
-            pdf_file = BytesIO()
-            pisa.pisaDocument(BytesIO(html_string.encode('utf-8')), pdf_file)
-            pdf_bytes = pdf_file.getvalue()
-        
-        filename = f'contract_{contract_id}_{contract.signed_at.timestamp()}.pdf'
-        contract.contract_document.save(filename, ContentFile(pdf_bytes))
-        contract.save()
-        
-        return f'PDF generated for contract {contract_id}'
-    except Contract.DoesNotExist:
-        return f'Contract {contract_id} not found'
+        result = render_contract_pdfs([contract_id])
+    except PdfEngineUnavailable as exc:
+        logger.error('Cannot render contract PDF %s: %s', contract_id, exc)
+        return f'PDF engine unavailable for contract {contract_id}'
     except Exception as exc:
         raise self.retry(exc=exc, countdown=120)
+    if result['failed']:
+        raise self.retry(exc=RuntimeError(f'Rendering the PDF of contract {contract_id} failed'), countdown=120)
+    if result['missing']:
+        return f'Contract {contract_id} not found'
+    return f'PDF generated for contract {contract_id}'
@@ -1,5 +1,6 @@
 from celery import shared_task
 from django.db import transaction
+from contracts.ledger import record_changes
 from contracts.models import EscrowTransaction
 
 
@@ -11,8 +12,9 @@ def release_escrow_task(self, escrow_id: int):
             escrow = EscrowTransaction.objects.select_for_update().get(pk=escrow_id)
             if escrow.status in ('released', 'refunded'):
                 return 'already_finalized'
-            escrow.status = 'released'
+            previous, escrow.status = escrow.status, 'released'
             escrow.save()
+            record_changes([(escrow.pk, previous, 'released')])
             return 'released'
     except EscrowTransaction.DoesNotExist:
         return 'not_found'
@@ -0,0 +1,125 @@
+"""Batched contract PDF rendering: one query per batch, warm per-process engine, content-addressed files."""
+import os
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.utils import timezone
+from contracts.models import Contract
+from marketplace.models import Crop, Listing
+from payments import pdf
+from payments.tasks_pdf import generate_contract_pdf_task, generate_contract_pdfs_task
+
+User = get_user_model()
+
+
+@pytest.fixture
+def contracts(db):
+    buyer = User.objects.create_user('pdf_buyer', role='buyer', first_name='Asha', last_name='Rao')
+    farmer = User.objects.create_user('pdf_farmer', role='farmer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Tur'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    return Contract.objects.bulk_create([
+        Contract(listing=listing, buyer=buyer, agreed_quantity=i + 1, price_per_unit=25, total_value=25 * (i + 1),
+                 status='active', signed_at=timezone.now(), start_date=timezone.now().date())
+        for i in range(5)
+    ])
+
+
+def test_batch_is_fetched_and_rendered_with_one_query(contracts, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        fetched = pdf.fetch_contracts([c.pk for c in contracts])
+        documents = [pdf.get_renderer().render_html(contract) for contract in fetched]
+    assert len(documents) == 5
+    assert 'Asha Rao' in documents[0] and 'pdf_farmer' in documents[0] and 'Tur' in documents[0]
+    assert '"""' not in documents[0]
+
+
+def test_renderer_and_stylesheet_are_cached():
+    assert pdf.get_renderer() is pdf.get_renderer()
+    assert 'font-family' in pdf.stylesheet()
+
+
+@pytest.mark.skipif(pdf.engine_name() is not None, reason='a PDF engine is installed')
+def test_missing_engine_is_not_retried(contracts):
+    result = generate_contract_pdfs_task.apply(args=[[c.pk for c in contracts]]).get()
+    assert result['rendered'] == [] and 'weasyprint' in result['error']
+    assert generate_contract_pdf_task.apply(args=[contracts[0].pk]).get().startswith('PDF engine unavailable')
+
+
+@pytest.mark.skipif(pdf.engine_name() is None, reason='needs weasyprint or xhtml2pdf')
+def test_batch_task_attaches_documents(contracts, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    ids = [c.pk for c in contracts]
+    result = generate_contract_pdfs_task.apply(args=[ids + [10 ** 9]]).get()
+    assert result == {'rendered': ids, 'reused': [], 'skipped': [], 'missing': [10 ** 9], 'failed': []}
+    for contract in Contract.objects.filter(pk__in=ids):
+        assert contract.contract_document.read(5) == b'%PDF-'
+    assert generate_contract_pdfs_task.apply(args=[ids]).get()['skipped'] == ids
+
+
+def test_rendering_key_tracks_rendered_inputs(contracts):
+    contract = pdf.fetch_contracts([contracts[0].pk])[0]
+    key = pdf.rendering_key(contract)
+    assert pdf.rendering_key(pdf.fetch_contracts([contract.pk])[0]) == key
+    contract.signed_at += timedelta(seconds=1)
+    assert pdf.rendering_key(contract) != key
+    contract.signed_at -= timedelta(seconds=1)
+    contract.buyer.first_name = 'Usha'
+    assert pdf.rendering_key(contract) != key
+    assert pdf.document_path(key) == f'contracts/by-input/{key[:2]}/{key}.pdf'
+
+
+def test_identical_inputs_skip_rendering(contracts, settings, tmp_path, django_assert_num_queries):
+    """Current and already-stored documents never reach the engine (none is installed here)."""
+    settings.MEDIA_ROOT = str(tmp_path)
+    current, stored = pdf.fetch_contracts([contracts[0].pk, contracts[1].pk])
+    key = pdf.rendering_key(current)
+    Contract.objects.filter(pk=current.pk).update(document_hash=key, contract_document=pdf.document_path(key))
+    pdf.document_storage().save(pdf.document_path(pdf.rendering_key(stored)), ContentFile(b'%PDF-stored'))
+
+    with django_assert_num_queries(2):  # the batch SELECT and one bulk UPDATE
+        result = pdf.render_contract_pdfs([current.pk, stored.pk])
+    assert result == {'rendered': [], 'reused': [stored.pk], 'skipped': [current.pk], 'missing': [], 'failed': []}
+    stored.refresh_from_db()
+    assert stored.document_hash == pdf.rendering_key(stored)
+    assert stored.contract_document.read() == b'%PDF-stored'
+
+
+def test_gc_removes_only_old_unreferenced_files(contracts, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    storage = pdf.document_storage()
+    kept = storage.save('contracts/by-input/aa/kept.pdf', ContentFile(b'%PDF-'))
+    orphan = storage.save('contracts/contract_1_legacy.pdf', ContentFile(b'%PDF-'))
+    recent = storage.save('contracts/by-input/bb/recent.pdf', ContentFile(b'%PDF-'))
+    Contract.objects.filter(pk=contracts[0].pk).update(contract_document=kept)
+    old = (timezone.now() - timedelta(days=1)).timestamp()
+    for name in (kept, orphan):
+        os.utime(storage.path(name), (old, old))
+
+    assert pdf.collect_garbage(dry_run=True) == {'referenced': 1, 'deleted': 1, 'recent': 1}
+    assert storage.exists(orphan)
+    call_command('gc_contract_documents', stdout=StringIO())
+    assert storage.exists(kept) and storage.exists(recent) and not storage.exists(orphan)
+
+
+def test_only_failed_contracts_are_retried(contracts, settings, tmp_path, monkeypatch):
+    settings.MEDIA_ROOT = str(tmp_path)
+    flaky = f'<td>{contracts[2].pk}</td>'
+    attempts, failures = [], iter([True])
+
+    def html_to_pdf(html):
+        attempts.append(html)
+        if flaky in html and next(failures, False):
+            raise RuntimeError('font cache corrupted')
+        return b'%PDF-stub'
+
+    monkeypatch.setattr(pdf, 'html_to_pdf', html_to_pdf)
+    ids = [c.pk for c in contracts]
+    generate_contract_pdfs_task.apply(args=[ids])
+    # the whole batch once, then only the contract that failed
+    assert len(attempts) == 6 and flaky in attempts[-1]
+    assert not Contract.objects.filter(pk__in=ids, document_hash='').exists()
@@ -0,0 +1,113 @@
+"""Two-phase escrow funding: pending on accept, charge from a task, held on webhook."""
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contracts.models import Contract, EscrowBalance, EscrowTransaction, PriceProposal
+from contracts.transitions import apply_transition
+from marketplace.models import Crop, Listing
+from payments import mock_gateway
+from notifications.models import OutboxMessage
+from notifications.outbox import relay_pending
+from payments.tasks import create_escrow_charge_task
+
+User = get_user_model()
+
+
+@pytest.fixture
+def proposal(db):
+    buyer = User.objects.create_user('charge_buyer', role='buyer')
+    farmer = User.objects.create_user('charge_farmer', role='farmer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Moong'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    contract = Contract.objects.create(listing=listing, buyer=buyer, agreed_quantity=10, price_per_unit=25,
+                                       total_value=250)
+    return PriceProposal.objects.create(contract=contract, proposer=buyer, price_per_unit=24)
+
+
+def test_accept_does_not_wait_for_gateway(proposal, settings):
+    settings.PAYMENT_GATEWAY = {'LATENCY_MS': 500, 'FAILURE_RATE': 0.0, 'AUTO_WEBHOOK': True}
+    client = APIClient()
+    client.force_authenticate(proposal.contract.listing.farmer)
+    url = f'/api/v1/contracts/contracts/{proposal.contract_id}/accept_proposal/'
+    client.get(f'/api/v1/contracts/contracts/{proposal.contract_id}/')  # warm URL resolver and imports
+
+    t0 = time.perf_counter()
+    r = client.post(url, {'proposal_id': proposal.id}, format='json')
+    elapsed = time.perf_counter() - t0
+    assert r.status_code == 200 and r.data['escrow_status'] == 'pending'
+    assert elapsed < 0.5
+
+    # the charge task is committed with the acceptance; the relay hands it to a
+    # worker and the mock gateway then sends the held webhook
+    assert OutboxMessage.objects.filter(topic='escrow_charge').count() == 1
+    relay_pending()
+    escrow = EscrowTransaction.objects.get(contract_id=proposal.contract_id)
+    assert escrow.status == 'held'
+    assert escrow.charge_id.startswith('ch_')
+
+
+def test_charge_task_retries_with_same_reference(proposal, settings, monkeypatch):
+    settings.PAYMENT_GATEWAY = {'LATENCY_MS': 0, 'FAILURE_RATE': 0.0, 'AUTO_WEBHOOK': False}
+    escrow = EscrowTransaction.objects.create(contract=proposal.contract, amount=240, status='pending',
+                                              payment_reference=EscrowTransaction.new_payment_reference())
+    gateway = mock_gateway.get_gateway()
+    real_create = gateway.create_charge
+    calls = []
+
+    def flaky(reference, amount):
+        calls.append(reference)
+        if len(calls) < 3:
+            raise mock_gateway.TransientGatewayError('timeout')
+        return real_create(reference, amount)
+
+    monkeypatch.setattr(gateway, 'create_charge', flaky)
+    create_escrow_charge_task.delay(escrow.pk)
+
+    escrow.refresh_from_db()
+    assert calls == [escrow.payment_reference] * 3
+    assert escrow.status == 'pending' and escrow.charge_id
+    # idempotent on the reference: a replayed call returns the same charge
+    assert real_create(escrow.payment_reference, 240)['charge_id'] == escrow.charge_id
+    assert create_escrow_charge_task.delay(escrow.pk).get() == 'skipped'
+
+
+def test_cancel_after_charge_refunds_through_gateway(proposal, settings):
+    settings.PAYMENT_GATEWAY = {'LATENCY_MS': 0, 'FAILURE_RATE': 0.0, 'AUTO_WEBHOOK': False}
+    escrow = EscrowTransaction.objects.create(contract=proposal.contract, amount=240, status='pending',
+                                              payment_reference=EscrowTransaction.new_payment_reference())
+    create_escrow_charge_task.delay(escrow.pk)
+    client = APIClient()
+    client.force_authenticate(proposal.contract.buyer)
+    assert client.post(f'/api/v1/contracts/contracts/{proposal.contract_id}/cancel/').status_code == 200
+
+    # the buyer has been charged, so the escrow waits for the gateway's refund instead of being voided
+    escrow.refresh_from_db()
+    assert escrow.status == 'pending'
+    settings.PAYMENT_GATEWAY = {**settings.PAYMENT_GATEWAY, 'AUTO_WEBHOOK': True}
+    assert relay_pending()['sent'] >= 1
+    escrow.refresh_from_db()
+    assert escrow.status == 'refunded'
+    assert EscrowBalance.objects.get(party=proposal.contract.buyer).refunded == 240
+    assert mock_gateway.get_gateway().refund_charge(escrow.payment_reference)['status'] == 'refunded'
+
+
+def test_cancel_during_charge_refunds_the_late_charge(proposal, settings, monkeypatch):
+    settings.PAYMENT_GATEWAY = {'LATENCY_MS': 0, 'FAILURE_RATE': 0.0, 'AUTO_WEBHOOK': False}
+    escrow = EscrowTransaction.objects.create(contract=proposal.contract, amount=240, status='pending',
+                                              payment_reference=EscrowTransaction.new_payment_reference())
+    gateway = mock_gateway.get_gateway()
+    real_create, refunds = gateway.create_charge, []
+
+    def cancelled_midway(reference, amount):
+        apply_transition(proposal.contract, 'cancel')
+        return real_create(reference, amount)
+
+    monkeypatch.setattr(gateway, 'create_charge', cancelled_midway)
+    monkeypatch.setattr(gateway, 'refund_charge', refunds.append)
+    assert create_escrow_charge_task.delay(escrow.pk).get() == 'refunding'
+    assert refunds == [escrow.payment_reference]
+    escrow.refresh_from_db()
+    assert escrow.status == 'refunded' and escrow.charge_id
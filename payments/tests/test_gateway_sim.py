@@ -0,0 +1,98 @@
+"""The gateway simulator over real sockets: HTTP client errors, idempotency and webhook chaos."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from payments import mock_gateway
+from payments.gateway_sim import GatewaySimulator, Latency, SimulatorConfig, SimulatorThread
+
+
+@pytest.fixture
+def receiver():
+    """A local webhook endpoint recording every delivery in arrival order."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/hook/', received
+    server.shutdown()
+
+
+def start(**config):
+    thread = SimulatorThread(GatewaySimulator(SimulatorConfig(**config)))
+    return thread, thread.start()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_latency_specs():
+    rng = random.Random(1)
+    assert Latency('fixed:50').sample(rng) == 0.05
+    assert all(0.02 <= Latency('uniform:20,30').sample(rng) <= 0.03 for _ in range(50))
+    assert Latency('lognormal:80,0.5').sample(rng) > 0
+    for bad in ('fixed', 'uniform:5', 'gamma:1', 'exp:-1', 'fixed:x'):
+        with pytest.raises(ValueError):
+            Latency(bad)
+
+
+def test_http_gateway_is_idempotent_and_classifies_errors(receiver):
+    webhook_url, received = receiver
+    thread, url = start(latency=Latency('fixed:0'), webhook_delay=Latency('fixed:0'))
+    try:
+        gateway = mock_gateway.HttpGateway(url, webhook_url, timeout=2)
+        charge = gateway.create_charge('ref_1', '250.00')
+        assert gateway.create_charge('ref_1', '250.00')['charge_id'] == charge['charge_id']
+        assert wait_for(lambda: len(received) == 2)
+        assert [(event['status'], event['sequence']) for event in received] == [('pending', 1), ('held', 2)]
+
+        thread.simulator.config.error_rate = 1.0
+        with pytest.raises(mock_gateway.TransientGatewayError):
+            gateway.create_charge('ref_2', '10')
+        thread.simulator.config.error_rate = 0.0
+        thread.simulator.config.timeout_rate, thread.simulator.config.timeout_seconds = 1.0, 1.0
+        with pytest.raises(mock_gateway.TransientGatewayError):
+            mock_gateway.HttpGateway(url, timeout=0.2).create_charge('ref_3', '10')
+        assert 'ref_2' not in thread.simulator.charges and 'ref_3' not in thread.simulator.charges
+    finally:
+        thread.stop()
+    with pytest.raises(mock_gateway.TransientGatewayError):
+        mock_gateway.HttpGateway(url, timeout=0.5).create_charge('ref_4', '10')
+
+
+def test_webhooks_are_duplicated_and_reordered(receiver, settings):
+    webhook_url, received = receiver
+    thread, url = start(latency=Latency('fixed:0'), webhook_delay=Latency('fixed:0'), duplicate_rate=1.0,
+                        reorder_rate=1.0, reorder_delay=Latency('uniform:0,300'), seed=3)
+    settings.PAYMENT_GATEWAY = {'URL': url, 'WEBHOOK_URL': webhook_url, 'TIMEOUT': 2}
+    try:
+        for i in range(5):
+            mock_gateway.get_gateway().create_charge(f'ref_{i}', '1')
+        assert wait_for(lambda: len(received) == 20)
+    finally:
+        thread.stop()
+    assert thread.simulator.stats['events_duplicated'] == 10
+    assert len({event['event_id'] for event in received}) == 10
+    arrival = [event['sequence'] for event in received if event['payment_reference'] == 'ref_0']
+    assert sorted(arrival) == [1, 1, 2, 2]
+    # with every event held back by a random delay, some charge sees its events out of order
+    assert any(
+        [event['sequence'] for event in received if event['payment_reference'] == f'ref_{i}'] != [1, 1, 2, 2]
+        for i in range(5)
+    )
@@ -12,7 +12,7 @@ User = get_user_model()
 
 
 @pytest.mark.django_db
-def test_webhook_idempotency():
+def test_webhook_idempotency(django_capture_on_commit_callbacks):
     """Test that posting the same event twice is idempotent."""
     buyer = User.objects.create_user('buyer3', password='pass1234', role='buyer')
     farmer = User.objects.create_user('farmer3', password='pass1234', role='farmer')
@@ -35,9 +35,10 @@ def test_webhook_idempotency():
         'status': 'released',
     }
 
-    # First call
-    r1 = client.post(url, payload, format='json')
-    assert r1.status_code == 200
+    # First call: acknowledged, then applied by the processing task scheduled on commit
+    with django_capture_on_commit_callbacks(execute=True):
+        r1 = client.post(url, payload, format='json')
+    assert r1.status_code == 202
     escrow.refresh_from_db()
     assert escrow.status == 'released'
 
@@ -51,7 +52,7 @@ def test_webhook_idempotency():
 
 
 @pytest.mark.django_db
-def test_escrow_release_via_webhook():
+def test_escrow_release_via_webhook(django_capture_on_commit_callbacks):
     """Test that escrow transitions through states via webhook."""
     buyer = User.objects.create_user('buyer4', password='pass1234', role='buyer')
     farmer = User.objects.create_user('farmer4', password='pass1234', role='farmer')
@@ -70,21 +71,23 @@ def test_escrow_release_via_webhook():
     webhook_url = reverse('payments-mock-webhook')
 
     # Transition pending -> held
-    r1 = client.post(webhook_url, {
-        'event_id': 'evt_held_001',
-        'payment_reference': 'mock_release_test',
-        'status': 'held'
-    }, format='json')
-    assert r1.status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        r1 = client.post(webhook_url, {
+            'event_id': 'evt_held_001',
+            'payment_reference': 'mock_release_test',
+            'status': 'held'
+        }, format='json')
+    assert r1.status_code == 202
     escrow.refresh_from_db()
     assert escrow.status == 'held'
 
     # Transition held -> released
-    r2 = client.post(webhook_url, {
-        'event_id': 'evt_released_001',
-        'payment_reference': 'mock_release_test',
-        'status': 'released'
-    }, format='json')
-    assert r2.status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        r2 = client.post(webhook_url, {
+            'event_id': 'evt_released_001',
+            'payment_reference': 'mock_release_test',
+            'status': 'released'
+        }, format='json')
+    assert r2.status_code == 202
     escrow.refresh_from_db()
     assert escrow.status == 'released'
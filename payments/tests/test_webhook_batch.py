@@ -0,0 +1,134 @@
+"""Insert-or-ignore webhook idempotency, concurrent duplicates and the batch endpoint."""
+import threading
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contracts.models import Contract, EscrowTransaction
+from marketplace.models import Crop, Listing
+from payments import webhooks
+from payments.models import WebhookEvent
+
+User = get_user_model()
+BATCH_URL = '/api/v1/payments/mock/webhook/batch/'
+
+
+def make_escrows(count, status='pending'):
+    farmer = User.objects.create_user('wh_farmer', role='farmer')
+    buyer = User.objects.create_user('wh_buyer', role='buyer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Bajra'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    contracts = Contract.objects.bulk_create([
+        Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25)
+        for _ in range(count)
+    ])
+    return EscrowTransaction.objects.bulk_create([
+        EscrowTransaction(contract=contract, amount=25, status=status, payment_reference=f'wh_{i}')
+        for i, contract in enumerate(contracts)
+    ])
+
+
+@pytest.mark.django_db
+def test_single_event_is_applied_in_constant_queries(django_assert_max_num_queries):
+    make_escrows(1)
+    payload = {'event_id': 'evt_1', 'payment_reference': 'wh_0', 'status': 'held'}
+    # savepoint, INSERT ... ON CONFLICT, escrow SELECT FOR UPDATE + UPDATE, three ledger writes, release
+    with django_assert_max_num_queries(8):
+        assert webhooks.apply_webhook_event('evt_1', 'wh_0', 'held', payload) == webhooks.PROCESSED
+    assert webhooks.apply_webhook_event('evt_1', 'wh_0', 'held', payload) == webhooks.DUPLICATE
+    # an unknown escrow leaves no record, so the provider's retry can still apply
+    assert webhooks.apply_webhook_event('evt_2', 'nope', 'held', payload) == webhooks.NOT_FOUND
+    assert not WebhookEvent.objects.filter(event_id='evt_2').exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_duplicates_never_error():
+    make_escrows(1)
+    outcomes, errors = [], []
+    barrier = threading.Barrier(8)
+
+    def deliver():
+        barrier.wait()
+        try:
+            for _ in range(50):
+                try:
+                    outcomes.append(webhooks.apply_webhook_event('evt_race', 'wh_0', 'held', {'event_id': 'evt_race'}))
+                    return
+                except OperationalError:
+                    # SQLite's shared-cache test database reports table locks instead of waiting;
+                    # the provider would redeliver after an error response
+                    time.sleep(0.01)
+        except Exception as exc:  # pragma: no cover - the IntegrityError this design rules out
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=deliver) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(outcomes) == [webhooks.DUPLICATE] * 7 + [webhooks.PROCESSED]
+    assert WebhookEvent.objects.filter(event_id='evt_race').count() == 1
+
+
+@pytest.mark.django_db
+def test_batch_endpoint_outcomes():
+    make_escrows(3)
+    WebhookEvent.objects.create(event_id='seen', payload={}, processed_at=timezone.now(), outcome='processed')
+    events = [
+        {'event_id': 'a', 'payment_reference': 'wh_0', 'status': 'held'},
+        {'event_id': 'a', 'payment_reference': 'wh_0', 'status': 'held'},
+        {'event_id': 'seen', 'payment_reference': 'wh_1', 'status': 'held'},
+        {'event_id': 'b', 'payment_reference': 'wh_1', 'status': 'released'},
+        {'event_id': 'c', 'payment_reference': 'missing', 'status': 'held'},
+        {'event_id': 'd', 'payment_reference': 'wh_2', 'status': 'teleported'},
+        {'event_id': 'e', 'status': 'held'},
+        {'event_id': 'f', 'payment_reference': 'wh_2', 'status': 'held'},
+    ]
+    client = APIClient()
+    r = client.post(BATCH_URL, events, format='json')
+    assert r.status_code == 202
+    assert [result['outcome'] for result in r.data['results']] == [
+        'accepted', 'duplicate', 'duplicate', 'accepted', 'accepted', 'invalid_status', 'missing_fields',
+        'accepted',
+    ]
+    assert r.data['counts'] == {'accepted': 4, 'duplicate': 2, 'invalid_status': 1, 'missing_fields': 1}
+    assert EscrowTransaction.objects.filter(status='pending').count() == 3  # nothing applied yet
+
+    assert webhooks.process_pending() == {'claimed': 4, 'processed': 3, 'retrying': 1}
+    statuses = dict(EscrowTransaction.objects.values_list('payment_reference', 'status'))
+    assert statuses == {'wh_0': 'held', 'wh_1': 'released', 'wh_2': 'held'}
+    # the whole batch redelivered is all duplicates
+    again = client.post(BATCH_URL, {'events': events}, format='json').data['counts']
+    assert again == {'duplicate': 6, 'invalid_status': 1, 'missing_fields': 1}
+    assert client.post(BATCH_URL, {'events': 'nope'}, format='json').status_code == 400
+
+
+@pytest.mark.django_db
+def test_malformed_fields_are_rejected_not_500():
+    long_id = 'x' * 256
+    events = [
+        {'event_id': ['a'], 'payment_reference': 'wh_0', 'status': 'held'},
+        {'event_id': 'g', 'payment_reference': 'wh_0', 'status': {'held': 1}},
+        {'event_id': 123, 'payment_reference': 'wh_0', 'status': 'held'},
+        {'event_id': long_id, 'payment_reference': 'wh_0', 'status': 'held'},
+        {'event_id': 'h', 'payment_reference': {'ref': 1}, 'status': 'held'},
+        {'event_id': 'i', 'payment_reference': 'wh_0', 'status': 'held'},
+    ]
+    client = APIClient()
+    r = client.post(BATCH_URL, events, format='json')
+    assert r.status_code == 202
+    assert [result['outcome'] for result in r.data['results']] == [
+        'missing_fields', 'invalid_status', 'missing_fields', 'missing_fields', 'missing_fields', 'accepted',
+    ]
+    assert list(WebhookEvent.objects.values_list('event_id', flat=True)) == ['i']
+
+    for malformed in events[:5] + [['not', 'an', 'event']]:
+        r = client.post('/api/v1/payments/mock/webhook/', malformed, format='json')
+        assert r.status_code == 400
+    assert WebhookEvent.objects.count() == 1
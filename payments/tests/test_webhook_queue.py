@@ -0,0 +1,105 @@
+"""Accept-fast webhook queue: ordering along the status lattice, retries and metrics."""
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from contracts.models import Contract, EscrowTransaction
+from marketplace.models import Crop, Listing
+from payments import webhooks
+from payments.models import WebhookEvent
+
+User = get_user_model()
+URL = '/api/v1/payments/mock/webhook/'
+
+
+@pytest.fixture
+def escrows(db):
+    farmer = User.objects.create_user('q_farmer', role='farmer')
+    buyer = User.objects.create_user('q_buyer', role='buyer')
+    listing = Listing.objects.create(farmer=farmer, crop=Crop.objects.create(name='Jowar'), quantity_available=100,
+                                     harvest_date=timezone.now().date(), price_floor=20)
+    contracts = Contract.objects.bulk_create([
+        Contract(listing=listing, buyer=buyer, agreed_quantity=1, price_per_unit=25, total_value=25)
+        for _ in range(3)
+    ])
+    return EscrowTransaction.objects.bulk_create([
+        EscrowTransaction(contract=contract, amount=25, status='pending', payment_reference=f'q_{i}')
+        for i, contract in enumerate(contracts)
+    ])
+
+
+def event(event_id, reference, status, **extra):
+    return {'event_id': event_id, 'payment_reference': reference, 'status': status, **extra}
+
+
+def statuses():
+    return dict(EscrowTransaction.objects.values_list('payment_reference', 'status'))
+
+
+def test_receipt_is_one_insert_and_applies_nothing(escrows, settings):
+    settings.QUERY_BUDGET = {'ENABLED': True, 'RAISE': True, 'DEFAULT': None, 'N_PLUS_ONE_THRESHOLD': 3}
+    settings.DEBUG = True  # RAISE only applies with DEBUG
+    r = APIClient().post(URL, event('e1', 'q_0', 'held'), format='json')
+    assert r.status_code == 202
+    assert statuses()['q_0'] == 'pending'
+    queued = WebhookEvent.objects.get(event_id='e1')
+    assert (queued.payment_reference, queued.status, queued.processed_at) == ('q_0', 'held', None)
+
+
+def test_late_held_never_overwrites_released(escrows):
+    webhooks.accept_events([
+        event('r0', 'q_0', 'released'), event('h0', 'q_0', 'held'),
+        # the provider's sequence orders events that arrive swapped
+        event('r1', 'q_1', 'released', sequence=2), event('h1', 'q_1', 'held', sequence=1),
+        event('h2', 'q_2', 'held'), event('f2', 'q_2', 'refunded'),
+    ])
+    assert webhooks.process_pending(batch_size=2) == {'claimed': 6, 'processed': 5, 'stale': 1}
+    assert statuses() == {'q_0': 'released', 'q_1': 'released', 'q_2': 'refunded'}
+    outcomes = dict(WebhookEvent.objects.values_list('event_id', 'outcome'))
+    assert outcomes['h0'] == webhooks.STALE and outcomes['h1'] == webhooks.PROCESSED
+
+    # a final status is never changed, by a later batch or by the synchronous path
+    webhooks.accept_events([event('h0b', 'q_0', 'held'), event('f0', 'q_0', 'refunded')])
+    assert webhooks.process_pending() == {'claimed': 2, 'stale': 2}
+    assert webhooks.apply_webhook_event('h0c', 'q_0', 'held', {}) == webhooks.STALE
+    assert statuses()['q_0'] == 'released'
+
+
+def test_unknown_escrow_is_retried_with_backoff(escrows, settings):
+    settings.WEBHOOK_QUEUE = {'MAX_ATTEMPTS': 2}
+    webhooks.accept_events([event('early', 'q_new', 'held')])
+    assert webhooks.process_pending() == {'claimed': 1, 'retrying': 1}
+    assert webhooks.process_pending() == {'claimed': 0}  # backing off
+
+    WebhookEvent.objects.filter(event_id='early').update(available_at=timezone.now())
+    assert webhooks.process_pending() == {'claimed': 1, 'not_found': 1}
+    assert WebhookEvent.objects.get(event_id='early').outcome == webhooks.NOT_FOUND
+
+
+def test_queue_metrics(escrows):
+    webhooks.accept_events([event('m1', 'q_0', 'held'), event('m2', 'q_1', 'held')])
+    WebhookEvent.objects.filter(event_id='m1').update(received_at=timezone.now() - timedelta(seconds=30))
+    stats = webhooks.queue_stats()
+    assert stats['pending'] == 2 and stats['oldest_pending_age_seconds'] >= 30
+
+    webhooks.process_pending()
+    stats = webhooks.queue_stats()
+    assert stats['pending'] == 0 and stats['processing_lag_seconds'] >= 15
+    lines = webhooks.prometheus_lines()
+    assert 'webhook_queue_events{state="pending"} 0' in lines
+    assert 'webhook_events_processed_recent{outcome="processed"} 2' in lines
+
+
+def test_malformed_events_are_never_queued(escrows, django_capture_on_commit_callbacks):
+    malformed = [
+        event(7, 'q_0', 'held'), event(['e'], 'q_0', 'held'), event('x' * 256, 'q_0', 'held'),
+        event('m', 'q_0', ['held']), event('n', 'q_' + '0' * 300, 'held'), 'not an event',
+    ]
+    with django_capture_on_commit_callbacks() as callbacks:
+        outcomes = webhooks.accept_events(malformed)
+    assert outcomes == [webhooks.MISSING_FIELDS] * 3 + [webhooks.INVALID_STATUS] + [webhooks.MISSING_FIELDS] * 2
+    assert not WebhookEvent.objects.exists()
+    assert callbacks == []  # no processing kicked
+    assert webhooks.process_pending() == {'claimed': 0}
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import MockWebhookView
+from .views import MockWebhookBatchView, MockWebhookView
 from .views_trigger import MockTriggerView
 
 urlpatterns = [
     path('mock/webhook/', MockWebhookView.as_view(), name='payments-mock-webhook'),
+    path('mock/webhook/batch/', MockWebhookBatchView.as_view(), name='payments-mock-webhook-batch'),
     path('mock/trigger/', MockTriggerView.as_view(), name='payments-mock-trigger'),
 ]
@@ -1,44 +1,55 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from django.db import transaction
-from .models import WebhookEvent
-from contracts.models import EscrowTransaction, Contract
+from collections import Counter
+
+from . import webhooks
+from .webhooks import MAX_BATCH_EVENTS, accept_events
 
 
 class MockWebhookView(APIView):
     """Accepts webhook callbacks from the mock gateway.
 
     Payload expected: {"event_id": "<id>", "payment_reference": "<ref>", "status": "held|released|refunded"}
-    This view is idempotent — we store processed event_id in WebhookEvent and ignore duplicates.
+    The event is recorded and acknowledged with 202; it is applied to the
+    escrow asynchronously (payments.webhooks.process_pending). A redelivered
+    event_id is acknowledged with 200 and ignored.
     """
     permission_classes = [permissions.AllowAny]
+    # INSERT ... ON CONFLICT inside a transaction (a savepoint when nested)
+    query_budget = 3
 
     def post(self, request):
-        data = request.data
-        event_id = data.get('event_id')
-        payment_reference = data.get('payment_reference')
-        new_status = data.get('status')
-
-        if not event_id or not payment_reference or not new_status:
+        outcome = accept_events([request.data])[0]
+        if outcome == webhooks.MISSING_FIELDS:
             return Response({'detail': 'Missing fields'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # idempotency: if we've seen this event_id, return 200
-        if WebhookEvent.objects.filter(event_id=event_id).exists():
+        if outcome == webhooks.DUPLICATE:
             return Response({'detail': 'Already processed'}, status=status.HTTP_200_OK)
+        if outcome == webhooks.INVALID_STATUS:
+            return Response({'detail': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': 'accepted'}, status=status.HTTP_202_ACCEPTED)
 
-        # process event
-        with transaction.atomic():
-            WebhookEvent.objects.create(event_id=event_id, payload=data)
-            try:
-                escrow = EscrowTransaction.objects.select_for_update().get(payment_reference=payment_reference)
-            except EscrowTransaction.DoesNotExist:
-                return Response({'detail': 'Escrow not found'}, status=status.HTTP_404_NOT_FOUND)
 
-            if new_status not in dict(EscrowTransaction.STATUS_CHOICES):
-                return Response({'detail': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+class MockWebhookBatchView(APIView):
+    """Accepts a JSON array of webhook events (or ``{"events": [...]}``) in one request.
 
-            escrow.status = new_status
-            escrow.save()
+    Each event is recorded as by MockWebhookView; the response lists one
+    outcome per event, in order, plus counts per outcome.
+    """
+    permission_classes = [permissions.AllowAny]
+    # one INSERT per INSERT_CHUNK_ROWS events inside a transaction
+    query_budget = MAX_BATCH_EVENTS // webhooks.INSERT_CHUNK_ROWS + 2
 
-        return Response({'detail': 'processed'})
+    def post(self, request):
+        events = request.data.get('events') if isinstance(request.data, dict) else request.data
+        if not isinstance(events, list):
+            return Response({'detail': 'Expected a JSON array of events'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(events) > MAX_BATCH_EVENTS:
+            return Response({'detail': f'At most {MAX_BATCH_EVENTS} events per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        outcomes = accept_events(events)
+        return Response({
+            'results': [{'event_id': event.get('event_id') if isinstance(event, dict) else None, 'outcome': outcome}
+                        for event, outcome in zip(events, outcomes)],
+            'counts': dict(Counter(outcomes)),
+        }, status=status.HTTP_202_ACCEPTED)
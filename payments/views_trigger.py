@@ -1,25 +1,32 @@
+import uuid
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .views import MockWebhookView
+
+from . import webhooks
 
 
 class MockTriggerView(APIView):
-    """Simulate a payment provider sending a webhook by POSTing to our webhook handler.
+    """Simulate a payment provider sending a webhook.
 
-    This endpoint creates an event_id and forwards payload to the webhook processor.
+    Fills in an event_id if the payload has none and records the event as the
+    webhook endpoint would (payments.webhooks.accept_events). For realistic
+    latency, failures and duplicate or reordered delivery over HTTP, run
+    ``manage.py run_gateway_simulator``.
     """
 
     permission_classes = []
+    query_budget = 3
 
     def post(self, request):
-        payload = request.data.copy()
-        import uuid
-        event_id = payload.get('event_id') or f"mockevt_{uuid.uuid4().hex}"
-        payload['event_id'] = event_id
-        # forward to webhook view
-        view = MockWebhookView.as_view()
-        # call view directly for internal handling
-        response = view(request._request.__class__(request._request.environ)) if False else None
-        # Simpler: return constructed payload to the client; the webhook endpoint can be called independently in tests.
-        return Response({'event_id': event_id, 'payload': payload}, status=status.HTTP_200_OK)
+        payload = dict(request.data.items())
+        payload['event_id'] = payload.get('event_id') or f"mockevt_{uuid.uuid4().hex}"
+        outcome = webhooks.accept_events([payload])[0]
+        if outcome == webhooks.ACCEPTED:
+            code = status.HTTP_202_ACCEPTED
+        elif outcome == webhooks.DUPLICATE:
+            code = status.HTTP_200_OK
+        else:
+            code = status.HTTP_400_BAD_REQUEST
+        return Response({'event_id': payload['event_id'], 'payload': payload, 'outcome': outcome}, status=code)
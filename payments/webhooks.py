@@ -0,0 +1,338 @@
+"""Gateway webhook processing shared by the webhook views and the mock gateway.
+
+Receiving a webhook only records it: ``accept_events`` stores each event
+with a single insert-or-ignore of its id
+(``INSERT ... ON CONFLICT (event_id) DO NOTHING RETURNING event_id``) and
+acknowledges it. A redelivery inserts nothing and is reported as a
+duplicate, with no check-then-insert window for racing deliveries. The
+recorded events are a queue that ``process_pending`` drains asynchronously
+(``process_webhook_events_task``, kicked after each commit and run by beat).
+
+Escrow statuses only move up a lattice, ``pending < held < released | refunded``:
+an event that would move an escrow down or sideways, such as a late ``held``
+after ``released``, is recorded as ``stale`` and changes nothing. Events
+for one ``payment_reference`` are applied in order (the provider's
+``sequence`` when the payload has one, then arrival) while that escrow's row
+is locked, so concurrent processors serialise per escrow. An event whose
+escrow does not exist yet is retried with backoff until
+``WEBHOOK_QUEUE['MAX_ATTEMPTS']``.
+"""
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+
+from contracts.ledger import record_changes
+from contracts.models import EscrowTransaction
+from notifications.outbox import backoff
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+ACCEPTED = 'accepted'
+PROCESSED = 'processed'
+STALE = 'stale'
+DUPLICATE = 'duplicate'
+NOT_FOUND = 'not_found'
+INVALID_STATUS = 'invalid_status'
+MISSING_FIELDS = 'missing_fields'
+RETRYING = 'retrying'
+
+REQUIRED_FIELDS = ('event_id', 'payment_reference', 'status')
+MAX_BATCH_EVENTS = 1000
+# nine parameters per row keeps a statement under SQLite's variable limit
+INSERT_CHUNK_ROWS = 100
+
+# released and refunded are both final
+STATUS_RANK = {'pending': 0, 'held': 1, 'released': 2, 'refunded': 2}
+
+
+def queue_settings() -> Dict:
+    defaults = {'BATCH_SIZE': 500, 'MAX_ATTEMPTS': 8, 'PROCESS_ON_COMMIT': True}
+    return {**defaults, **getattr(settings, 'WEBHOOK_QUEUE', {})}
+
+
+def statuses_below(status: str) -> List[str]:
+    return [candidate for candidate, rank in STATUS_RANK.items() if rank < STATUS_RANK[status]]
+
+
+def validate_event(event) -> Optional[str]:
+    """The rejection outcome for a malformed event, or None.
+
+    ``event_id`` and ``payment_reference`` must be non-empty strings that fit
+    their columns; anything else is treated as missing.
+    """
+    if not isinstance(event, dict) or not all(event.get(name) for name in REQUIRED_FIELDS):
+        return MISSING_FIELDS
+    for name in ('event_id', 'payment_reference'):
+        value = event[name]
+        if not isinstance(value, str) or len(value) > WebhookEvent._meta.get_field(name).max_length:
+            return MISSING_FIELDS
+    if not isinstance(event['status'], str) or event['status'] not in STATUS_RANK:
+        return INVALID_STATUS
+    return None
+
+
+def _supports_insert_returning() -> bool:
+    return connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_rows_from_bulk_insert
+
+
+def claim_events(events: Iterable[Dict], processed: bool = False) -> Set[str]:
+    """Record validated events, ignoring ids already recorded; returns the ids inserted.
+
+    With ``processed`` the rows are written as already applied (the caller
+    applies them in the same transaction) instead of queued.
+    """
+    now = timezone.now()
+    rows = [{
+        'event_id': event['event_id'],
+        'payment_reference': event['payment_reference'],
+        'status': event['status'],
+        'payload': event,
+        'received_at': now,
+        'available_at': now,
+        'attempts': 1 if processed else 0,
+        'processed_at': now if processed else None,
+        'outcome': PROCESSED if processed else '',
+    } for event in events]
+    if not rows:
+        return set()
+    if not _supports_insert_returning():
+        claimed = set()
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    WebhookEvent.objects.create(**row)
+                claimed.add(row['event_id'])
+            except IntegrityError:
+                pass
+        return claimed
+
+    opts = WebhookEvent._meta
+    fields = [opts.get_field(name) for name in rows[0]]
+    quote = connection.ops.quote_name
+    placeholders = f'({", ".join(["%s"] * len(fields))})'
+    claimed = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+            chunk = rows[start:start + INSERT_CHUNK_ROWS]
+            params = []
+            for row in chunk:
+                params += [field.get_db_prep_save(row[field.name], connection) for field in fields]
+            cursor.execute(
+                f'INSERT INTO {quote(opts.db_table)} ({", ".join(quote(field.column) for field in fields)}) '
+                f'VALUES {", ".join([placeholders] * len(chunk))} '
+                f'ON CONFLICT ({quote("event_id")}) DO NOTHING RETURNING {quote("event_id")}',
+                params,
+            )
+            claimed.update(row[0] for row in cursor.fetchall())
+    return claimed
+
+
+def _schedule_processing() -> None:
+    from .tasks import process_webhook_events_task
+
+    try:
+        process_webhook_events_task.delay()
+    except Exception:  # broker down: the beat schedule drains the queue
+        logger.warning('Could not schedule webhook processing', exc_info=True)
+
+
+def accept_events(events: List) -> List[str]:
+    """Record webhook events for asynchronous processing; one outcome per event, in order.
+
+    One multi-row insert-or-ignore per ``INSERT_CHUNK_ROWS`` events; a
+    repeated event id, in the batch or already recorded, is a duplicate.
+    """
+    outcomes: List[str] = [''] * len(events)
+    candidates, seen = [], set()
+    for index, event in enumerate(events):
+        rejected = validate_event(event)
+        if rejected:
+            outcomes[index] = rejected
+        elif event['event_id'] in seen:
+            outcomes[index] = DUPLICATE
+        else:
+            seen.add(event['event_id'])
+            candidates.append((index, event))
+
+    with transaction.atomic():
+        claimed = claim_events(event for _, event in candidates)
+        if claimed and queue_settings()['PROCESS_ON_COMMIT']:
+            transaction.on_commit(_schedule_processing)
+    for index, event in candidates:
+        outcomes[index] = ACCEPTED if event['event_id'] in claimed else DUPLICATE
+    return outcomes
+
+
+def apply_webhook_event(event_id: str, payment_reference: str, new_status: str, payload: dict) -> str:
+    """Record ``event_id`` and apply it now, exactly once; returns the outcome.
+
+    For callers that are already asynchronous (the mock gateway's webhook
+    task). Nothing is recorded if the escrow does not exist.
+    """
+    if new_status not in STATUS_RANK:
+        return INVALID_STATUS
+    event = {**payload, 'event_id': event_id, 'payment_reference': payment_reference, 'status': new_status}
+    with transaction.atomic():
+        if not claim_events([event], processed=True):
+            return DUPLICATE
+        escrow = EscrowTransaction.objects.select_for_update().filter(payment_reference=payment_reference) \
+            .values_list('pk', 'status').first()
+        if escrow is None:
+            transaction.set_rollback(True)
+            return NOT_FOUND
+        pk, status = escrow
+        if STATUS_RANK[new_status] > STATUS_RANK.get(status, 0):
+            EscrowTransaction.objects.filter(pk=pk).update(status=new_status)
+            record_changes([(pk, status, new_status)])
+            return PROCESSED
+        WebhookEvent.objects.filter(event_id=event_id).update(outcome=STALE)
+    return STALE
+
+
+def _order_key(event: WebhookEvent):
+    sequence = event.payload.get('sequence') if isinstance(event.payload, dict) else None
+    if isinstance(sequence, int) and not isinstance(sequence, bool):
+        return (0, sequence, event.pk)
+    return (1, 0, event.pk)
+
+
+def apply_events(events: List[WebhookEvent]) -> Dict[int, str]:
+    """Apply recorded events along the status lattice; returns the outcome per event pk.
+
+    Must run inside a transaction. The escrows involved are locked with one
+    ``SELECT ... FOR UPDATE`` in id order, written with at most one UPDATE
+    per resulting status and recorded in the escrow ledger.
+    """
+    by_reference = defaultdict(list)
+    for event in events:
+        by_reference[event.payment_reference].append(event)
+    current, escrow_ids = {}, {}
+    for reference, pk, status in (
+        EscrowTransaction.objects.select_for_update().filter(payment_reference__in=list(by_reference))
+        .order_by('pk').values_list('payment_reference', 'pk', 'status')
+    ):
+        current[reference], escrow_ids[reference] = status, pk
+    outcomes, moved = {}, defaultdict(list)
+    for reference, reference_events in by_reference.items():
+        if reference not in current:
+            outcomes.update((event.pk, NOT_FOUND) for event in reference_events)
+            continue
+        status = current[reference]
+        for event in sorted(reference_events, key=_order_key):
+            if STATUS_RANK[event.status] > STATUS_RANK.get(status, 0):
+                status = event.status
+                outcomes[event.pk] = PROCESSED
+            else:
+                outcomes[event.pk] = STALE
+        if status != current[reference]:
+            moved[status].append(reference)
+    for status, references in moved.items():
+        EscrowTransaction.objects.filter(
+            payment_reference__in=references, status__in=statuses_below(status),
+        ).update(status=status)
+    record_changes(
+        (escrow_ids[reference], current[reference], status)
+        for status, references in moved.items() for reference in references
+    )
+    return outcomes
+
+
+def pending_events():
+    return WebhookEvent.objects.filter(processed_at__isnull=True, available_at__lte=timezone.now()) \
+        .order_by('available_at', 'id')
+
+
+def process_batch(batch_size: int = None) -> Dict[str, int]:
+    """Claim and apply one batch of queued events; returns counts per outcome.
+
+    The batch is claimed with ``FOR UPDATE SKIP LOCKED``, so several
+    processors can run side by side.
+    """
+    config = queue_settings()
+    batch_size = batch_size or config['BATCH_SIZE']
+    with transaction.atomic():
+        claimed: List[WebhookEvent] = list(
+            pending_events().select_for_update(skip_locked=True)
+            .only('id', 'payment_reference', 'status', 'payload', 'attempts')[:batch_size]
+        )
+        if not claimed:
+            return {'claimed': 0}
+        outcomes = apply_events(claimed)
+        now = timezone.now()
+        counts = Counter(claimed=len(claimed))
+        for event in claimed:
+            event.attempts += 1
+            outcome = outcomes[event.pk]
+            if outcome == NOT_FOUND and event.attempts < config['MAX_ATTEMPTS']:
+                # the escrow may not be committed yet
+                event.available_at = now + backoff(event.attempts)
+                outcome = RETRYING
+            else:
+                event.processed_at = now
+                event.outcome = outcome
+            counts[outcome] += 1
+        WebhookEvent.objects.bulk_update(claimed, ['attempts', 'available_at', 'processed_at', 'outcome'],
+                                         batch_size=500)
+    return dict(counts)
+
+
+def process_pending(batch_size: int = None, max_batches: int = 100) -> Dict[str, int]:
+    """Process batches until the queue is drained (or ``max_batches`` is reached)."""
+    totals = Counter(claimed=0)
+    for _ in range(max_batches):
+        result = process_batch(batch_size)
+        totals.update(result)
+        if not result['claimed']:
+            break
+    return dict(totals)
+
+
+def queue_stats(window: timedelta = timedelta(minutes=5)) -> Dict:
+    """Queue depth, oldest queued event's age and recent receipt-to-processing lag."""
+    now = timezone.now()
+    queued = WebhookEvent.objects.filter(processed_at__isnull=True).aggregate(
+        pending=Count('id', filter=Q(attempts=0)),
+        retrying=Count('id', filter=Q(attempts__gt=0)),
+        oldest=Min('received_at'),
+    )
+    recent = WebhookEvent.objects.filter(processed_at__gte=now - window)
+    lag = recent.aggregate(lag=Avg(F('processed_at') - F('received_at')))['lag']
+    return {
+        'pending': queued['pending'],
+        'retrying': queued['retrying'],
+        'oldest_pending_age_seconds': (now - queued['oldest']).total_seconds() if queued['oldest'] else 0.0,
+        'processing_lag_seconds': lag.total_seconds() if lag else 0.0,
+        'processed_recent': dict(recent.values_list('outcome').annotate(count=Count('id')).order_by()),
+    }
+
+
+def prometheus_lines():
+    """Scrape-time webhook queue gauges for ``/metrics`` (see core.metrics.register_collector)."""
+    try:
+        stats = queue_stats()
+    except Exception:  # database unavailable; keep the rest of /metrics working
+        logger.exception('Could not collect webhook queue metrics')
+        return []
+    return [
+        '# HELP webhook_queue_events Webhook events waiting to be applied.',
+        '# TYPE webhook_queue_events gauge',
+        *(f'webhook_queue_events{{state="{state}"}} {stats[state]}' for state in ('pending', 'retrying')),
+        '# HELP webhook_queue_oldest_age_seconds Age of the oldest queued webhook event.',
+        '# TYPE webhook_queue_oldest_age_seconds gauge',
+        f'webhook_queue_oldest_age_seconds {stats["oldest_pending_age_seconds"]}',
+        '# HELP webhook_processing_lag_seconds Mean receipt-to-processing delay over the last five minutes.',
+        '# TYPE webhook_processing_lag_seconds gauge',
+        f'webhook_processing_lag_seconds {stats["processing_lag_seconds"]}',
+        '# HELP webhook_events_processed_recent Webhook events applied in the last five minutes, by outcome.',
+        '# TYPE webhook_events_processed_recent gauge',
+        *(f'webhook_events_processed_recent{{outcome="{outcome}"}} {count}'
+          for outcome, count in sorted(stats['processed_recent'].items())),
+    ]
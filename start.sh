@@ -44,5 +44,8 @@ echo "$(date) | Running migrations and collectstatic"
 python manage.py migrate --noinput || true
 python manage.py collectstatic --noinput || true
 
+# per-worker metrics snapshots are cumulative; start each deploy from zero
+rm -rf "${METRICS_DIR:-/tmp/assured_farming_metrics}"
+
 echo "$(date) | Starting Gunicorn"
 exec gunicorn $APP_MODULE --bind 0.0.0.0:$PORT --workers $WORKERS